@@ -0,0 +1,140 @@
+"""
+Benchmarks how long it takes to prepare the silence-split chunks of a recording for
+the Google API, and to encode them again when their requests are retried.
+
+Run it from the root of the repository with `python benchmarks/bench_google_chunks.py`.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import speech_recognition as sr
+from synthetic_audio import SAMPLE_RATE, make_speech_like_audio
+
+import utils.config_manager as cm
+from handlers.audio_handler import AudioHandler
+from handlers.google_api_handler import CachedFlacAudioData
+from models.config.config_cache import ConfigCache
+
+
+def prepare_through_disk(
+    samples: npt.NDArray[np.int16], chunk_ranges: list[tuple[int, int]]
+) -> None:
+    """
+    Prepares the chunks like the program used to: each one is exported to a WAV file
+    and read back with `sr.AudioFile`.
+
+    :param samples: The PCM samples of the recording.
+    :type samples: npt.NDArray[np.int16]
+    :param chunk_ranges: The `(start, end)` sample indices of each chunk.
+    :type chunk_ranges: list[tuple[int, int]]
+    :return: None
+    """
+    from pydub import AudioSegment
+
+    audio = AudioSegment(
+        samples.tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1
+    )
+    recognizer = sr.Recognizer()
+
+    with tempfile.TemporaryDirectory() as chunks_directory:
+        for idx, (start, end) in enumerate(chunk_ranges):
+            chunk_path = Path(chunks_directory) / f"chunk{idx}.wav"
+            audio[start * 1000 // SAMPLE_RATE : end * 1000 // SAMPLE_RATE].export(
+                chunk_path, format="wav"
+            )
+
+            with sr.AudioFile(str(chunk_path)) as source:
+                recognizer.record(source)
+
+
+def prepare_in_memory(
+    samples: npt.NDArray[np.int16], chunk_ranges: list[tuple[int, int]]
+) -> None:
+    """
+    Prepares the chunks like the program does now: straight from the PCM samples.
+
+    :param samples: The PCM samples of the recording.
+    :type samples: npt.NDArray[np.int16]
+    :param chunk_ranges: The `(start, end)` sample indices of each chunk.
+    :type chunk_ranges: list[tuple[int, int]]
+    :return: None
+    """
+    for start, end in chunk_ranges:
+        sr.AudioData(samples[start:end].tobytes(), SAMPLE_RATE, samples.itemsize)
+
+
+def encode_attempts(
+    samples: npt.NDArray[np.int16],
+    chunk_ranges: list[tuple[int, int]],
+    attempts: int,
+    is_cached: bool,
+) -> None:
+    """
+    Encodes every chunk to FLAC once per request attempt, as the recognizer does
+    before uploading it.
+
+    :param samples: The PCM samples of the recording.
+    :type samples: npt.NDArray[np.int16]
+    :param chunk_ranges: The `(start, end)` sample indices of each chunk.
+    :type chunk_ranges: list[tuple[int, int]]
+    :param attempts: Number of requests made for each chunk.
+    :type attempts: int
+    :param is_cached: Whether the encoding goes through the payload cache.
+    :type is_cached: bool
+    :return: None
+    """
+    audio_data_class = CachedFlacAudioData if is_cached else sr.AudioData
+
+    for start, end in chunk_ranges:
+        audio_data = audio_data_class(
+            samples[start:end].tobytes(), SAMPLE_RATE, samples.itemsize
+        )
+
+        for _ in range(attempts):
+            audio_data.get_flac_data()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--attempts", type=int, default=3)
+    args = parser.parse_args()
+
+    cm.ConfigManager.override_value(
+        ConfigCache.Key.SECTION, ConfigCache.Key.USE_PAYLOAD_CACHE, "True"
+    )
+
+    samples = make_speech_like_audio(args.minutes * 60)
+    chunk_ranges = AudioHandler.split_audio_into_chunks(samples, SAMPLE_RATE)
+    print(f"{args.minutes:g} min of audio, {len(chunk_ranges)} chunks")
+
+    for name, prepare in [
+        ("WAV files on disk", prepare_through_disk),
+        ("in memory", prepare_in_memory),
+    ]:
+        start = time.perf_counter()
+        prepare(samples, chunk_ranges)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Chunks prepared {name}: {elapsed:.2f}s, "
+            f"{elapsed / len(chunk_ranges) * 1e6:.0f} µs per chunk"
+        )
+
+    for name, is_cached in [("without", False), ("with", True)]:
+        start = time.perf_counter()
+        encode_attempts(samples, chunk_ranges, args.attempts, is_cached)
+        elapsed = time.perf_counter() - start
+        print(
+            f"FLAC encoding of {args.attempts} attempts per chunk {name} the payload "
+            f"cache: {elapsed:.2f}s, {elapsed / len(chunk_ranges) * 1000:.1f} ms per "
+            f"chunk"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmarks the NumPy silence splitter against `pydub.silence.split_on_silence`, with
+the parameters used to split the audio for the Google API.
+
+Run it from the root of the repository with `python benchmarks/bench_silence_split.py`.
+"""
+
+import argparse
+import time
+
+from synthetic_audio import SAMPLE_RATE, make_speech_like_audio
+
+import utils.audio_utils as au
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=10)
+    args = parser.parse_args()
+
+    from pydub import AudioSegment
+    from pydub.silence import split_on_silence
+
+    samples = make_speech_like_audio(args.minutes * 60)
+    silence_thresh = au.get_dbfs(samples) - 40
+    print(f"{args.minutes:g} min of audio")
+
+    start = time.perf_counter()
+    audio = AudioSegment(
+        samples.tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1
+    )
+    pydub_chunks = split_on_silence(
+        audio, min_silence_len=500, silence_thresh=silence_thresh, keep_silence=100
+    )
+    pydub_elapsed = time.perf_counter() - start
+    print(f"pydub: {pydub_elapsed:.2f}s, {len(pydub_chunks)} chunks")
+
+    start = time.perf_counter()
+    chunk_ranges = au.split_on_silence(
+        samples,
+        SAMPLE_RATE,
+        min_silence_len=500,
+        silence_thresh=silence_thresh,
+        keep_silence=100,
+    )
+    numpy_elapsed = time.perf_counter() - start
+    print(
+        f"NumPy: {numpy_elapsed:.2f}s, {len(chunk_ranges)} chunks "
+        f"({pydub_elapsed / numpy_elapsed:.0f}x faster)"
+    )
+
+    is_same_split = [len(chunk.raw_data) for chunk in pydub_chunks] == [
+        (end - start) * samples.itemsize for start, end in chunk_ranges
+    ]
+    print(f"Same chunks as pydub: {is_same_split}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmarks the encoding of the audio uploaded to the Whisper API with each codec,
+against the MP3 export through pydub the program used before, in encoding time and
+uploaded bytes per hour of audio.
+
+Run it from the root of the repository with `python benchmarks/bench_upload_codecs.py`.
+FFmpeg must be in the PATH.
+"""
+
+import argparse
+import time
+from io import BytesIO
+
+from synthetic_audio import SAMPLE_RATE, format_size, make_speech_like_audio
+
+import utils.audio_utils as au
+import utils.constants as c
+from utils.enums import UploadCodec
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=10)
+    args = parser.parse_args()
+
+    from pydub import AudioSegment
+
+    samples = make_speech_like_audio(args.minutes * 60)
+    hours = args.minutes / 60
+    print(f"{args.minutes:g} min of audio, numbers per hour of audio")
+
+    def report(name: str, elapsed: float, size: int) -> None:
+        print(
+            f"{name:<24} encode {elapsed / hours:6.1f}s, "
+            f"upload {format_size(size / hours):>8}"
+        )
+
+    start = time.perf_counter()
+    compressed_audio = BytesIO()
+    AudioSegment(
+        samples.tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1
+    ).set_frame_rate(12000).export(compressed_audio, format="mp3", bitrate="32k")
+    report(
+        "pydub mp3 12 kHz 32 kbps",
+        time.perf_counter() - start,
+        len(compressed_audio.getvalue()),
+    )
+
+    for codec in UploadCodec:
+        min_bitrate_kbps, max_bitrate_kbps = c.UPLOAD_CODEC_BITRATES_KBPS[codec.value]
+
+        for bitrate_kbps in sorted({min_bitrate_kbps, max_bitrate_kbps}):
+            start = time.perf_counter()
+            encoded_audio = au.encode_audio(samples, codec, bitrate_kbps, SAMPLE_RATE)
+            name = (
+                codec.value
+                if codec == UploadCodec.FLAC
+                else (f"{codec.value} {bitrate_kbps} kbps")
+            )
+            report(f"pipe {name}", time.perf_counter() - start, len(encoded_audio))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Synthetic recordings shared by the benchmarks, so they can run without any audio
+files and give comparable numbers between runs.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+# The benchmarks import the program modules the same way the program does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+SAMPLE_RATE = 16000
+
+
+def make_speech_like_audio(
+    seconds: float, sample_rate: int = SAMPLE_RATE, seed: int = 0
+) -> npt.NDArray[np.int16]:
+    """
+    Generates mono 16-bit PCM audio that alternates between voiced bursts of one to
+    four seconds and pauses of half a second to a second and a half, with some
+    background noise throughout, like a recording of someone talking.
+
+    :param seconds: Duration of the audio, in seconds.
+    :type seconds: float
+    :param sample_rate: Sample rate of the audio, in Hz.
+    :type sample_rate: int
+    :param seed: Seed of the random generator, so every run gets the same audio.
+    :type seed: int
+    :return: The PCM samples.
+    :rtype: npt.NDArray[np.int16]
+    """
+    rng = np.random.default_rng(seed)
+    size = int(seconds * sample_rate)
+    audio = rng.normal(0, 5, size).astype(np.float32)
+    position = 0
+
+    while position < size:
+        position += int(rng.uniform(0.5, 1.5) * sample_rate)
+        burst_size = min(int(rng.uniform(1, 4) * sample_rate), size - position)
+
+        if burst_size <= 0:
+            break
+
+        t = np.arange(burst_size, dtype=np.float32) / sample_rate
+        pitch = rng.uniform(100, 250)
+        burst = sum(
+            np.sin(2 * np.pi * pitch * harmonic * t) / harmonic
+            for harmonic in (1, 2, 3)
+        )
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 5) * t)
+        audio[position : position + burst_size] += 6000 * envelope * burst
+        position += burst_size
+
+    return np.clip(audio, -32768, 32767).astype(np.int16)
+
+
+def format_size(size: float) -> str:
+    """
+    Formats a size in bytes as megabytes.
+
+    :param size: The size, in bytes.
+    :type size: float
+    :return: The formatted size.
+    :rtype: str
+    """
+    return f"{size / (1024 * 1024):.1f} MB"
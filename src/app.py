@@ -1,11 +1,11 @@
+import multiprocessing
+
 import customtkinter as ctk
 import utils.config_manager as cm
 import utils.constants as c
 import utils.path_helper as ph
 from controllers.main_controller import MainController
-from models.config.config_whisperx import ConfigWhisperX
 from models.transcription import Transcription
-from utils.enums import ComputeType
 from views.main_window import MainWindow
 
 
@@ -34,29 +34,6 @@ class App(ctk.CTk):  # type: ignore[misc]
         min_height = 250
         self.minsize(min_width, min_height)
 
-        # Place the torch import here to avoid the "No ffmpeg exe could be found" error
-        import torch
-
-        # Check GPU
-        cm.ConfigManager.modify_value(
-            section=ConfigWhisperX.Key.SECTION,
-            key=ConfigWhisperX.Key.CAN_USE_GPU,
-            new_value=str(torch.cuda.is_available()),
-        )
-
-        if not torch.cuda.is_available():
-            cm.ConfigManager.modify_value(
-                section=ConfigWhisperX.Key.SECTION,
-                key=ConfigWhisperX.Key.COMPUTE_TYPE,
-                new_value=ComputeType.INT8.value,
-            )
-
-            cm.ConfigManager.modify_value(
-                section=ConfigWhisperX.Key.SECTION,
-                key=ConfigWhisperX.Key.USE_CPU,
-                new_value="True",
-            )
-
         # Initialize configs
         config_subtitles = cm.ConfigManager.get_config_subtitles()
         config_transcription = cm.ConfigManager.get_config_transcription()
@@ -83,8 +60,14 @@ class App(ctk.CTk):  # type: ignore[misc]
         # Set the controller to view
         view.set_controller(controller)
 
+        # Check GPU without delaying the window
+        controller.check_gpu_availability()
+
 
 if __name__ == "__main__":
+    # Required by the worker processes of directory transcriptions in frozen builds
+    multiprocessing.freeze_support()
+
     app = App()
     app.eval("tk::PlaceWindow . center")
     app.mainloop()
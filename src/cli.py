@@ -0,0 +1,621 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+import utils.config_manager as cm
+import utils.constants as c
+import utils.dict_utils as du
+from handlers.directory_handler import DirectoryHandler
+from models.config.config_watch import ConfigWatch
+from models.config.config_whisper_api import ConfigWhisperApi
+from models.config.config_whisperx import ConfigWhisperX
+from models.transcription import Transcription
+from models.transcription_result import TranscriptionResult
+from utils.enums import (
+    AudioSource,
+    ModelSize,
+    TranscriptionMethod,
+    WhisperApiResponseFormats,
+    WhisperXFileTypes,
+)
+from utils.job_journal import JobJournal
+
+# Exit statuses
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1  # Some files couldn't be transcribed or exported
+EXIT_USAGE = 2  # Invalid arguments, also used by argparse
+
+METHODS = {
+    "google-api": TranscriptionMethod.GOOGLE_API,
+    "whisper-api": TranscriptionMethod.WHISPER_API,
+    "whisperx": TranscriptionMethod.WHISPERX,
+}
+
+Summary = dict[str, Any]
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Runs the command-line interface, which transcribes files without the GUI.
+
+    The summary of the command is printed to the standard output as JSON, while the
+    progress and the logs of the transcription are printed to the standard error.
+
+    :param argv: The command-line arguments. Defaults to the ones of the process.
+    :type argv: Optional[list[str]]
+    :return: The exit status.
+    :rtype: int
+    """
+    args = _create_parser().parse_args(argv)
+    command: Callable[[argparse.Namespace], tuple[Summary, int]] = args.command_func
+
+    with _redirect_stdout_to_stderr():
+        try:
+            summary, exit_status = command(args)
+        except ValueError as e:
+            summary, exit_status = (
+                {"command": args.command, "error": str(e)},
+                EXIT_USAGE,
+            )
+
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+    return exit_status
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="audiotext",
+        description=f"Transcribe audio and video files without the {c.APP_NAME} GUI. "
+        "Options that aren't given are taken from config.ini.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    transcribe_parser = subparsers.add_parser(
+        "transcribe", help="Transcribe a file or every supported file in a directory."
+    )
+    _add_path_argument(transcribe_parser)
+    _add_transcription_arguments(transcribe_parser)
+    transcribe_parser.set_defaults(command_func=_transcribe)
+
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="Keep transcribing the files added to a directory until interrupted "
+        "with Ctrl+C.",
+    )
+    watch_parser.add_argument(
+        "path", type=Path, help="Directory to watch for new files."
+    )
+    _add_transcription_arguments(watch_parser)
+    watch_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        help="Seconds between checks for new files.",
+    )
+    watch_parser.add_argument(
+        "--stable-seconds",
+        type=float,
+        help="Seconds a file must stay unchanged before it's transcribed.",
+    )
+    watch_parser.add_argument(
+        "--max-queued-files",
+        type=int,
+        help="Maximum number of files submitted to the workers at a time.",
+    )
+    watch_parser.set_defaults(command_func=_watch)
+
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Export the output files of WhisperX transcriptions again from their "
+        "saved results, without transcribing them.",
+    )
+    _add_path_argument(export_parser)
+    export_parser.add_argument(
+        "--output-types",
+        nargs="+",
+        choices=[file_type.value for file_type in WhisperXFileTypes],
+        help="Output file types to export.",
+    )
+    export_parser.set_defaults(command_func=_export)
+
+    return parser
+
+
+def _add_path_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "path", type=Path, help="File to transcribe, or directory to look for files in."
+    )
+
+
+def _add_transcription_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--method", choices=list(METHODS), help="Transcription method.")
+    parser.add_argument(
+        "--model",
+        choices=[model_size.value for model_size in ModelSize],
+        help="WhisperX model size.",
+    )
+    parser.add_argument(
+        "--language",
+        choices=list(c.AUDIO_LANGUAGES),
+        metavar="CODE",
+        help="Language of the audio, as an ISO 639-1 code (e.g. 'en').",
+    )
+    parser.add_argument(
+        "--output-types",
+        nargs="+",
+        help="Output file types for WhisperX (e.g. 'srt txt'), or the response format "
+        "for the Whisper API (e.g. 'verbose_json').",
+    )
+    parser.add_argument(
+        "--translate",
+        action="store_true",
+        help="Translate the audio to English (WhisperX only).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes that transcribe the files of a directory.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help="Directory of the output files. Defaults to the directory of each file.",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Transcribe files again even if they already have output files.",
+    )
+
+
+def _transcribe(args: argparse.Namespace) -> tuple[Summary, int]:
+    """
+    Transcribes the file or directory given in the arguments and saves the output
+    files of each transcribed file.
+
+    :param args: The parsed arguments of the `transcribe` command.
+    :type args: argparse.Namespace
+    :raises ValueError: If the arguments are invalid.
+    :return: The summary of the command and its exit status.
+    :rtype: tuple[Summary, int]
+    """
+    start = time.perf_counter()
+    transcription = _create_transcription(args)
+    output_dir: Optional[Path] = args.output_dir
+
+    if output_dir:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    files = _get_files_to_transcribe(transcription, output_dir)
+    journal = None
+
+    if transcription.audio_source == AudioSource.DIRECTORY:
+        journal = JobJournal.for_job(transcription, output_dir)
+        files = journal.resume(files)
+
+    results = []
+    config_transcription = cm.ConfigManager.get_config_transcription()
+    workers = args.workers or config_transcription.workers
+
+    for idx, result in enumerate(
+        _transcribe_files(
+            transcription,
+            files,
+            workers,
+            config_transcription.threads_per_worker,
+            output_dir,
+            journal,
+        ),
+        start=1,
+    ):
+        results.append(_report_result(result, f"{idx}/{len(files)}"))
+
+    if journal:
+        journal.remove_if_finished()
+
+    return _summarize("transcribe", transcription, results, start)
+
+
+def _watch(args: argparse.Namespace) -> tuple[Summary, int]:
+    """
+    Watches the directory given in the arguments and transcribes the files added to
+    it until the process is interrupted (Ctrl+C) or terminated. The files being
+    transcribed are finished before exiting. Pressing Ctrl+C again exits at once.
+
+    :param args: The parsed arguments of the `watch` command.
+    :type args: argparse.Namespace
+    :raises ValueError: If the arguments are invalid.
+    :return: The summary of the files transcribed while watching and the exit status.
+    :rtype: tuple[Summary, int]
+    """
+    from handlers.transcription_handler import TranscriptionHandler
+    from handlers.watch_handler import WatchHandler
+    from handlers.worker_pool_handler import (
+        WorkerPoolHandler,
+        resolve_threads_per_worker,
+    )
+
+    start = time.perf_counter()
+    transcription = _create_transcription(args)
+
+    if transcription.audio_source != AudioSource.DIRECTORY:
+        raise ValueError(f"{transcription.audio_source_path} is not a directory.")
+
+    transcription.should_watch = True
+    output_dir: Optional[Path] = args.output_dir
+
+    if output_dir:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    for key, value in [
+        (ConfigWatch.Key.POLL_INTERVAL_SECONDS, args.poll_interval),
+        (ConfigWatch.Key.STABLE_SECONDS, args.stable_seconds),
+        (ConfigWatch.Key.MAX_QUEUED_FILES, args.max_queued_files),
+    ]:
+        if value is not None:
+            cm.ConfigManager.override_value(ConfigWatch.Key.SECTION, key, str(value))
+
+    config_transcription = cm.ConfigManager.get_config_transcription()
+    workers = args.workers or config_transcription.workers
+    worker_pool = None
+
+    # The Whisper API is network-bound, so its files are uploaded concurrently by this
+    # process instead
+    if workers > 1 and transcription.method != TranscriptionMethod.WHISPER_API:
+        worker_pool = WorkerPoolHandler(
+            workers, config_transcription.threads_per_worker
+        )
+        watch_handler = WatchHandler(
+            transcription, worker_pool=worker_pool, output_dir=output_dir
+        )
+    else:
+        watch_handler = WatchHandler(
+            transcription,
+            transcription_handler=TranscriptionHandler(
+                threads=resolve_threads_per_worker(
+                    1, config_transcription.threads_per_worker
+                )
+            ),
+            output_dir=output_dir,
+        )
+
+    def stop_watching(signum: int, frame: Any) -> None:
+        print("Stopping once the files being transcribed are finished...")
+        watch_handler.stop()
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    signal.signal(signal.SIGINT, stop_watching)
+    signal.signal(signal.SIGTERM, stop_watching)
+    print(f"Watching {transcription.audio_source_path} for new files...")
+
+    results = []
+
+    try:
+        for idx, result in enumerate(watch_handler.watch(), start=1):
+            results.append(_report_result(result, f"{idx}"))
+    finally:
+        if worker_pool:
+            worker_pool.shutdown()
+
+    return _summarize("watch", transcription, results, start)
+
+
+def _report_result(result: TranscriptionResult, progress: str) -> dict[str, Any]:
+    """
+    Prints the status of a transcribed file and gets its entry of the summary.
+
+    :param result: The result of the file.
+    :type result: TranscriptionResult
+    :param progress: The position of the file (e.g. "3/10").
+    :type progress: str
+    :return: The entry of the file in the summary.
+    :rtype: dict[str, Any]
+    """
+    status = "succeeded" if result.is_successful else "failed"
+    print(f"[{progress}] {result.source_path}: {status}")
+
+    return {
+        "path": str(result.source_path),
+        "status": status,
+        "error": result.error,
+        "timings": result.timings,
+    }
+
+
+def _summarize(
+    command: str,
+    transcription: Transcription,
+    results: list[dict[str, Any]],
+    start: float,
+) -> tuple[Summary, int]:
+    """
+    Gets the summary of the transcribed files and the exit status of the command.
+
+    :param command: The name of the command.
+    :type command: str
+    :param transcription: The transcription of the command.
+    :type transcription: Transcription
+    :param results: The entries of the transcribed files.
+    :type results: list[dict[str, Any]]
+    :param start: When the command started, from `time.perf_counter`.
+    :type start: float
+    :return: The summary of the command and its exit status.
+    :rtype: tuple[Summary, int]
+    """
+    failed = sum(result["status"] != "succeeded" for result in results)
+    summary = {
+        "command": command,
+        "method": transcription.method.value if transcription.method else None,
+        "files": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "elapsed": time.perf_counter() - start,
+        "results": results,
+    }
+
+    return summary, EXIT_FAILURE if failed else EXIT_SUCCESS
+
+
+def _export(args: argparse.Namespace) -> tuple[Summary, int]:
+    """
+    Exports the output files of the WhisperX transcriptions of the file or directory
+    given in the arguments again from their saved results.
+
+    :param args: The parsed arguments of the `export` command.
+    :type args: argparse.Namespace
+    :return: The summary of the command and its exit status.
+    :rtype: tuple[Summary, int]
+    """
+    from handlers.transcription_handler import TranscriptionHandler
+
+    start = time.perf_counter()
+    output_file_types: list[str] = args.output_types or list(
+        cm.ConfigManager.get_config_whisperx().output_file_types
+    )
+    transcription = Transcription(
+        audio_source_path=args.path,
+        method=TranscriptionMethod.WHISPERX,
+        output_file_types=output_file_types,
+    )
+    summary: Summary = {"command": "export"}
+
+    try:
+        exported_paths = TranscriptionHandler.export(transcription)
+        exit_status = EXIT_SUCCESS
+    except ValueError as e:
+        exported_paths = []
+        summary["error"] = str(e)
+        exit_status = EXIT_FAILURE
+
+    summary["exported"] = [str(path) for path in exported_paths]
+    summary["elapsed"] = time.perf_counter() - start
+
+    return summary, exit_status
+
+
+def _create_transcription(args: argparse.Namespace) -> Transcription:
+    """
+    Creates the transcription from the arguments, falling back to the configuration
+    for the options that aren't given. The WhisperX model and the Whisper API
+    response format are overridden in the configuration of this process.
+
+    :param args: The parsed arguments of the `transcribe` command.
+    :type args: argparse.Namespace
+    :raises ValueError: If the output types aren't valid for the transcription method.
+    :return: The transcription of the path given in the arguments.
+    :rtype: Transcription
+    """
+    config_transcription = cm.ConfigManager.get_config_transcription()
+
+    if args.method:
+        method = METHODS[args.method]
+    else:
+        method = TranscriptionMethod(config_transcription.method)
+
+    language_code = args.language or du.find_key_by_value(
+        dictionary=c.AUDIO_LANGUAGES, target_value=config_transcription.language
+    )
+    output_types: Optional[list[str]] = args.output_types
+    output_file_types: list[str]
+
+    if method == TranscriptionMethod.WHISPERX:
+        whisperx_file_types = [file_type.value for file_type in WhisperXFileTypes]
+
+        if output_types and not set(output_types) <= set(whisperx_file_types):
+            raise ValueError(
+                f"Invalid WhisperX output types. Choose from: {whisperx_file_types}"
+            )
+
+        if args.model:
+            cm.ConfigManager.override_value(
+                ConfigWhisperX.Key.SECTION, ConfigWhisperX.Key.MODEL_SIZE, args.model
+            )
+
+        output_file_types = output_types or list(
+            cm.ConfigManager.get_config_whisperx().output_file_types
+        )
+    elif method == TranscriptionMethod.WHISPER_API:
+        response_formats = [
+            response_format.value for response_format in WhisperApiResponseFormats
+        ]
+
+        if output_types:
+            if len(output_types) > 1 or output_types[0] not in response_formats:
+                raise ValueError(
+                    "The Whisper API accepts a single output type. Choose from: "
+                    f"{response_formats}"
+                )
+
+            cm.ConfigManager.override_value(
+                ConfigWhisperApi.Key.SECTION,
+                ConfigWhisperApi.Key.RESPONSE_FORMAT,
+                output_types[0],
+            )
+
+        output_file_types = [cm.ConfigManager.get_config_whisper_api().response_format]
+    else:
+        if output_types and output_types != ["txt"]:
+            raise ValueError("The Google API only supports the 'txt' output type.")
+
+        output_file_types = ["txt"]
+
+    path: Path = args.path
+
+    return Transcription(
+        language_code=language_code,
+        audio_source=AudioSource.DIRECTORY if path.is_dir() else AudioSource.FILE,
+        audio_source_path=path,
+        method=method,
+        output_file_types=output_file_types,
+        should_translate=args.translate and method == TranscriptionMethod.WHISPERX,
+        should_autosave=True,
+        should_overwrite=args.overwrite,
+    )
+
+
+def _get_files_to_transcribe(
+    transcription: Transcription, output_dir: Optional[Path]
+) -> list[Path]:
+    """
+    Gets the files to transcribe from the path of the transcription.
+
+    :param transcription: The transcription of the given path.
+    :type transcription: Transcription
+    :param output_dir: Directory of the output files, if not the one of each file.
+    :type output_dir: Optional[Path]
+    :raises ValueError: If the path isn't a supported file nor a directory.
+    :return: The files to transcribe.
+    :rtype: list[Path]
+    """
+    path = transcription.audio_source_path
+
+    if path.is_dir():
+        return DirectoryHandler.get_files_to_transcribe(
+            path,
+            output_file_types=transcription.output_file_types or [],
+            should_overwrite=transcription.should_overwrite,
+            output_dir=output_dir,
+        )
+
+    if path.is_file() and path.suffix.lower() in c.SUPPORTED_FILE_EXTENSIONS:
+        return [path]
+
+    raise ValueError(f"{path} is not a supported file nor a directory.")
+
+
+def _transcribe_files(
+    transcription: Transcription,
+    files: list[Path],
+    workers: int,
+    threads_per_worker: int,
+    output_dir: Optional[Path],
+    journal: Optional[JobJournal],
+) -> Iterator[TranscriptionResult]:
+    """
+    Transcribes and saves the files, in a pool of worker processes if there is more
+    than one worker and file, or in this process otherwise. Whisper API files are
+    always uploaded concurrently by this process.
+
+    :param transcription: The transcription whose options are used for every file.
+    :type transcription: Transcription
+    :param files: The files to transcribe.
+    :type files: list[Path]
+    :param workers: Number of worker processes.
+    :type workers: int
+    :param threads_per_worker: Number of CPU threads per worker. If not positive, the
+                               available cores are shared among the workers.
+    :type threads_per_worker: int
+    :param output_dir: Directory of the output files, if not the one of each file.
+    :type output_dir: Optional[Path]
+    :param journal: The journal of the directory transcription, if any.
+    :type journal: Optional[JobJournal]
+    :return: An iterator of the result of each file, as soon as it finishes.
+    :rtype: Iterator[TranscriptionResult]
+    """
+    import dataclasses
+
+    from handlers.transcription_handler import TranscriptionHandler
+    from handlers.worker_pool_handler import (
+        WorkerPoolHandler,
+        resolve_threads_per_worker,
+    )
+
+    transcriptions = [
+        dataclasses.replace(
+            transcription, audio_source=AudioSource.FILE, audio_source_path=file
+        )
+        for file in files
+    ]
+
+    # The Whisper API is network-bound, so its files are uploaded concurrently by this
+    # process instead
+    if (
+        workers > 1
+        and len(files) > 1
+        and transcription.method != TranscriptionMethod.WHISPER_API
+    ):
+        worker_pool = WorkerPoolHandler(workers, threads_per_worker)
+
+        try:
+            yield from worker_pool.transcribe_files(transcriptions, output_dir, journal)
+        finally:
+            worker_pool.shutdown()
+    else:
+        transcription_handler = TranscriptionHandler(
+            threads=resolve_threads_per_worker(1, threads_per_worker)
+        )
+
+        results = transcription_handler.transcribe_and_save_files(
+            transcriptions, output_dir, journal
+        )
+        loop = asyncio.new_event_loop()
+
+        # The event loop only runs while waiting for the next result, which is enough
+        # since reporting a result is quick
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(anext(results))
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.run_until_complete(transcription_handler.close_async_clients())
+            loop.close()
+
+
+@contextlib.contextmanager
+def _redirect_stdout_to_stderr() -> Iterator[None]:
+    """
+    Redirects the standard output of this process, and of the processes it starts,
+    to the standard error, so that only the summary is printed to the standard
+    output.
+
+    :return: An iterator that yields once, while the output is redirected.
+    :rtype: Iterator[None]
+    """
+    sys.stdout.flush()
+    stdout_fd = os.dup(1)
+    os.dup2(2, 1)
+
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(stdout_fd, 1)
+        os.close(stdout_fd)
+
+
+if __name__ == "__main__":
+    # Required by the worker processes of directory transcriptions in frozen builds
+    multiprocessing.freeze_support()
+
+    sys.exit(main())
@@ -1,20 +1,32 @@
 import asyncio
-import os
+import dataclasses
+import queue
 import threading
 import traceback
 from pathlib import Path
 from tkinter import filedialog
-
-import speech_recognition as sr
-import utils.audio_utils as au
-from handlers.audio_handler import AudioHandler
-from handlers.google_api_handler import GoogleApiHandler
-from handlers.openai_api_handler import OpenAiApiHandler
-from handlers.whisperx_handler import WhisperXHandler
+from typing import TYPE_CHECKING, Any, Optional
+
+import utils.config_manager as cm
+from handlers.directory_handler import DirectoryHandler
+from handlers.watch_handler import WatchHandler
+from handlers.worker_pool_handler import (
+    WorkerPoolHandler,
+    resolve_threads_per_worker,
+)
 from handlers.youtube_handler import YouTubeHandler
+from models.config.config_whisperx import ConfigWhisperX
 from models.transcription import Transcription
+from models.transcription_result import TranscriptionResult
+from models.ui_event import UiEvent
 from utils import constants as c
-from utils.enums import AudioSource, TranscriptionMethod
+from utils.enums import AudioSource, ComputeType, TranscriptionMethod, UiEventType
+from utils.job_journal import JobJournal
+
+# The transcription backends take seconds to import, so they are only imported when
+# they are first needed, which keeps the startup of the window fast
+if TYPE_CHECKING:
+    from handlers.transcription_handler import TranscriptionHandler
 
 
 class MainController:
@@ -24,7 +36,17 @@ class MainController:
         self.transcription = transcription
         self._is_mic_recording = False
 
-        self._whisperx_handler = WhisperXHandler()
+        # Created on the first transcription
+        self._transcription_handler: Optional["TranscriptionHandler"] = None
+        # Created on the first directory transcription with more than one worker
+        self._worker_pool: Optional[WorkerPoolHandler] = None
+        # Set while a directory is being watched, to stop watching it
+        self._watch_handler: Optional[WatchHandler] = None
+        # Result of the last transcribed file, to save it from the main window
+        self._last_result: Optional[TranscriptionResult] = None
+        # Updates of the view, which is drained by the view on the Tk thread since Tk
+        # must not be called from the threads that transcribe
+        self.ui_events: queue.Queue[UiEvent] = queue.Queue()
 
     # PUBLIC METHODS
 
@@ -98,6 +120,21 @@ class MainController:
         except Exception as e:
             self._handle_exception(e)
 
+    def export_transcription(self, transcription: Transcription) -> None:
+        """
+        Exports the output files of the file or directory of the transcription again
+        from the results saved by previous WhisperX transcriptions, without
+        transcribing them again.
+
+        :param transcription: An instance of the Transcription class whose
+                              `audio_source_path` is the file or directory to export.
+        :type transcription: Transcription
+        :return: None
+        """
+        self.transcription = transcription
+
+        threading.Thread(target=self._handle_export_process).start()
+
     def stop_recording_from_mic(self) -> None:
         """
         Stops recording audio from the microphone.
@@ -109,10 +146,14 @@ class MainController:
         :return: None
         """
         self._is_mic_recording = False
-        self.view.on_stop_recording_from_mic()
+        self._post_ui_event(UiEventType.STOP_RECORDING_FROM_MIC)
 
     def save_transcription(
-        self, file_path: Path, should_autosave: bool, should_overwrite: bool
+        self,
+        file_path: Path,
+        should_autosave: bool,
+        should_overwrite: bool,
+        result: Optional[TranscriptionResult] = None,
     ) -> None:
         """
         Saves the transcription to a text file and optionally generate subtitles.
@@ -125,47 +166,122 @@ class MainController:
         :param should_overwrite: Indicates whether existing files should be overwritten
                                  if they exist.
         :type should_overwrite: bool
+        :param result: The result of the transcription to save. Defaults to the result
+                       of the last transcribed file.
+        :type result: Optional[TranscriptionResult]
         :return: None
         """
+        result = result or self._last_result
+
+        if not result:
+            exception = ValueError(
+                "There is no transcription available. Please generate it first."
+            )
+            self._handle_exception(exception)
+            return
+
         save_file_path = self._get_save_path(file_path, should_autosave)
 
         if not save_file_path:
             return
 
-        if self.transcription.method == TranscriptionMethod.WHISPERX:
-            if self.transcription.output_file_types:
-                self._whisperx_handler.save_transcription(
-                    file_path=Path(save_file_path),
-                    output_file_types=self.transcription.output_file_types,
-                    should_overwrite=should_overwrite,
-                )
-            else:
-                exception = ValueError(
-                    "There are no output file types selected. Please select at least "
-                    "one."
-                )
-                self._handle_exception(exception)
-        elif self.transcription.method in [
-            TranscriptionMethod.GOOGLE_API,
-            TranscriptionMethod.WHISPER_API,
-        ]:
-            if self.transcription.text:
-                if should_overwrite or not os.path.exists(save_file_path):
-                    with open(save_file_path, "w", encoding="utf-8") as file:
-                        file.write(self.transcription.text)
-            else:
-                exception = ValueError(
-                    "There is no transcription available. Please generate it again."
-                )
-                self._handle_exception(exception)
-        else:
-            exception = ValueError(
-                "Incorrect transcription method. Please check the `config.ini` file."
+        try:
+            self._get_transcription_handler().save(
+                self.transcription,
+                result,
+                file_path=Path(save_file_path),
+                should_overwrite=should_overwrite,
+            )
+        except Exception as e:
+            self._handle_exception(e)
+
+    def stop_watching_directory(self) -> None:
+        """
+        Stops watching the directory once the files being transcribed are finished.
+
+        :return: None
+        """
+        if self._watch_handler:
+            self._watch_handler.stop()
+
+    def check_gpu_availability(self) -> None:
+        """
+        Checks whether a CUDA GPU can be used in a background thread, since it
+        requires importing torch, which takes seconds. Until the check finishes, the
+        view shows the result of the last check, which is kept in the configuration.
+
+        :return: None
+        """
+        threading.Thread(target=self._check_gpu_availability, daemon=True).start()
+
+    def save_gpu_availability(self, can_use_gpu: bool) -> None:
+        """
+        Stores whether a CUDA GPU can be used in the configuration. If it can't,
+        WhisperX is set to run on the CPU.
+
+        The view calls it on the Tk thread once the check finishes, so that the
+        configuration is only written from that thread.
+
+        :param can_use_gpu: Whether a CUDA GPU can be used.
+        :type can_use_gpu: bool
+        :return: None
+        """
+        cm.ConfigManager.modify_value(
+            section=ConfigWhisperX.Key.SECTION,
+            key=ConfigWhisperX.Key.CAN_USE_GPU,
+            new_value=str(can_use_gpu),
+        )
+
+        if not can_use_gpu:
+            cm.ConfigManager.modify_value(
+                section=ConfigWhisperX.Key.SECTION,
+                key=ConfigWhisperX.Key.COMPUTE_TYPE,
+                new_value=ComputeType.INT8.value,
+            )
+
+            cm.ConfigManager.modify_value(
+                section=ConfigWhisperX.Key.SECTION,
+                key=ConfigWhisperX.Key.USE_CPU,
+                new_value="True",
             )
-            self._handle_exception(exception)
 
     # PRIVATE METHODS
 
+    def _get_transcription_handler(self) -> "TranscriptionHandler":
+        """
+        Gets the transcription handler, creating it on first use so that the
+        transcription backends aren't imported until they're needed.
+
+        :return: The transcription handler.
+        :rtype: TranscriptionHandler
+        """
+        if self._transcription_handler is None:
+            from handlers.transcription_handler import TranscriptionHandler
+
+            config_transcription = cm.ConfigManager.get_config_transcription()
+            self._transcription_handler = TranscriptionHandler(
+                threads=resolve_threads_per_worker(
+                    workers=1,
+                    threads_per_worker=config_transcription.threads_per_worker,
+                )
+            )
+
+        return self._transcription_handler
+
+    def _check_gpu_availability(self) -> None:
+        """
+        Checks whether a CUDA GPU can be used and queues the result for the view,
+        which stores it through `save_gpu_availability`.
+
+        :return: None
+        """
+        # Place the torch import here to avoid the "No ffmpeg exe could be found" error
+        import torch
+
+        self.ui_events.put(
+            UiEvent(UiEventType.GPU_AVAILABILITY, can_use_gpu=torch.cuda.is_available())
+        )
+
     def _prepare_for_file_transcription(self, file_path: Path) -> None:
         """
         Prepares the system for transcription from a file by verifying if the file
@@ -218,13 +334,44 @@ class MainController:
         """
         try:
             if self.transcription.audio_source == AudioSource.DIRECTORY:
-                await self._transcribe_directory(self.transcription.audio_source_path)
+                if self.transcription.should_watch:
+                    self._watch_directory(self.transcription.audio_source_path)
+                else:
+                    await self._transcribe_directory(
+                        self.transcription.audio_source_path
+                    )
             else:
                 await self._transcribe_file(self.transcription.audio_source_path)
         except Exception as e:
             self._handle_exception(e)
         finally:
-            self.view.on_processed_transcription()
+            # Each transcription runs on its own event loop
+            if self._transcription_handler:
+                await self._transcription_handler.close_async_clients()
+
+            self._post_ui_event(UiEventType.PROCESSED_TRANSCRIPTION)
+
+    def _handle_export_process(self) -> None:
+        """
+        Exports the output files of the file or directory of the transcription and
+        notifies the view when finished.
+
+        :return: None
+        """
+        try:
+            exported_paths = self._get_transcription_handler().export(
+                self.transcription
+            )
+
+            self._post_ui_event(
+                UiEventType.DISPLAY_TEXT,
+                f"Output files exported from {len(exported_paths)} saved result(s):\n"
+                + "\n".join(str(path) for path in exported_paths),
+            )
+        except Exception as e:
+            self._handle_exception(e)
+        finally:
+            self._post_ui_event(UiEventType.PROCESSED_TRANSCRIPTION)
 
     async def _transcribe_directory(self, dir_path: Path) -> None:
         """
@@ -236,65 +383,300 @@ class MainController:
                             file types to transcribe.
         :return: None
         """
-        if files := self._get_files_to_transcribe_from_directory():
-            # Create a list of coroutines for each file transcription task
-            tasks = [self._transcribe_file(file) for file in files]
-
-            # Run all tasks concurrently
-            await asyncio.gather(*tasks)
-
-            self.view.display_text(f"Files from '{dir_path}' successfully transcribed.")
+        journal = JobJournal.for_job(self.transcription)
+
+        if files := journal.resume(self._get_files_to_transcribe_from_directory()):
+            config_transcription = cm.ConfigManager.get_config_transcription()
+            self._post_ui_event(UiEventType.DISPLAY_TEXT)
+
+            # The Whisper API is network-bound, so its files are uploaded
+            # concurrently by this process instead
+            if (
+                config_transcription.workers > 1
+                and self.transcription.method != TranscriptionMethod.WHISPER_API
+            ):
+                self._transcribe_files_in_worker_pool(
+                    files,
+                    workers=config_transcription.workers,
+                    threads_per_worker=config_transcription.threads_per_worker,
+                    journal=journal,
+                )
+            else:
+                transcription_handler = self._get_transcription_handler()
+                transcriptions = [
+                    dataclasses.replace(self.transcription, audio_source_path=file)
+                    for file in files
+                ]
+                idx = 0
+
+                async for result in transcription_handler.transcribe_and_save_files(
+                    transcriptions, journal=journal
+                ):
+                    idx += 1
+                    self._last_result = result
+                    self._post_progress(result, current=idx, total=len(files))
+
+            journal.remove_if_finished()
+
+            self._post_ui_event(
+                UiEventType.APPEND_TEXT,
+                f"Files from '{dir_path}' successfully transcribed.",
+            )
         else:
             raise ValueError(
                 "Error: The directory path is invalid or doesn't contain valid "
                 "file types to transcribe. Please choose another one."
             )
 
-    async def _transcribe_file(self, file_path: Path) -> None:
+    def _transcribe_files_in_worker_pool(
+        self,
+        files: list[Path],
+        workers: int,
+        threads_per_worker: int,
+        journal: JobJournal,
+    ) -> None:
+        """
+        Transcribes and saves the files in parallel using a pool of worker processes,
+        reporting each file as soon as it finishes.
+
+        :param files: The paths of the files to transcribe.
+        :type files: list[Path]
+        :param workers: Number of worker processes.
+        :type workers: int
+        :param threads_per_worker: Number of CPU threads per worker. If not positive,
+                                   the available cores are shared among the workers.
+        :type threads_per_worker: int
+        :param journal: The journal of the directory transcription.
+        :type journal: JobJournal
+        :return: None
+        """
+        worker_pool = self._get_worker_pool(workers, threads_per_worker)
+        transcriptions = [
+            dataclasses.replace(self.transcription, audio_source_path=file)
+            for file in files
+        ]
+
+        try:
+            for idx, result in enumerate(
+                worker_pool.transcribe_files(transcriptions, journal=journal),
+                start=1,
+            ):
+                self._last_result = result
+                self._post_progress(result, current=idx, total=len(files))
+        finally:
+            self._discard_worker_pool_if_broken()
+
+    def _watch_directory(self, dir_path: Path) -> None:
+        """
+        Transcribes the files added to the directory until the user stops watching
+        it, reporting each file as soon as it finishes.
+
+        :param dir_path: The directory path selected by the user.
+        :type dir_path: Path
+        :raises ValueError: If the directory path is invalid.
+        :return: None
+        """
+        if not dir_path.is_dir():
+            raise ValueError(
+                "Error: The directory path is invalid. Please choose another one."
+            )
+
+        config_transcription = cm.ConfigManager.get_config_transcription()
+
+        # The Whisper API is network-bound, so its files are uploaded concurrently by
+        # this process instead
+        if (
+            config_transcription.workers > 1
+            and self.transcription.method != TranscriptionMethod.WHISPER_API
+        ):
+            self._watch_handler = WatchHandler(
+                self.transcription,
+                worker_pool=self._get_worker_pool(
+                    config_transcription.workers,
+                    config_transcription.threads_per_worker,
+                ),
+            )
+        else:
+            self._watch_handler = WatchHandler(
+                self.transcription,
+                transcription_handler=self._get_transcription_handler(),
+            )
+
+        self._post_ui_event(
+            UiEventType.DISPLAY_TEXT, f"Watching '{dir_path}' for new files...\n"
+        )
+
+        try:
+            for idx, result in enumerate(self._watch_handler.watch(), start=1):
+                self._last_result = result
+                self._post_ui_event(
+                    UiEventType.APPEND_TEXT, self._get_progress_text(result, f"{idx}")
+                )
+        finally:
+            self._watch_handler = None
+            self._discard_worker_pool_if_broken()
+
+        self._post_ui_event(UiEventType.APPEND_TEXT, f"Stopped watching '{dir_path}'.")
+
+    def _get_worker_pool(
+        self, workers: int, threads_per_worker: int
+    ) -> WorkerPoolHandler:
+        """
+        Gets the pool of worker processes. The pool is kept between transcriptions so
+        its workers keep their models loaded, unless the number of workers or threads
+        per worker has changed.
+
+        :param workers: Number of worker processes.
+        :type workers: int
+        :param threads_per_worker: Number of CPU threads per worker.
+        :type threads_per_worker: int
+        :return: The pool of worker processes.
+        :rtype: WorkerPoolHandler
+        """
+        if self._worker_pool and (
+            self._worker_pool.workers != workers
+            or self._worker_pool.threads_per_worker != threads_per_worker
+        ):
+            self._worker_pool.shutdown()
+            self._worker_pool = None
+
+        if not self._worker_pool:
+            self._worker_pool = WorkerPoolHandler(workers, threads_per_worker)
+
+        return self._worker_pool
+
+    def _discard_worker_pool_if_broken(self) -> None:
+        # A crashed worker breaks the whole pool, so start with a new one next time
+        if self._worker_pool and self._worker_pool.is_broken:
+            self._worker_pool.shutdown()
+            self._worker_pool = None
+
+    async def _transcribe_file(self, file_path: Path) -> TranscriptionResult:
         """
         Transcribes audio from a file based on the specified transcription method.
-        It updates the transcription object with the transcribed text. If the source
+        The text is shown as it's transcribed if the method supports it, and the
+        result is kept to allow saving it later. If the source
         type is microphone or YouTube, it removes the temporary file after
         transcription. It also displays the transcribed text and saves it if autosave
         is enabled.
 
         :param file_path: The path of the audio file for transcription.
         :type file_path: Path
-        :return: None
+        :return: The result of the transcription.
+        :rtype: TranscriptionResult
         """
-        transcription = self.transcription
-        transcription.audio_source_path = file_path
+        # Each file gets its own copy so concurrent transcriptions don't share state
+        transcription = dataclasses.replace(
+            self.transcription, audio_source_path=file_path
+        )
 
-        if self.transcription.method == TranscriptionMethod.GOOGLE_API:
-            self.transcription.text = AudioHandler.get_transcription(
-                transcription=transcription,
-                transcription_func=GoogleApiHandler.transcribe,
-                should_split_on_silence=True,
-            )
-        elif self.transcription.method == TranscriptionMethod.WHISPER_API:
-            self.transcription.text = AudioHandler.get_transcription(
-                transcription=transcription,
-                transcription_func=OpenAiApiHandler.transcribe,
-                should_split_on_silence=False,
-            )
-        elif self.transcription.method == TranscriptionMethod.WHISPERX:
-            self.transcription.text = await self._whisperx_handler.transcribe_file(
-                transcription
-            )
+        should_stream = transcription.audio_source != AudioSource.DIRECTORY
+
+        if should_stream:
+            self._post_ui_event(UiEventType.DISPLAY_TEXT)
+
+        result = await self._get_transcription_handler().transcribe(
+            transcription,
+            on_segments=self._on_segments_transcribed if should_stream else None,
+        )
+        self._last_result = result
 
-        if self.transcription.audio_source in [AudioSource.MIC, AudioSource.YOUTUBE]:
-            self.transcription.audio_source_path.unlink()  # Remove tmp file
+        if transcription.audio_source in [AudioSource.MIC, AudioSource.YOUTUBE]:
+            transcription.audio_source_path.unlink()  # Remove tmp file
 
-        if self.transcription.audio_source != AudioSource.DIRECTORY:
-            self.view.display_text(self.transcription.text)
+        if should_stream:
+            self._post_ui_event(
+                UiEventType.DISPLAY_TEXT,
+                result.text if result.is_successful else str(result.error),
+            )
 
-        if self.transcription.should_autosave:
+        if transcription.should_autosave and result.is_successful:
             self.save_transcription(
                 file_path,
                 should_autosave=True,
-                should_overwrite=self.transcription.should_overwrite,
+                should_overwrite=transcription.should_overwrite,
+                result=result,
             )
 
+        return result
+
+    def _on_segments_transcribed(self, segments: list[dict[str, Any]]) -> None:
+        """
+        Appends the text of the segments to the view while the file is still being
+        transcribed.
+
+        :param segments: The segments transcribed since the last call.
+        :type segments: list[dict[str, Any]]
+        :return: None
+        """
+        self._post_ui_event(
+            UiEventType.APPEND_TEXT,
+            "".join(f"{segment['text'].strip()} " for segment in segments),
+        )
+
+    def _post_progress(
+        self, result: TranscriptionResult, current: int, total: int
+    ) -> None:
+        """
+        Notifies the view that a file of a directory has been processed.
+
+        :param result: The result of the processed file.
+        :type result: TranscriptionResult
+        :param current: Number of files processed so far.
+        :type current: int
+        :param total: Number of files to process.
+        :type total: int
+        :return: None
+        """
+        self._post_ui_event(
+            UiEventType.PROGRESS,
+            self._get_progress_text(result, f"{current}/{total}"),
+            current=current,
+            total=total,
+        )
+
+    @staticmethod
+    def _get_progress_text(result: TranscriptionResult, progress: str) -> str:
+        """
+        Gets the line that reports a processed file, followed by its error if it
+        failed.
+
+        :param result: The result of the processed file.
+        :type result: TranscriptionResult
+        :param progress: The position of the file (e.g. "3/10").
+        :type progress: str
+        :return: The text that reports the file.
+        :rtype: str
+        """
+        text = f"[{progress}] {result.source_path}\n"
+
+        if not result.is_successful:
+            text += f"{result.error}\n"
+
+        return text
+
+    def _post_ui_event(
+        self,
+        event_type: UiEventType,
+        text: str = "",
+        current: int = 0,
+        total: int = 0,
+    ) -> None:
+        """
+        Queues an update of the view. It's safe to call from any thread.
+
+        :param event_type: The type of the update.
+        :type event_type: UiEventType
+        :param text: The text of the update, if any.
+        :type text: str
+        :param current: Number of processed files, for progress updates.
+        :type current: int
+        :param total: Number of files to process, for progress updates.
+        :type total: int
+        :return: None
+        """
+        self.ui_events.put(UiEvent(event_type, text, current=current, total=total))
+
     def _get_files_to_transcribe_from_directory(self) -> list[Path]:
         """
         Retrieves a list of files to transcribe from a directory.
@@ -307,24 +689,11 @@ class MainController:
                 "No output file types selected. Please select at least one."
             )
 
-        matching_files = []
-
-        for root, _, files in os.walk(self.transcription.audio_source_path):
-            for file in files:
-                if any(file.endswith(ext) for ext in c.SUPPORTED_FILE_EXTENSIONS):
-                    file_path = Path(root) / file
-
-                    if not self.transcription.should_overwrite and any(
-                        (file_path.with_suffix(f".{ext}")).exists()
-                        for ext in self.transcription.output_file_types
-                    ):
-                        print(f"{file_path} already has transcription(s). Skipping.")
-                        continue
-
-                    matching_files.append(file_path)
-                    print(f"{file_path} added to the list of files to transcribe!")
-
-        return matching_files
+        return DirectoryHandler.get_files_to_transcribe(
+            self.transcription.audio_source_path,
+            output_file_types=self.transcription.output_file_types,
+            should_overwrite=self.transcription.should_overwrite,
+        )
 
     def _start_recording_from_mic(self) -> None:
         """
@@ -336,6 +705,9 @@ class MainController:
 
         :return: None
         """
+        import speech_recognition as sr
+        import utils.audio_utils as au
+
         self._is_mic_recording = True
         audio_data = []
 
@@ -378,6 +750,11 @@ class MainController:
         :return: The path where the file should be saved.
         :rtype: Path
         """
+        if should_autosave:
+            return self._get_transcription_handler().get_output_path(
+                dataclasses.replace(self.transcription, audio_source_path=file_path)
+            )
+
         if self.transcription.output_file_types:
             is_one_output_file_type = len(self.transcription.output_file_types) == 1
         else:
@@ -393,27 +770,24 @@ class MainController:
             )
             initial_file_name += f".{file_type}"
 
-        if should_autosave:
-            return file_dir / initial_file_name
-        else:
-            default_extension = (
-                f".{file_type}" if self.transcription.output_file_types else None
-            )
-
-            file_types = [("All Files", "*.*")]
+        default_extension = (
+            f".{file_type}" if self.transcription.output_file_types else None
+        )
 
-            if is_one_output_file_type:
-                file_types.insert(0, (f"{file_type.upper()} file", f"*.{file_type}"))
+        file_types = [("All Files", "*.*")]
 
-            return Path(
-                filedialog.asksaveasfilename(
-                    initialdir=file_dir,
-                    initialfile=initial_file_name,
-                    title="Save as",
-                    defaultextension=default_extension,
-                    filetypes=file_types,
-                )
+        if is_one_output_file_type:
+            file_types.insert(0, (f"{file_type.upper()} file", f"*.{file_type}"))
+
+        return Path(
+            filedialog.asksaveasfilename(
+                initialdir=file_dir,
+                initialfile=initial_file_name,
+                title="Save as",
+                defaultextension=default_extension,
+                filetypes=file_types,
             )
+        )
 
     def _handle_exception(self, e: Exception) -> None:
         """
@@ -425,5 +799,5 @@ class MainController:
         :return: None
         """
         print(traceback.format_exc())
-        self.view.on_processed_transcription()
-        self.view.display_text(repr(e))
+        self._post_ui_event(UiEventType.PROCESSED_TRANSCRIPTION)
+        self._post_ui_event(UiEventType.DISPLAY_TEXT, repr(e))
@@ -1,17 +1,18 @@
-import os
-import shutil
-import traceback
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
 from typing import Callable, Optional
 
+import numpy as np
+import numpy.typing as npt
 import speech_recognition as sr
 from models.transcription import Transcription
-from moviepy.video.io.VideoFileClip import VideoFileClip
-from pydub import AudioSegment
-from pydub.silence import split_on_silence
+from utils import audio_cache
+from utils import audio_utils as au
 from utils import constants as c
-from utils.path_helper import ROOT_PATH
+from utils import payload_cache
+from utils.enums import UploadCodec
 
 
 class AudioHandler:
@@ -20,6 +21,9 @@ class AudioHandler:
         transcription: Transcription,
         should_split_on_silence: bool,
         transcription_func: Callable[[sr.AudioData, Transcription], str],
+        max_workers: int = 1,
+        max_retries: int = 0,
+        samples: Optional[npt.NDArray[np.int16]] = None,
     ) -> str:
         """
         Transcribes audio from a file using the Google Speech-to-Text API.
@@ -36,155 +40,237 @@ class AudioHandler:
         :type should_split_on_silence: bool
         :param transcription_func: The function to use for transcription.
         :type transcription_func: Callable[[sr.AudioData, Transcription], str]
-        :return: The transcribed text or an error message if transcription fails.
+        :param max_workers: Maximum number of chunks transcribed at the same time.
+        :type max_workers: int
+        :param max_retries: Number of times a failed chunk is transcribed again.
+        :type max_retries: int
+        :param samples: The decoded samples of the audio file, if it was already
+                        decoded.
+        :type samples: Optional[npt.NDArray[np.int16]]
+        :return: The transcribed text.
         :rtype: str
         """
-        chunks_directory = ROOT_PATH / "audio-chunks"
-        chunks_directory.mkdir(exist_ok=True)
+        if samples is None:
+            samples = AudioHandler.load_audio_file(transcription.audio_source_path)
+        if samples is None:
+            raise ValueError("Unsupported file type")
 
-        try:
-            audio = AudioHandler.load_audio_file(
-                transcription.audio_source_path, chunks_directory
+        if should_split_on_silence:
+            chunk_ranges = AudioHandler.split_audio_into_chunks(
+                samples, c.AUDIO_SAMPLE_RATE
             )
-            if audio is None:
-                raise ValueError("Unsupported file type")
+        else:
+            chunk_ranges = [(0, samples.size)]
 
-            if should_split_on_silence:
-                audio_chunks = AudioHandler.split_audio_into_chunks(audio)
-            else:
-                audio_chunks = [audio]
-
-            text = AudioHandler.process_audio_chunks(
-                audio_chunks, transcription, transcription_func, chunks_directory
-            )
-
-        except Exception:
-            text = traceback.format_exc()
-
-        finally:
-            AudioHandler.cleanup(chunks_directory)
-
-        return text
+        return AudioHandler.process_audio_chunks(
+            samples,
+            c.AUDIO_SAMPLE_RATE,
+            chunk_ranges,
+            transcription,
+            transcription_func,
+            max_workers=max_workers,
+            max_retries=max_retries,
+        )
 
     @staticmethod
-    def load_audio_file(
-        file_path: Path, chunks_directory: Path
-    ) -> Optional[AudioSegment]:
+    def load_audio_file(file_path: Path) -> Optional[npt.NDArray[np.int16]]:
         """
         Load the audio from the file or extract it from the video.
 
+        The audio is decoded to 16 kHz mono 16-bit PCM, which is the format expected
+        by the recognizers, or read from the decoded audio cache if it was already
+        decoded.
+
         :param file_path: Path to the file to be loaded.
         :type file_path: Path
-        :param chunks_directory: Directory to store intermediate audio files.
-        :type chunks_directory: Path
-        :return: Loaded AudioSegment object or None if unsupported file type.
-        :rtype: Optional[AudioSegment]
+        :return: The decoded samples or None if unsupported file type.
+        :rtype: Optional[npt.NDArray[np.int16]]
         """
-        content_type = file_path.suffix
-
-        if content_type in c.AUDIO_FILE_EXTENSIONS:
-            return AudioSegment.from_file(file_path)
+        if file_path.suffix.lower() not in c.SUPPORTED_FILE_EXTENSIONS:
+            return None
 
-        elif content_type in c.VIDEO_FILE_EXTENSIONS:
-            clip = VideoFileClip(str(file_path))
-            video_audio_path = chunks_directory / f"{file_path.stem}.wav"
-            clip.audio.write_audiofile(video_audio_path)
-            return AudioSegment.from_wav(video_audio_path)
-
-        return None
+        return audio_cache.load_audio(file_path)
 
     @staticmethod
-    def split_audio_into_chunks(sound: AudioSegment) -> AudioSegment:
+    def split_audio_into_chunks(
+        samples: npt.NDArray[np.int16], frame_rate: int
+    ) -> list[tuple[int, int]]:
         """
         Split the audio into chunks based on silence.
 
-        :param sound: The AudioSegment object to be split.
-        :type sound: AudioSegment
-        :return: List of audio chunks.
-        :rtype: AudioSegment
+        :param samples: Mono 16-bit PCM samples of the audio.
+        :type samples: npt.NDArray[np.int16]
+        :param frame_rate: Sample rate of the audio, in Hz.
+        :type frame_rate: int
+        :return: The `(start, end)` sample indices of each chunk.
+        :rtype: list[tuple[int, int]]
         """
-        return split_on_silence(
-            sound,
+        return au.split_on_silence(
+            samples,
+            frame_rate,
             min_silence_len=500,  # Minimum duration of silence required to consider a segment as a split point
-            silence_thresh=sound.dBFS
+            silence_thresh=au.get_dbfs(samples)
             - 40,  # Audio with a level -X decibels below the original audio level will be considered as silence
             keep_silence=100,  # Adds a buffer of silence before and after each split point
         )
 
     @staticmethod
     def process_audio_chunks(
-        audio_chunks: list[AudioSegment],
+        samples: npt.NDArray[np.int16],
+        frame_rate: int,
+        chunk_ranges: list[tuple[int, int]],
         transcription: Transcription,
         transcription_func: Callable[[sr.AudioData, Transcription], str],
-        chunks_directory: Path,
+        max_workers: int = 1,
+        max_retries: int = 0,
     ) -> str:
         """
         Process each audio chunk for transcription.
 
-        :param audio_chunks: List of audio chunks.
-        :type audio_chunks: list[AudioSegment]
+        The chunks are handed to the recognizer straight from the PCM samples, without
+        writing them to disk, and up to `max_workers` of them are transcribed at the
+        same time. The texts are joined in the order of the chunks, regardless of the
+        order in which they finish.
+
+        :param samples: Mono 16-bit PCM samples of the audio.
+        :type samples: npt.NDArray[np.int16]
+        :param frame_rate: Sample rate of the audio, in Hz.
+        :type frame_rate: int
+        :param chunk_ranges: The `(start, end)` sample indices of each chunk.
+        :type chunk_ranges: list[tuple[int, int]]
         :param transcription: Transcription object containing transcription details.
         :type transcription: Transcription
         :param transcription_func: The function to use for transcription.
         :type transcription_func: Callable[[sr.AudioData, Transcription], str]
-        :param chunks_directory: Directory to store intermediate audio files.
-        :type chunks_directory: Path
+        :param max_workers: Maximum number of chunks transcribed at the same time.
+        :type max_workers: int
+        :param max_retries: Number of times a failed chunk is transcribed again.
+        :type max_retries: int
+        :raises Exception: The error of the first chunk that still fails after all
+                           its retries.
         :return: The combined transcribed text.
         :rtype: str
         """
-        recognizer = sr.Recognizer()
+        if not chunk_ranges:
+            return ""
 
-        for idx, audio_chunk in enumerate(audio_chunks):
-            chunk_filename = os.path.join(chunks_directory, f"chunk{idx}.wav")
-            audio_chunk.export(chunk_filename, bitrate="64k", format="wav")
+        def transcribe_chunk(index: int) -> str:
+            start, end = chunk_ranges[index]
+            audio_data = sr.AudioData(
+                samples[start:end].tobytes(), frame_rate, samples.itemsize
+            )
 
-            with sr.AudioFile(chunk_filename) as source:
-                recognizer.adjust_for_ambient_noise(source)
-                audio_data = recognizer.record(source)
+            chunk_text = AudioHandler._transcribe_chunk_with_retries(
+                audio_data, transcription, transcription_func, max_retries
+            )
+            print(f"chunk {index + 1}/{len(chunk_ranges)} text: {chunk_text}")
 
-                try:
-                    chunk_text = transcription_func(
-                        audio_data,
-                        transcription,
-                    )
-                    print(f"chunk text: {chunk_text}")
-                    return chunk_text
+            return chunk_text
 
-                except Exception:
-                    return traceback.format_exc()
+        workers = max(1, min(max_workers, len(chunk_ranges)))
 
-        return ""
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                # `map` yields the results in the order of the chunks
+                return "".join(executor.map(transcribe_chunk, range(len(chunk_ranges))))
+            except Exception:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
 
     @staticmethod
-    def cleanup(chunks_directory: Path) -> None:
+    def _transcribe_chunk_with_retries(
+        audio_data: sr.AudioData,
+        transcription: Transcription,
+        transcription_func: Callable[[sr.AudioData, Transcription], str],
+        max_retries: int,
+    ) -> str:
         """
-        Clean up the `chunks` directory.
+        Transcribes a single chunk, retrying it with an exponential backoff if it fails.
 
-        :param chunks_directory: Directory to be deleted.
-        :type chunks_directory: Path
-        :rtype: None
+        :param audio_data: Audio of the chunk.
+        :type audio_data: sr.AudioData
+        :param transcription: Transcription object containing transcription details.
+        :type transcription: Transcription
+        :param transcription_func: The function to use for transcription.
+        :type transcription_func: Callable[[sr.AudioData, Transcription], str]
+        :param max_retries: Number of times the chunk is transcribed again if it fails.
+        :type max_retries: int
+        :return: The transcribed text of the chunk.
+        :rtype: str
         """
-        shutil.rmtree(chunks_directory)
+        attempt = 0
+
+        while True:
+            try:
+                return transcription_func(audio_data, transcription)
+            except Exception as e:
+                if attempt >= max_retries:
+                    raise
+
+                delay = 2**attempt
+                attempt += 1
+                print(f"Chunk failed ({e!r}), retrying in {delay}s")
+                time.sleep(delay)
 
     @staticmethod
-    def compress_audio(audio_data: sr.AudioData) -> BytesIO:
-        # Convert sr.AudioData to AudioSegment
-        audio_segment = AudioSegment(
-            data=audio_data.get_raw_data(),
-            sample_width=audio_data.sample_width,
-            frame_rate=audio_data.sample_rate,
-            channels=1,
+    def compress_audio(
+        audio_data: sr.AudioData, codec: UploadCodec, max_size: int
+    ) -> BytesIO:
+        """
+        Compress the audio to be uploaded, with the highest bitrate of the codec at
+        which it fits in `max_size` bytes.
+
+        :param audio_data: The audio to compress.
+        :type audio_data: sr.AudioData
+        :param codec: The codec to compress the audio with.
+        :type codec: UploadCodec
+        :param max_size: Size the compressed audio should fit in, in bytes. It's only
+                         used to choose the bitrate, so it may still be exceeded.
+        :type max_size: int
+        :return: The compressed audio, named after its codec.
+        :rtype: BytesIO
+        """
+        return AudioHandler.compress_samples(
+            np.frombuffer(audio_data.get_raw_data(convert_width=2), np.int16),
+            codec,
+            max_size,
+            sample_rate=audio_data.sample_rate,
         )
 
-        # Compress the audio: reduce frame rate and export as MP3
-        compressed_audio = BytesIO()
-        audio_segment.set_frame_rate(12000).export(
-            compressed_audio, format="mp3", bitrate="32k"
+    @staticmethod
+    def compress_samples(
+        samples: npt.NDArray[np.int16],
+        codec: UploadCodec,
+        max_size: int,
+        sample_rate: int = c.AUDIO_SAMPLE_RATE,
+    ) -> BytesIO:
+        """
+        Compress mono 16-bit PCM samples to be uploaded, like `compress_audio`.
+
+        :param samples: Mono 16-bit PCM samples.
+        :type samples: npt.NDArray[np.int16]
+        :param codec: The codec to compress the samples with.
+        :type codec: UploadCodec
+        :param max_size: Size the compressed audio should fit in, in bytes.
+        :type max_size: int
+        :param sample_rate: Sample rate of the samples, in Hz.
+        :type sample_rate: int
+        :return: The compressed audio, named after its codec.
+        :rtype: BytesIO
+        """
+        bitrate_kbps = au.get_upload_bitrate(
+            codec, samples.size / sample_rate, max_size
+        )
+        compressed_audio = BytesIO(
+            payload_cache.get_or_encode(
+                np.ascontiguousarray(samples).data,
+                (codec.value, bitrate_kbps, sample_rate),
+                lambda: au.encode_audio(samples, codec, bitrate_kbps, sample_rate),
+            )
         )
-        compressed_audio.seek(0)
 
         # Set name to be treated as a file
-        compressed_audio.name = "audiotext-audio.mp3"
+        compressed_audio.name = f"audiotext-audio.{codec.value}"
 
         size_in_mb = len(compressed_audio.getvalue()) / (1024 * 1024)
         print(f"Compressed audio size: {size_in_mb:.2f} MB")
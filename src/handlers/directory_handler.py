@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+import utils.config_manager as cm
+from utils import constants as c
+from utils.directory_manifest import DirectoryManifest
+
+
+class DirectoryHandler:
+    """
+    Finds the files to transcribe in directories.
+    """
+
+    @staticmethod
+    def get_files_to_transcribe(
+        dir_path: Path,
+        output_file_types: list[str],
+        should_overwrite: bool,
+        output_dir: Optional[Path] = None,
+        should_print_summary: bool = True,
+    ) -> list[Path]:
+        """
+        Retrieves a list of files to transcribe from a directory and its
+        subdirectories. The extensions of the files are matched case-insensitively.
+
+        The listings of the directories are kept in a manifest between scans, so only
+        the directories that changed since the last scan are listed again.
+
+        :param dir_path: The directory to look for files in.
+        :type dir_path: Path
+        :param output_file_types: The output file types of the transcriptions.
+        :type output_file_types: list[str]
+        :param should_overwrite: Whether files that already have an output file should
+                                 be transcribed again. If False, they're skipped.
+        :type should_overwrite: bool
+        :param output_dir: Directory of the output files. Defaults to the directory of
+                           each file.
+        :type output_dir: Optional[Path]
+        :param should_print_summary: Whether to print how many files were found.
+        :type should_print_summary: bool
+        :return: A list of file paths to transcribe in the directory.
+        :rtype: list[Path]
+        """
+        config_cache = cm.ConfigManager.get_config_cache()
+        manifest = DirectoryManifest(
+            dir_path,
+            max_size_mb=(
+                config_cache.directory_manifest_size_mb
+                if config_cache.use_directory_manifest
+                else None
+            ),
+        )
+        output_suffixes = {
+            f".{c.FORMATS_TO_FILE_TYPES.get(file_type, file_type)}"
+            for file_type in output_file_types
+        }
+        output_dir_listing = manifest.get_listing(output_dir) if output_dir else None
+        matching_files = []
+        skipped_files_count = 0
+        dirs_to_scan = [dir_path]
+
+        while dirs_to_scan:
+            current_dir = dirs_to_scan.pop()
+            listing = manifest.get_listing(current_dir)
+
+            if not listing:
+                continue
+
+            if output_dir:
+                output_file_names = (
+                    output_dir_listing.output_file_names
+                    if output_dir_listing
+                    else set()
+                )
+            else:
+                output_file_names = listing.output_file_names
+
+            for file_name in sorted(listing.media_files):
+                stem = os.path.splitext(file_name)[0]
+
+                if not should_overwrite and any(
+                    f"{stem}{suffix}" in output_file_names for suffix in output_suffixes
+                ):
+                    skipped_files_count += 1
+                    continue
+
+                matching_files.append(current_dir / file_name)
+
+            # Reversed so that the subdirectories are scanned in alphabetical order
+            dirs_to_scan.extend(
+                current_dir / subdir_name
+                for subdir_name in sorted(listing.subdir_names, reverse=True)
+            )
+
+        manifest.save()
+
+        if should_print_summary:
+            print(
+                f"{len(matching_files)} file(s) to transcribe found in {dir_path}. "
+                f"{skipped_files_count} file(s) skipped because they already have "
+                "transcription(s)."
+            )
+
+        return matching_files
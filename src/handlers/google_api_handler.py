@@ -1,21 +1,50 @@
+from typing import Optional
+
 import speech_recognition as sr
 from interfaces.transcribable import Transcribable
 from models.transcription import Transcription
+from utils import payload_cache
 from utils.env_keys import EnvKeys
 
 
+class CachedFlacAudioData(sr.AudioData):  # type: ignore[misc]
+    """
+    Audio data whose FLAC encoding goes through the payload cache, so retrying a
+    failed request doesn't encode the chunk again.
+    """
+
+    def get_flac_data(
+        self, convert_rate: Optional[int] = None, convert_width: Optional[int] = None
+    ) -> bytes:
+        return payload_cache.get_or_encode(
+            self.frame_data,
+            ("flac", self.sample_rate, self.sample_width, convert_rate, convert_width),
+            lambda: super(CachedFlacAudioData, self).get_flac_data(
+                convert_rate, convert_width
+            ),
+        )
+
+
 class GoogleApiHandler(Transcribable):
     @staticmethod
     def transcribe(audio_data: sr.AudioData, transcription: Transcription) -> str:
         r = sr.Recognizer()
 
-        text = str(
-            r.recognize_google(
-                audio_data,
-                language=transcription.language_code,
-                key=EnvKeys.GOOGLE_API_KEY.get_value() or None,
+        try:
+            text = str(
+                r.recognize_google(
+                    CachedFlacAudioData(
+                        audio_data.frame_data,
+                        audio_data.sample_rate,
+                        audio_data.sample_width,
+                    ),
+                    language=transcription.language_code,
+                    key=EnvKeys.GOOGLE_API_KEY.get_value() or None,
+                )
             )
-        )
+        except sr.UnknownValueError:  # The chunk has no recognizable speech
+            return ""
+
         text = f"{text}. "
 
         return text
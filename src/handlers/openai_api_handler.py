@@ -1,53 +1,413 @@
+import asyncio
+import functools
+import os
+import threading
+import weakref
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Optional
+
+import numpy as np
+import numpy.typing as npt
 import speech_recognition as sr
+import utils.audio_utils as au
 import utils.config_manager as cm
+import utils.constants as c
+import utils.transcript_utils as tu
 from handlers.audio_handler import AudioHandler
 from interfaces.transcribable import Transcribable
+from models.config.config_whisper_api import ConfigWhisperApi
 from models.transcription import Transcription
-from openai import OpenAI
-from utils.enums import WhisperApiResponseFormats
+from utils.enums import UploadCodec, WhisperApiResponseFormats
 from utils.env_keys import EnvKeys
+from utils.upload_scheduler import UploadScheduler
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+# API key, timeouts and connection limit a client was created with
+ClientKey = tuple[str, float, float, int]
+
+# Clients of the current process. They are reused by every request, so the
+# connections to the API are kept alive between chunks and files instead of paying a
+# new TLS handshake each time.
+_clients: dict[ClientKey, "OpenAI"] = {}
+# Async clients are bound to the event loop they are used in, so there is one per loop.
+# They must be closed with `close_async_clients` before their loop finishes, or their
+# connections are left open.
+_async_clients: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[ClientKey, "AsyncOpenAI"]
+] = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
 
 
 class OpenAiApiHandler(Transcribable):
     @staticmethod
     def transcribe(audio_data: sr.AudioData, transcription: Transcription) -> str:
-        if not transcription.language_code:
-            raise ValueError(
-                "The language provided is not correct. Please select one of the list."
+        config = cm.ConfigManager.get_config_whisper_api()
+        client = OpenAiApiHandler.get_client(config)
+        compressed_audio = AudioHandler.compress_audio(
+            audio_data,
+            UploadCodec(config.upload_codec),
+            OpenAiApiHandler._get_max_upload_size(config),
+        )
+        whisper_api_transcription = client.audio.transcriptions.create(
+            **OpenAiApiHandler._get_request_params(
+                compressed_audio, transcription, config
             )
+        )
+
+        return OpenAiApiHandler._to_text(whisper_api_transcription, config)
 
+    @staticmethod
+    async def transcribe_async(
+        samples: npt.NDArray[np.int16],
+        transcription: Transcription,
+        upload_scheduler: Optional[UploadScheduler] = None,
+    ) -> str:
+        """
+        Transcribes the audio without blocking the event loop, so that several files
+        can be uploaded concurrently over the same connection pool.
+
+        Audio that would exceed `max_upload_size_mb` once compressed is split at quiet
+        moments into pieces that fit. The pieces are uploaded concurrently and their
+        transcriptions are merged, with their timestamps shifted to the position of
+        each piece in the audio.
+
+        :param samples: The decoded samples of the audio.
+        :type samples: npt.NDArray[np.int16]
+        :param transcription: The transcription the audio belongs to.
+        :type transcription: Transcription
+        :param upload_scheduler: The scheduler of the requests. If None, the audio
+                                 gets its own.
+        :type upload_scheduler: Optional[UploadScheduler]
+        :return: The transcription of the audio in the configured response format.
+        :rtype: str
+        """
         config = cm.ConfigManager.get_config_whisper_api()
-        compressed_audio = AudioHandler.compress_audio(audio_data)
-        timestamp_granularities = (
-            config.timestamp_granularities
-            if config.response_format == WhisperApiResponseFormats.VERBOSE_JSON.value
-            else None
-        )
-
-        client = OpenAI(
-            api_key=EnvKeys.OPENAI_API_KEY.get_value(),
-            timeout=120.0,  # 2 minutes
-        )
-
-        if timestamp_granularities:
-            whisper_api_transcription = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=compressed_audio,
-                language=transcription.language_code,
-                response_format=config.response_format,
-                temperature=config.temperature,
-                timestamp_granularities=timestamp_granularities,
+        client = OpenAiApiHandler.get_async_client(config)
+        scheduler = upload_scheduler or OpenAiApiHandler.create_upload_scheduler()
+        codec = UploadCodec(config.upload_codec)
+        max_upload_size = OpenAiApiHandler._get_max_upload_size(config)
+
+        # The pieces are as long as fits at the lowest bitrate of the codec, and each
+        # one is then compressed with the highest bitrate at which it fits
+        min_bitrate_kbps = c.UPLOAD_CODEC_BITRATES_KBPS[codec.value][0]
+        max_piece_seconds = int(0.95 * max_upload_size * 8 / 1000 / min_bitrate_kbps)
+        is_too_long = samples.size > max_piece_seconds * c.AUDIO_SAMPLE_RATE
+        windows = au.split_into_windows(
+            samples, max_piece_seconds if is_too_long else 0
+        )
+        # Each compression runs an ffmpeg process with its own copy of the samples, so
+        # only as many windows are compressed at a time as can be uploaded
+        compression_semaphore = asyncio.Semaphore(
+            max(1, min(config.max_concurrent_uploads, os.cpu_count() or 1))
+        )
+
+        async def transcribe_window(start: int, end: int) -> list[tuple[float, str]]:
+            async with compression_semaphore:
+                # Compressing the audio runs ffmpeg, which would block the other
+                # uploads
+                pieces = await asyncio.to_thread(
+                    OpenAiApiHandler._compress_pieces,
+                    samples,
+                    start,
+                    end,
+                    codec,
+                    max_upload_size,
+                )
+            texts = await asyncio.gather(
+                *(
+                    scheduler.run(
+                        functools.partial(
+                            OpenAiApiHandler._create_transcription,
+                            client,
+                            piece,
+                            transcription,
+                            config,
+                        )
+                    )
+                    for _, piece in pieces
+                )
             )
-        else:
-            whisper_api_transcription = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=compressed_audio,
-                language=transcription.language_code,
-                response_format=config.response_format,
-                temperature=config.temperature,
+
+            return [
+                (piece_start / c.AUDIO_SAMPLE_RATE, text)
+                for (piece_start, _), text in zip(pieces, texts)
+            ]
+
+        window_pieces = await asyncio.gather(
+            *(transcribe_window(start, end) for start, end in windows)
+        )
+        pieces = [
+            piece for pieces_of_window in window_pieces for piece in pieces_of_window
+        ]
+
+        if len(pieces) > 1:
+            print(f"Audio split into {len(pieces)} pieces to fit the upload limit")
+
+        return tu.merge_transcripts(pieces, config.response_format)
+
+    @staticmethod
+    def get_client(config: ConfigWhisperApi) -> "OpenAI":
+        """
+        Gets the client of the current process for the configured API key, creating
+        it on first use. It's thread-safe, like the client itself.
+
+        :param config: The Whisper API configuration.
+        :type config: ConfigWhisperApi
+        :return: The shared client.
+        :rtype: OpenAI
+        """
+        # Imported here since it takes a while and it's only needed for this method
+        import httpx
+        from openai import DefaultHttpxClient, OpenAI
+
+        key = OpenAiApiHandler._get_client_key(config)
+
+        with _clients_lock:
+            if not (client := _clients.get(key)):
+                client = OpenAI(
+                    api_key=key[0],
+                    timeout=httpx.Timeout(
+                        config.timeout_seconds, connect=config.connect_timeout_seconds
+                    ),
+                    http_client=DefaultHttpxClient(
+                        limits=OpenAiApiHandler._get_limits(config)
+                    ),
+                )
+                _clients[key] = client
+
+        return client
+
+    @staticmethod
+    def get_async_client(config: ConfigWhisperApi) -> "AsyncOpenAI":
+        """
+        Gets the async client of the running event loop for the configured API key,
+        creating it on first use.
+
+        :param config: The Whisper API configuration.
+        :type config: ConfigWhisperApi
+        :return: The shared async client.
+        :rtype: AsyncOpenAI
+        """
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        key = OpenAiApiHandler._get_client_key(config)
+        loop = asyncio.get_running_loop()
+
+        with _clients_lock:
+            loop_clients = _async_clients.setdefault(loop, {})
+
+            if not (client := loop_clients.get(key)):
+                client = AsyncOpenAI(
+                    api_key=key[0],
+                    # The upload scheduler retries the requests instead
+                    max_retries=0,
+                    timeout=httpx.Timeout(
+                        config.timeout_seconds, connect=config.connect_timeout_seconds
+                    ),
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=OpenAiApiHandler._get_limits(config)
+                    ),
+                )
+                loop_clients[key] = client
+
+        return client
+
+    @staticmethod
+    async def close_async_clients() -> None:
+        """
+        Closes the async clients of the running event loop and their connections.
+        It must be awaited before the loop finishes.
+
+        :return: None
+        """
+        with _clients_lock:
+            loop_clients = _async_clients.pop(asyncio.get_running_loop(), {})
+
+        for client in loop_clients.values():
+            await client.close()
+
+    @staticmethod
+    def create_upload_scheduler() -> UploadScheduler:
+        """
+        Creates a scheduler for the async requests to the API, limited as configured.
+        It must be used from a single event loop.
+
+        :return: The upload scheduler.
+        :rtype: UploadScheduler
+        """
+        config = cm.ConfigManager.get_config_whisper_api()
+
+        return UploadScheduler(
+            max_concurrent_uploads=config.max_concurrent_uploads,
+            requests_per_minute=config.requests_per_minute,
+            max_retries=config.max_retries,
+            get_retry_after=OpenAiApiHandler.get_retry_after,
+        )
+
+    @staticmethod
+    def get_retry_after(error: Exception) -> Optional[float]:
+        """
+        Determines whether a failed request should be retried.
+
+        :param error: The error of the request.
+        :type error: Exception
+        :return: The seconds the API asked to wait before retrying (0 if it didn't
+                 say), or None if the request shouldn't be retried.
+        :rtype: Optional[float]
+        """
+        from openai import APIConnectionError, APIStatusError
+
+        # Timeouts are connection errors too
+        if isinstance(error, APIConnectionError):
+            return 0.0
+
+        if not isinstance(error, APIStatusError):
+            return None
+
+        # Running out of credits also responds with 429, but retrying won't help
+        is_rate_limited = (
+            error.status_code == 429 and error.code != "insufficient_quota"
+        )
+
+        if not is_rate_limited and error.status_code < 500:
+            return None
+
+        try:
+            return float(error.response.headers.get("retry-after", 0))
+        except ValueError:  # It can also be an HTTP date
+            return 0.0
+
+    @staticmethod
+    def _get_client_key(config: ConfigWhisperApi) -> ClientKey:
+        return (
+            EnvKeys.OPENAI_API_KEY.get_value(),
+            config.timeout_seconds,
+            config.connect_timeout_seconds,
+            config.max_connections,
+        )
+
+    @staticmethod
+    def _get_limits(config: ConfigWhisperApi) -> Any:
+        import httpx
+
+        # Every connection of the pool is kept alive, since idle ones are reused by
+        # the next chunk or file
+        return httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_connections,
+        )
+
+    @staticmethod
+    def _compress_pieces(
+        samples: npt.NDArray[np.int16],
+        start: int,
+        end: int,
+        codec: UploadCodec,
+        max_upload_size: int,
+    ) -> list[tuple[int, BytesIO]]:
+        """
+        Compresses the samples between `start` and `end` to be uploaded. If they don't
+        fit in `max_upload_size` bytes, they are split in halves at a quiet moment
+        until every piece fits.
+
+        :param samples: The decoded samples of the audio.
+        :type samples: npt.NDArray[np.int16]
+        :param start: Index of the first sample to compress.
+        :type start: int
+        :param end: Index after the last sample to compress.
+        :type end: int
+        :param codec: The codec to compress the samples with.
+        :type codec: UploadCodec
+        :param max_upload_size: Maximum size of each compressed piece, in bytes.
+        :type max_upload_size: int
+        :raises ValueError: If a second of audio doesn't fit in `max_upload_size`.
+        :return: The index of the first sample of each piece and its compressed audio,
+                 in the order of the pieces.
+        :rtype: list[tuple[int, BytesIO]]
+        """
+        pieces = []
+        ranges = [(start, end)]
+
+        while ranges:
+            piece_start, piece_end = ranges.pop(0)
+            piece_samples = samples[piece_start:piece_end]
+            compressed_audio = AudioHandler.compress_samples(
+                piece_samples, codec, max_upload_size
             )
 
+            if compressed_audio.getbuffer().nbytes <= max_upload_size:
+                pieces.append((piece_start, compressed_audio))
+                continue
+
+            half_seconds = piece_samples.size // c.AUDIO_SAMPLE_RATE // 2
+
+            if half_seconds < 1:
+                raise ValueError(
+                    "The audio can't be split into pieces small enough to be "
+                    "uploaded. Please increase `max_upload_size_mb` in the "
+                    "`config.ini` file."
+                )
+
+            # The halves go first, so the pieces stay in order
+            ranges[:0] = [
+                (piece_start + half_start, piece_start + half_end)
+                for half_start, half_end in au.split_into_windows(
+                    piece_samples, half_seconds
+                )
+            ]
+
+        return pieces
+
+    @staticmethod
+    def _get_max_upload_size(config: ConfigWhisperApi) -> int:
+        return int(config.max_upload_size_mb * 1024 * 1024)
+
+    @staticmethod
+    async def _create_transcription(
+        client: "AsyncOpenAI",
+        compressed_audio: BytesIO,
+        transcription: Transcription,
+        config: ConfigWhisperApi,
+    ) -> str:
+        # A new file object is uploaded on every attempt, since the previous attempt
+        # may have read part of it
+        file = (compressed_audio.name, compressed_audio.getvalue())
+        whisper_api_transcription = await client.audio.transcriptions.create(
+            **OpenAiApiHandler._get_request_params(file, transcription, config)
+        )
+
+        return OpenAiApiHandler._to_text(whisper_api_transcription, config)
+
+    @staticmethod
+    def _get_request_params(
+        file: Any,
+        transcription: Transcription,
+        config: ConfigWhisperApi,
+    ) -> dict[str, Any]:
+        if not transcription.language_code:
+            raise ValueError(
+                "The language provided is not correct. Please select one of the list."
+            )
+
+        params: dict[str, Any] = {
+            "model": "whisper-1",
+            "file": file,
+            "language": transcription.language_code,
+            "response_format": config.response_format,
+            "temperature": config.temperature,
+        }
+
+        if config.response_format == WhisperApiResponseFormats.VERBOSE_JSON.value:
+            params["timestamp_granularities"] = config.timestamp_granularities
+
+        return params
+
+    @staticmethod
+    def _to_text(whisper_api_transcription: Any, config: ConfigWhisperApi) -> str:
         if WhisperApiResponseFormats.JSON.value in config.response_format:
-            return whisper_api_transcription.to_json()
+            return str(whisper_api_transcription.to_json())
 
         return str(whisper_api_transcription)
@@ -0,0 +1,452 @@
+import asyncio
+import os
+import time
+import traceback
+from pathlib import Path
+from typing import AsyncGenerator, Optional
+
+import utils.config_manager as cm
+import utils.constants as c
+from handlers.audio_handler import AudioHandler
+from handlers.google_api_handler import GoogleApiHandler
+from handlers.openai_api_handler import OpenAiApiHandler
+from handlers.whisperx_handler import SegmentsCallback, WhisperXHandler
+from models.transcription import Transcription
+from models.transcription_result import TranscriptionResult
+from utils import file_utils as fu
+from utils.enums import JobState, TranscriptionMethod
+from utils.job_journal import JobJournal
+from utils.result_cache import ResultCache
+from utils.upload_scheduler import UploadScheduler
+
+
+class TranscriptionHandler:
+    """
+    Transcribes and saves files with the method set in the transcription, regardless
+    of who drives it (the main window or a worker process).
+    """
+
+    def __init__(self, threads: int = 4) -> None:
+        self._whisperx_handler = WhisperXHandler(threads=threads)
+
+    async def transcribe(
+        self,
+        transcription: Transcription,
+        on_segments: Optional[SegmentsCallback] = None,
+        journal: Optional[JobJournal] = None,
+        upload_scheduler: Optional[UploadScheduler] = None,
+    ) -> TranscriptionResult:
+        """
+        Transcribes the audio file of the transcription with its transcription method.
+        The audio is decoded once, before transcribing it with any method.
+
+        :param transcription: An instance of Transcription containing information
+                              about the audio file to transcribe.
+        :type transcription: Transcription
+        :param on_segments: Called with the segments transcribed so far by WhisperX
+                            while the transcription is still running. It isn't
+                            called by the other methods nor for cached results.
+        :type on_segments: Optional[SegmentsCallback]
+        :param journal: The journal of the directory transcription the file belongs
+                        to, if any, which records when it starts decoding and
+                        transcribing.
+        :type journal: Optional[JobJournal]
+        :param upload_scheduler: The scheduler of the Whisper API requests, shared by
+                                 the files transcribed at the same time. If None,
+                                 the file gets its own.
+        :type upload_scheduler: Optional[UploadScheduler]
+        :return: The result of the transcription. If it fails, its `error` attribute
+                 contains the traceback of the error.
+        :rtype: TranscriptionResult
+        """
+        start = time.perf_counter()
+        result = TranscriptionResult(source_path=transcription.audio_source_path)
+
+        result_cache = None
+        decode_time = 0.0
+
+        try:
+            try:
+                config_cache = cm.ConfigManager.get_config_cache()
+
+                if config_cache.use_result_cache:
+                    result_cache = ResultCache(
+                        max_size_mb=config_cache.result_cache_size_mb
+                    )
+
+                cached_result = (
+                    result_cache.get(transcription) if result_cache else None
+                )
+            except Exception as e:
+                # The file is still transcribed if the cache can't be read
+                print(
+                    f"Could not read the result cache for "
+                    f"{transcription.audio_source_path}: {e!r}"
+                )
+                cached_result = None
+
+            if cached_result:
+                print(f"{transcription.audio_source_path} found in the result cache")
+                cached_result.timings["total"] = time.perf_counter() - start
+                return cached_result
+
+            if journal:
+                journal.record(transcription.audio_source_path, JobState.DECODING)
+
+            decode_start = time.perf_counter()
+            # Decoded in a thread so that the uploads of other files keep going
+            samples = await asyncio.to_thread(
+                AudioHandler.load_audio_file, transcription.audio_source_path
+            )
+            decode_time = time.perf_counter() - decode_start
+
+            if samples is None:
+                raise ValueError("Unsupported file type")
+
+            if journal:
+                journal.record(transcription.audio_source_path, JobState.TRANSCRIBING)
+
+            if transcription.method == TranscriptionMethod.GOOGLE_API:
+                config_google_api = cm.ConfigManager.get_config_google_api()
+                result.text = AudioHandler.get_transcription(
+                    transcription=transcription,
+                    transcription_func=GoogleApiHandler.transcribe,
+                    should_split_on_silence=True,
+                    max_workers=config_google_api.max_concurrent_chunks,
+                    max_retries=config_google_api.max_retries,
+                    samples=samples,
+                )
+            elif transcription.method == TranscriptionMethod.WHISPER_API:
+                upload_start = time.perf_counter()
+                result.text = await OpenAiApiHandler.transcribe_async(
+                    samples, transcription, upload_scheduler
+                )
+                result.timings["upload"] = time.perf_counter() - upload_start
+            elif transcription.method == TranscriptionMethod.WHISPERX:
+                result = await self._whisperx_handler.transcribe_file(
+                    transcription, on_segments=on_segments, samples=samples
+                )
+            else:
+                raise ValueError(
+                    "Incorrect transcription method. Please check the `config.ini` "
+                    "file."
+                )
+        except Exception:
+            result.error = traceback.format_exc()
+
+        if result_cache:
+            result_cache.put(transcription, result)
+
+        result.timings["decode"] = decode_time
+        result.timings["total"] = time.perf_counter() - start
+
+        return result
+
+    async def transcribe_and_save(
+        self,
+        transcription: Transcription,
+        output_dir: Optional[Path] = None,
+        journal: Optional[JobJournal] = None,
+        upload_scheduler: Optional[UploadScheduler] = None,
+    ) -> TranscriptionResult:
+        """
+        Transcribes the audio file of the transcription and saves the result to the
+        output files of its output file types.
+
+        :param transcription: The transcription of a single file.
+        :type transcription: Transcription
+        :param output_dir: Directory where the output files are saved. Defaults to the
+                           directory of the audio file.
+        :type output_dir: Optional[Path]
+        :param journal: The journal of the directory transcription the file belongs
+                        to, if any, which records the state of the file.
+        :type journal: Optional[JobJournal]
+        :param upload_scheduler: The scheduler of the Whisper API requests, shared by
+                                 the files transcribed at the same time.
+        :type upload_scheduler: Optional[UploadScheduler]
+        :return: The result of the transcription. If it or saving it fails, its
+                 `error` attribute contains the traceback of the error.
+        :rtype: TranscriptionResult
+        """
+        result = await self.transcribe(
+            transcription, journal=journal, upload_scheduler=upload_scheduler
+        )
+
+        if result.is_successful:
+            try:
+                self.save(
+                    transcription,
+                    result,
+                    file_path=self.get_output_path(transcription, output_dir),
+                    should_overwrite=transcription.should_overwrite,
+                )
+            except Exception:
+                result.error = traceback.format_exc()
+
+        if journal:
+            journal.record(
+                transcription.audio_source_path,
+                JobState.WRITTEN if result.is_successful else JobState.FAILED,
+                error=result.error,
+                output_paths=self.get_output_paths(transcription, output_dir),
+            )
+
+        return result
+
+    async def transcribe_and_save_files(
+        self,
+        transcriptions: list[Transcription],
+        output_dir: Optional[Path] = None,
+        journal: Optional[JobJournal] = None,
+    ) -> AsyncGenerator[TranscriptionResult, None]:
+        """
+        Transcribes and saves the files of the transcriptions in this process.
+
+        Whisper API transcriptions are network-bound, so up to `max_concurrent_uploads`
+        files are transcribed at the same time, sharing an upload scheduler that keeps
+        them under the rate limit. Files of the other methods are transcribed one at a
+        time.
+
+        :param transcriptions: One transcription per file to transcribe.
+        :type transcriptions: list[Transcription]
+        :param output_dir: Directory where the output files are saved. Defaults to the
+                           directory of each audio file.
+        :type output_dir: Optional[Path]
+        :param journal: The journal of the directory transcription, if any.
+        :type journal: Optional[JobJournal]
+        :return: An async generator of the result of each file, as soon as it
+                 finishes.
+        :rtype: AsyncGenerator[TranscriptionResult, None]
+        """
+        upload_scheduler = None
+        max_concurrent_files = 1
+
+        if any(t.method == TranscriptionMethod.WHISPER_API for t in transcriptions):
+            config_whisper_api = cm.ConfigManager.get_config_whisper_api()
+            upload_scheduler = self.create_upload_scheduler()
+            max_concurrent_files = max(1, config_whisper_api.max_concurrent_uploads)
+
+        remaining_transcriptions = iter(transcriptions)
+        pending: set[asyncio.Task[TranscriptionResult]] = set()
+
+        try:
+            while True:
+                while len(pending) < max_concurrent_files and (
+                    transcription := next(remaining_transcriptions, None)
+                ):
+                    pending.add(
+                        asyncio.create_task(
+                            self.transcribe_and_save(
+                                transcription, output_dir, journal, upload_scheduler
+                            )
+                        )
+                    )
+
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+            if upload_scheduler and upload_scheduler.metrics.requests:
+                print(f"Whisper API uploads: {upload_scheduler.metrics.get_summary()}")
+
+    @staticmethod
+    async def close_async_clients() -> None:
+        """
+        Closes the API clients of the running event loop. It must be awaited before
+        the loop finishes, once nothing else is transcribed on it.
+
+        :return: None
+        """
+        await OpenAiApiHandler.close_async_clients()
+
+    @staticmethod
+    def create_upload_scheduler() -> UploadScheduler:
+        """
+        Creates a scheduler for the Whisper API requests, limited as configured, to be
+        shared by the files transcribed at the same time. It must be used from a
+        single event loop.
+
+        :return: The upload scheduler.
+        :rtype: UploadScheduler
+        """
+        return OpenAiApiHandler.create_upload_scheduler()
+
+    def save(
+        self,
+        transcription: Transcription,
+        result: TranscriptionResult,
+        file_path: Path,
+        should_overwrite: bool,
+    ) -> None:
+        """
+        Saves the transcription to a text file and optionally generate subtitles.
+
+        :param transcription: The transcription whose result is saved.
+        :type transcription: Transcription
+        :param result: The result of the transcription.
+        :type result: TranscriptionResult
+        :param file_path: The path where the text file will be saved.
+        :type file_path: Path
+        :param should_overwrite: Indicates whether existing files should be overwritten
+                                 if they exist.
+        :type should_overwrite: bool
+        :raises ValueError: If there is nothing to save, the text file would replace
+                            the transcribed file or the transcription method is not
+                            supported.
+        :return: None
+        """
+        if not result.is_successful:
+            raise ValueError(
+                "The transcription failed, so there is nothing to save. Please "
+                "generate it again."
+            )
+
+        if transcription.method == TranscriptionMethod.WHISPERX:
+            if not transcription.output_file_types:
+                raise ValueError(
+                    "There are no output file types selected. Please select at least "
+                    "one."
+                )
+
+            self._whisperx_handler.save_transcription(
+                result,
+                file_path=file_path,
+                output_file_types=transcription.output_file_types,
+                should_overwrite=should_overwrite,
+            )
+        elif transcription.method in [
+            TranscriptionMethod.GOOGLE_API,
+            TranscriptionMethod.WHISPER_API,
+        ]:
+            if not result.text:
+                raise ValueError(
+                    "There is no transcription available. Please generate it again."
+                )
+
+            if file_path.resolve() == transcription.audio_source_path.resolve():
+                raise ValueError(
+                    "The transcription can't be saved over the transcribed file. "
+                    "Please choose another path."
+                )
+
+            if should_overwrite or not os.path.exists(file_path):
+                with fu.open_atomically(file_path) as file:
+                    file.write(result.text)
+        else:
+            raise ValueError(
+                "Incorrect transcription method. Please check the `config.ini` file."
+            )
+
+    @staticmethod
+    def get_output_path(
+        transcription: Transcription, output_dir: Optional[Path] = None
+    ) -> Path:
+        """
+        Gets the path to save the transcription of its audio file to, which is named
+        after the audio file.
+
+        :param transcription: The transcription of a single file.
+        :type transcription: Transcription
+        :param output_dir: Directory of the output files. Defaults to the directory of
+                           the audio file.
+        :type output_dir: Optional[Path]
+        :return: The path of the text file for the Google API and the Whisper API.
+                 For WhisperX, a path with the name of the audio file, from which
+                 the name of each output file is derived.
+        :rtype: Path
+        """
+        source_path = transcription.audio_source_path
+        output_dir = output_dir or source_path.parent
+
+        if transcription.method == TranscriptionMethod.WHISPERX:
+            return output_dir / source_path.name
+
+        output_file_type = (transcription.output_file_types or ["txt"])[0]
+        file_type = c.FORMATS_TO_FILE_TYPES.get(output_file_type, output_file_type)
+
+        return output_dir / f"{source_path.stem}.{file_type}"
+
+    @staticmethod
+    def get_output_paths(
+        transcription: Transcription, output_dir: Optional[Path] = None
+    ) -> list[Path]:
+        """
+        Gets the paths of every output file the transcription of its audio file is
+        saved to.
+
+        :param transcription: The transcription of a single file.
+        :type transcription: Transcription
+        :param output_dir: Directory of the output files. Defaults to the directory of
+                           the audio file.
+        :type output_dir: Optional[Path]
+        :return: The path of the text file for the Google API and the Whisper API, or
+                 the path of each output file type for WhisperX.
+        :rtype: list[Path]
+        """
+        output_path = TranscriptionHandler.get_output_path(transcription, output_dir)
+
+        if transcription.method == TranscriptionMethod.WHISPERX:
+            return [
+                output_path.with_name(f"{output_path.stem}.{output_file_type}")
+                for output_file_type in transcription.output_file_types or []
+            ]
+
+        return [output_path]
+
+    @staticmethod
+    def export(transcription: Transcription) -> list[Path]:
+        """
+        Exports the output files of previous WhisperX transcriptions again from their
+        sidecar files, without transcribing them. Existing output files are
+        overwritten, since exporting them with the current options is the goal.
+
+        :param transcription: The transcription whose `audio_source_path` is the
+                              transcribed file, or a directory to export every
+                              transcribed file in it.
+        :type transcription: Transcription
+        :raises ValueError: If the transcription method is not WhisperX, no output
+                            file types are selected or there are no sidecar files.
+        :return: The paths of the sidecar files the outputs were exported from.
+        :rtype: list[Path]
+        """
+        if transcription.method != TranscriptionMethod.WHISPERX:
+            raise ValueError("Only WhisperX transcriptions can be exported again.")
+
+        if not transcription.output_file_types:
+            raise ValueError(
+                "There are no output file types selected. Please select at least one."
+            )
+
+        path = transcription.audio_source_path
+
+        if path.is_dir():
+            sidecar_paths = sorted(path.rglob(f"*{c.SIDECAR_FILE_SUFFIX}"))
+        else:
+            sidecar_paths = [WhisperXHandler.get_sidecar_path(path)]
+
+        exported_paths = [
+            sidecar_path
+            for sidecar_path in sidecar_paths
+            if WhisperXHandler.export_from_sidecar(
+                sidecar_path,
+                output_file_types=transcription.output_file_types,
+                should_overwrite=True,
+            )
+        ]
+
+        if not exported_paths:
+            raise ValueError(
+                "There are no saved WhisperX results to export. Please generate the "
+                "transcription first."
+            )
+
+        return exported_paths
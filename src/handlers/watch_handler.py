@@ -0,0 +1,335 @@
+import asyncio
+import collections
+import dataclasses
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import utils.config_manager as cm
+from handlers.directory_handler import DirectoryHandler
+from handlers.worker_pool_handler import WorkerPoolHandler
+from models.transcription import Transcription
+from models.transcription_result import TranscriptionResult
+from utils.enums import AudioSource, TranscriptionMethod
+
+if TYPE_CHECKING:
+    from handlers.transcription_handler import TranscriptionHandler
+    from utils.upload_scheduler import UploadScheduler
+
+# Maximum seconds between checks of whether the watch was stopped
+_STOP_CHECK_INTERVAL_SECONDS = 1.0
+
+# Size and modification time of a file
+FileSignature = tuple[int, int]
+
+
+async def _cancel_tasks() -> None:
+    """
+    Cancels the other tasks of the running event loop and waits for them to finish.
+
+    :return: None
+    """
+    tasks = asyncio.all_tasks() - {asyncio.current_task()}
+
+    for task in tasks:
+        task.cancel()
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class WatchHandler:
+    """
+    Watches a directory and transcribes the audio and video files added to it, until
+    it's stopped.
+
+    The directory is polled, which works on network drives unlike file system
+    events, and a file is only transcribed once its size and modification time
+    haven't changed for `stable_seconds`, so files that are still being recorded or
+    copied aren't transcribed halfway. Files are transcribed by the same handler or
+    worker pool the whole time, so the models stay loaded between arrivals.
+
+    At most `max_queued_files` files are submitted at a time. The rest wait in the
+    order they became stable, so a burst of files doesn't flood the workers.
+
+    Whisper API files are network-bound, so they are always transcribed in this
+    process, concurrently on an event loop that lasts the whole watch. They share an
+    upload scheduler, so the rate limit and the pauses the API asks for apply to
+    all of them.
+    """
+
+    def __init__(
+        self,
+        transcription: Transcription,
+        transcription_handler: Optional["TranscriptionHandler"] = None,
+        worker_pool: Optional[WorkerPoolHandler] = None,
+        output_dir: Optional[Path] = None,
+    ) -> None:
+        """
+        :param transcription: The transcription of the directory to watch.
+        :type transcription: Transcription
+        :param transcription_handler: The handler that transcribes the files in this
+                                      process, one at a time unless they are
+                                      transcribed with the Whisper API. Required if
+                                      there is no worker pool or the files are
+                                      transcribed with the Whisper API.
+        :type transcription_handler: Optional[TranscriptionHandler]
+        :param worker_pool: The pool of worker processes that transcribe the files in
+                            parallel, if any. It isn't used for the Whisper API.
+        :type worker_pool: Optional[WorkerPoolHandler]
+        :param output_dir: Directory of the output files. Defaults to the directory of
+                           each file.
+        :type output_dir: Optional[Path]
+        """
+        is_whisper_api = transcription.method == TranscriptionMethod.WHISPER_API
+
+        if is_whisper_api:
+            worker_pool = None
+
+        if not transcription_handler and not worker_pool:
+            raise ValueError("A transcription handler or a worker pool is required.")
+
+        config_watch = cm.ConfigManager.get_config_watch()
+
+        if is_whisper_api:
+            config_whisper_api = cm.ConfigManager.get_config_whisper_api()
+            workers = max(1, config_whisper_api.max_concurrent_uploads)
+        else:
+            workers = worker_pool.workers if worker_pool else 1
+
+        self.transcription = transcription
+        self.output_dir = output_dir
+        self.poll_interval_seconds = config_watch.poll_interval_seconds
+        self.stable_seconds = config_watch.stable_seconds
+        # By default, each worker has the next file waiting when it finishes one
+        self.max_queued_files = config_watch.max_queued_files or 2 * workers
+
+        self._transcription_handler = transcription_handler
+        self._worker_pool = worker_pool
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Event loop of the Whisper API files and the thread that runs it
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._upload_scheduler: Optional["UploadScheduler"] = None
+        self._stop_event = threading.Event()
+
+        # Signature of the files that are waiting to be stable, and since when
+        self._unstable_files: dict[Path, tuple[FileSignature, float]] = {}
+        # Files that are stable and wait to be submitted
+        self._ready_files: collections.deque[Path] = collections.deque()
+        # Signature of the files already submitted, so they are only transcribed
+        # again if they change
+        self._submitted_files: dict[Path, FileSignature] = {}
+
+    def watch(self) -> Iterator[TranscriptionResult]:
+        """
+        Watches the directory until `stop` is called, transcribing and saving the
+        files that are added to it or modified, and the ones it already contains that
+        don't have output files (or all of them if they should be overwritten).
+
+        Once stopped, the files being transcribed are finished, while the ones that
+        are still waiting will be found again the next time the directory is watched.
+        Whisper API files start as soon as they are submitted, so all of them are
+        finished.
+
+        :raises RuntimeError: If a worker process dies, which breaks the worker pool.
+        :return: An iterator of the result of each file, as soon as it finishes.
+        :rtype: Iterator[TranscriptionResult]
+        """
+        in_flight: dict[Future[TranscriptionResult], Transcription] = {}
+        next_poll = time.monotonic()
+
+        if self.transcription.method == TranscriptionMethod.WHISPER_API:
+            self._start_loop()
+        elif not self._worker_pool:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="watch"
+            )
+
+        try:
+            while not self._stop_event.is_set():
+                if time.monotonic() >= next_poll:
+                    self._poll()
+                    next_poll = time.monotonic() + self.poll_interval_seconds
+
+                # Back-pressure: files are only submitted while there is room
+                while self._ready_files and len(in_flight) < self.max_queued_files:
+                    transcription = dataclasses.replace(
+                        self.transcription,
+                        audio_source=AudioSource.FILE,
+                        audio_source_path=self._ready_files.popleft(),
+                    )
+                    in_flight[self._submit(transcription)] = transcription
+
+                timeout = min(
+                    max(0.0, next_poll - time.monotonic()),
+                    _STOP_CHECK_INTERVAL_SECONDS,
+                )
+
+                if in_flight:
+                    done, _ = wait(
+                        in_flight, timeout=timeout, return_when=FIRST_COMPLETED
+                    )
+
+                    for future in done:
+                        yield self._get_result(future, in_flight.pop(future))
+                else:
+                    self._stop_event.wait(timeout)
+
+            for future, transcription in in_flight.items():
+                # The files that haven't started are found again on the next watch
+                if self._loop or not future.cancel():
+                    yield self._get_result(future, transcription)
+        finally:
+            if self._executor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+            if self._loop:
+                self._stop_loop()
+
+    def stop(self) -> None:
+        """
+        Stops watching the directory. It's safe to call from any thread.
+
+        :return: None
+        """
+        self._stop_event.set()
+
+    def _poll(self) -> None:
+        """
+        Looks for the files to transcribe in the directory and queues the ones whose
+        signature hasn't changed for `stable_seconds`.
+
+        :return: None
+        """
+        now = time.monotonic()
+        files = DirectoryHandler.get_files_to_transcribe(
+            self.transcription.audio_source_path,
+            output_file_types=self.transcription.output_file_types or [],
+            should_overwrite=self.transcription.should_overwrite,
+            output_dir=self.output_dir,
+            should_print_summary=False,
+        )
+
+        # Forget the files that were removed while waiting to be stable
+        for file in self._unstable_files.keys() - set(files):
+            del self._unstable_files[file]
+
+        for file in files:
+            try:
+                stat = os.stat(file)
+            except OSError:  # Removed since the directory was listed
+                self._unstable_files.pop(file, None)
+                continue
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+
+            if self._submitted_files.get(file) == signature:
+                continue
+
+            unstable_file = self._unstable_files.get(file)
+
+            if not unstable_file or unstable_file[0] != signature:
+                self._unstable_files[file] = (signature, now)
+            # Empty files are usually still being created
+            elif signature[0] > 0 and now - unstable_file[1] >= self.stable_seconds:
+                del self._unstable_files[file]
+                self._submitted_files[file] = signature
+                self._ready_files.append(file)
+                print(f"{file} added to the list of files to transcribe!")
+
+    def _start_loop(self) -> None:
+        """
+        Starts the event loop that transcribes the Whisper API files in a thread, and
+        creates the upload scheduler they share.
+
+        :return: None
+        """
+        assert self._transcription_handler
+
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=self._loop.run_forever, name="watch-loop", daemon=True
+        )
+        self._loop_thread.start()
+        self._upload_scheduler = self._transcription_handler.create_upload_scheduler()
+
+    def _stop_loop(self) -> None:
+        """
+        Cancels the Whisper API files that are still being transcribed, if any,
+        closes the API clients of the event loop and stops it.
+
+        :return: None
+        """
+        assert self._loop and self._loop_thread and self._transcription_handler
+
+        asyncio.run_coroutine_threadsafe(_cancel_tasks(), self._loop).result()
+        asyncio.run_coroutine_threadsafe(
+            self._transcription_handler.close_async_clients(), self._loop
+        ).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+
+        if self._upload_scheduler and self._upload_scheduler.metrics.requests:
+            print(
+                f"Whisper API uploads: {self._upload_scheduler.metrics.get_summary()}"
+            )
+
+        self._loop = None
+        self._loop_thread = None
+        self._upload_scheduler = None
+
+    def _submit(self, transcription: Transcription) -> Future[TranscriptionResult]:
+        if self._worker_pool:
+            return self._worker_pool.submit(transcription, self.output_dir)
+
+        assert self._transcription_handler
+        transcription_handler = self._transcription_handler
+
+        if self._loop:
+            return asyncio.run_coroutine_threadsafe(
+                transcription_handler.transcribe_and_save(
+                    transcription,
+                    self.output_dir,
+                    upload_scheduler=self._upload_scheduler,
+                ),
+                self._loop,
+            )
+
+        assert self._executor
+
+        return self._executor.submit(
+            lambda: asyncio.run(
+                transcription_handler.transcribe_and_save(
+                    transcription, self.output_dir
+                )
+            )
+        )
+
+    def _get_result(
+        self, future: Future[TranscriptionResult], transcription: Transcription
+    ) -> TranscriptionResult:
+        if not self._worker_pool:
+            try:
+                return future.result()
+            except Exception as e:
+                return TranscriptionResult(
+                    source_path=transcription.audio_source_path,
+                    error="".join(traceback.format_exception(e)),
+                )
+
+        result = self._worker_pool.get_result(future, transcription)
+
+        if self._worker_pool.is_broken:
+            raise RuntimeError(
+                "A worker process stopped unexpectedly while transcribing "
+                f"{transcription.audio_source_path}, so the directory is no longer "
+                f"watched.\n{result.error}"
+            )
+
+        return result
@@ -1,29 +1,92 @@
+import json
 import os
+import shutil
+import tempfile
+import time
 import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Union
+from typing import TYPE_CHECKING, Any, Callable, Optional
 
+import numpy as np
+import numpy.typing as npt
+import utils.audio_cache as audio_cache
+import utils.audio_utils as au
 import utils.config_manager as cm
-import whisperx
+import utils.constants as c
+from models.config.config_whisperx import ConfigWhisperX
 from models.transcription import Transcription
-from whisperx.types import AlignedTranscriptionResult, TranscriptionResult
+from models.transcription_result import TranscriptionResult
+from utils import file_utils as fu
+from utils.model_pool import MemoryBudget, ModelPool
+
+# whisperx (and torch with it) takes seconds to import, so it's only imported where
+# it's used, the first time a file is transcribed with WhisperX
+if TYPE_CHECKING:
+    from whisperx.asr import FasterWhisperPipeline
+
+# model_size, device, compute_type, task, language
+AsrModelKey = tuple[str, str, str, str, Optional[str]]
+# language, device
+AlignModelKey = tuple[str, str]
+# model, metadata
+AlignModel = tuple[Any, dict[str, Any]]
+# Receives the segments of each window as soon as they are transcribed
+SegmentsCallback = Callable[[list[dict[str, Any]]], None]
 
 
 class WhisperXHandler:
-    def __init__(self) -> None:
-        self._whisperx_result: Optional[
-            Union[TranscriptionResult, AlignedTranscriptionResult]
-        ] = None
+    def __init__(self, threads: int = 4) -> None:
+        self._threads = threads  # CPU threads used by the ASR model
 
-    async def transcribe_file(self, transcription: Transcription) -> str:
+        config_whisperx = cm.ConfigManager.get_config_whisperx()
+        # Both pools share the budget, so together they stay within it
+        self._model_memory_budget = MemoryBudget(config_whisperx.model_memory_budget_mb)
+        self._asr_model_pool: ModelPool[AsrModelKey, "FasterWhisperPipeline"] = (
+            ModelPool(
+                name="ASR model pool",
+                memory_budget=self._model_memory_budget,
+                on_evict=self._on_model_evicted,
+            )
+        )
+        self._align_model_pool: ModelPool[AlignModelKey, AlignModel] = ModelPool(
+            name="Alignment model pool",
+            memory_budget=self._model_memory_budget,
+            idle_timeout=config_whisperx.align_model_idle_timeout,
+            on_evict=self._on_model_evicted,
+        )
+        # Loads alignment models in the background while the ASR model transcribes
+        self._align_model_preloader = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="align-model-preloader"
+        )
+
+    async def transcribe_file(
+        self,
+        transcription: Transcription,
+        on_segments: Optional[SegmentsCallback] = None,
+        samples: Optional[npt.NDArray[np.int16]] = None,
+    ) -> TranscriptionResult:
         """
         Transcribe audio from a file using the WhisperX library.
 
+        Audio longer than the `window_size` set in the configuration is transcribed
+        one window at a time, and the timestamps of each window are shifted to be
+        relative to the start of the audio.
+
         :param transcription: An instance of Transcription containing information about
                               the audio file.
         :type transcription: Transcription
-        :return: The transcribed text or an error message if transcription fails.
-        :rtype: str
+        :param on_segments: Called with the segments of each window as soon as they
+                            are transcribed, which allows showing them before the
+                            whole audio is transcribed. The first window is shorter
+                            when given, so that the first segments arrive sooner.
+        :type on_segments: Optional[SegmentsCallback]
+        :param samples: The decoded samples of the audio file, if it was already
+                        decoded.
+        :type samples: Optional[npt.NDArray[np.int16]]
+        :return: The result of the transcription. If it fails, its `error` attribute
+                 contains the traceback of the error.
+        :rtype: TranscriptionResult
         """
         if not transcription.output_file_types:
             raise ValueError(
@@ -31,57 +94,256 @@ class WhisperXHandler:
                 "one."
             )
 
+        import whisperx
+
         config_whisperx = cm.ConfigManager.get_config_whisperx()
 
         device = "cpu" if config_whisperx.use_cpu else "cuda"
         task = "translate" if transcription.should_translate else "transcribe"
 
+        should_align = (
+            "srt" in transcription.output_file_types
+            or "vtt" in transcription.output_file_types
+        )
+
+        result = TranscriptionResult(source_path=transcription.audio_source_path)
+
         try:
-            model = whisperx.load_model(
-                config_whisperx.model_size,
-                device,
-                compute_type=config_whisperx.compute_type,
-                task=task,
-                language=transcription.language_code,
-            )
+            # Start loading the alignment model alongside the ASR model, since the
+            # language to align is already known
+            align_model_future: Optional[Future[AlignModel]] = None
+            if should_align and transcription.language_code:
+                align_model_future = self._align_model_preloader.submit(
+                    self._get_align_model,
+                    config_whisperx,
+                    transcription.language_code,
+                    device,
+                )
 
-            audio_path = str(transcription.audio_source_path)
-            audio = whisperx.load_audio(audio_path)
-            self._whisperx_result = model.transcribe(
-                audio, batch_size=config_whisperx.batch_size
+            start = time.perf_counter()
+            model = self._get_asr_model(
+                config_whisperx, device, task, transcription.language_code
             )
+            result.timings["load_model"] = time.perf_counter() - start
 
-            if self._whisperx_result is None:
-                raise ValueError("Something went wrong while transcribing.")
+            start = time.perf_counter()
+            if samples is None:
+                samples = audio_cache.load_audio(transcription.audio_source_path)
 
-            text_combined = " ".join(
-                segment["text"].strip() for segment in self._whisperx_result["segments"]
+            windows = au.split_into_windows(
+                samples,
+                config_whisperx.window_size,
+                first_window_size=c.WHISPERX_FIRST_WINDOW_SIZE if on_segments else None,
             )
+            result.timings["load_audio"] = time.perf_counter() - start
+            result.timings["transcribe"] = 0.0
 
-            # Align output if should subtitle
-            if (
-                "srt" in transcription.output_file_types
-                or "vtt" in transcription.output_file_types
-            ):
-                model_aligned, metadata = whisperx.load_align_model(
-                    language_code=transcription.language_code, device=device
-                )
-                self._whisperx_result = whisperx.align(
-                    self._whisperx_result["segments"],
-                    model_aligned,
-                    metadata,
+            align_model: Optional[AlignModel] = None
+            if should_align:
+                result.timings["align"] = 0.0
+
+            # Only one window is decoded into memory at a time, so memory stays
+            # bounded regardless of the duration of the audio
+            for window_start, window_end in windows:
+                audio = au.pcm_to_float32(samples[window_start:window_end])
+
+                start = time.perf_counter()
+                whisperx_result = model.transcribe(
                     audio,
-                    device,
-                    return_char_alignments=False,
+                    batch_size=config_whisperx.batch_size,
+                    # The language detected in the first window is kept for the rest
+                    language=result.language or transcription.language_code,
+                    task=task,
+                )
+                result.timings["transcribe"] += time.perf_counter() - start
+
+                if whisperx_result is None:
+                    raise ValueError("Something went wrong while transcribing.")
+
+                result.language = result.language or whisperx_result["language"]
+                window_segments = whisperx_result["segments"]
+
+                # Align output if should subtitle
+                if should_align and window_segments:
+                    start = time.perf_counter()
+
+                    if align_model is None:
+                        if align_model_future:
+                            align_model = align_model_future.result()
+                        else:
+                            align_model = self._get_align_model(
+                                config_whisperx, result.language, device
+                            )
+
+                    model_aligned, metadata = align_model
+                    aligned_result = whisperx.align(
+                        window_segments,
+                        model_aligned,
+                        metadata,
+                        audio,
+                        device,
+                        return_char_alignments=False,
+                    )
+                    window_segments = aligned_result["segments"]
+                    result.timings["align"] += time.perf_counter() - start
+
+                self._offset_segments(
+                    window_segments, window_start / c.AUDIO_SAMPLE_RATE
                 )
+                result.segments.extend(window_segments)
+
+                if on_segments and window_segments:
+                    on_segments(window_segments)
 
-            return text_combined
+                del audio
+
+            result.is_aligned = should_align
+            result.text = " ".join(
+                segment["text"].strip() for segment in result.segments
+            )
 
         except Exception:
-            return traceback.format_exc()
+            result.error = traceback.format_exc()
 
-    def save_transcription(
+        return result
+
+    @staticmethod
+    def _offset_segments(segments: list[dict[str, Any]], offset: float) -> None:
+        """
+        Shift the timestamps of the segments, including the ones of their words, by
+        the given number of seconds, so that the segments of a window are relative to
+        the start of the whole audio.
+
+        :param segments: WhisperX segments of a window.
+        :type segments: list[dict[str, Any]]
+        :param offset: Start of the window, in seconds.
+        :type offset: float
+        :return: None
+        """
+        if offset == 0:
+            return
+
+        for segment in segments:
+            for item in [segment, *segment.get("words", [])]:
+                # Words that couldn't be aligned have no timestamps
+                for key in ["start", "end"]:
+                    if key in item:
+                        item[key] = round(item[key] + offset, 3)
+
+    def _get_asr_model(
         self,
+        config_whisperx: ConfigWhisperX,
+        device: str,
+        task: str,
+        language_code: Optional[str],
+    ) -> "FasterWhisperPipeline":
+        """
+        Get the ASR model for the given configuration from the pool, loading it only
+        if it isn't already in memory.
+
+        :param config_whisperx: The WhisperX configuration.
+        :type config_whisperx: ConfigWhisperX
+        :param device: Device to load the model on ("cpu" or "cuda").
+        :type device: str
+        :param task: Either "transcribe" or "translate".
+        :type task: str
+        :param language_code: Language of the audio, if known.
+        :type language_code: Optional[str]
+        :return: The loaded ASR model.
+        :rtype: FasterWhisperPipeline
+        """
+        import whisperx
+
+        # Pick up budget changes made through `config.ini` between transcriptions
+        self._model_memory_budget.budget_mb = config_whisperx.model_memory_budget_mb
+
+        key: AsrModelKey = (
+            config_whisperx.model_size,
+            device,
+            config_whisperx.compute_type,
+            task,
+            language_code,
+        )
+
+        return self._asr_model_pool.get(
+            key,
+            loader=lambda: whisperx.load_model(
+                config_whisperx.model_size,
+                device,
+                compute_type=config_whisperx.compute_type,
+                task=task,
+                language=language_code,
+                threads=self._threads,
+            ),
+            size_mb=self._estimate_model_size_mb(
+                config_whisperx.model_size, config_whisperx.compute_type
+            ),
+        )
+
+    def _get_align_model(
+        self, config_whisperx: ConfigWhisperX, language_code: str, device: str
+    ) -> AlignModel:
+        """
+        Get the alignment model of the given language from the pool, loading it only
+        if it isn't already in memory.
+
+        :param config_whisperx: The WhisperX configuration.
+        :type config_whisperx: ConfigWhisperX
+        :param language_code: Language of the audio to align.
+        :type language_code: str
+        :param device: Device to load the model on ("cpu" or "cuda").
+        :type device: str
+        :return: The loaded alignment model and its metadata.
+        :rtype: AlignModel
+        """
+        self._model_memory_budget.budget_mb = config_whisperx.model_memory_budget_mb
+        self._align_model_pool.idle_timeout = config_whisperx.align_model_idle_timeout
+
+        import whisperx
+
+        return self._align_model_pool.get(
+            (language_code, device),
+            loader=lambda: whisperx.load_align_model(
+                language_code=language_code, device=device
+            ),
+            size_mb=c.WHISPERX_ALIGN_MODEL_MEMORY_MB,
+        )
+
+    @staticmethod
+    def _estimate_model_size_mb(model_size: str, compute_type: str) -> float:
+        """
+        Estimate the memory used by an ASR model from its parameter count and the
+        number of bytes used to store each parameter.
+
+        :param model_size: Size of the ASR model (e.g. "large-v2").
+        :type model_size: str
+        :param compute_type: Compute type the model is loaded with (e.g. "float16").
+        :type compute_type: str
+        :return: Estimated size of the model in megabytes.
+        :rtype: float
+        """
+        parameters = c.WHISPERX_MODEL_PARAMETERS.get(model_size, 1550)
+        bytes_per_parameter = c.COMPUTE_TYPE_BYTES.get(compute_type, 4)
+
+        return float(parameters * bytes_per_parameter)
+
+    @staticmethod
+    def _on_model_evicted(key: Any) -> None:
+        """
+        Releases the GPU memory cached by torch after a model is evicted from a pool.
+
+        :param key: Key of the evicted model.
+        :type key: Any
+        :return: None
+        """
+        import torch
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    @staticmethod
+    def save_transcription(
+        result: TranscriptionResult,
         file_path: Path,
         output_file_types: list[str],
         should_overwrite: bool,
@@ -89,6 +351,11 @@ class WhisperXHandler:
         """
         Save the transcription as the specified file types.
 
+        Unless disabled in the configuration, the result is also saved as a sidecar
+        file, so the output files can be exported again later without transcribing.
+
+        :param result: The result of the transcription to save.
+        :type result: TranscriptionResult
         :param file_path: The path to the video or audio file for which subtitles are
                           to be generated.
         :type file_path: Path
@@ -102,17 +369,159 @@ class WhisperXHandler:
                                 the given format.
         :type should_overwrite: bool
         """
+        import whisperx
+
         config_subtitles = cm.ConfigManager.get_config_subtitles()
         output_dir = file_path.parent
 
-        for output_type in output_file_types:
-            path_to_check = file_path.parent / f"{file_path.stem}.{output_type}"
+        whisperx_result = {
+            "segments": result.segments,
+            # https://github.com/m-bain/whisperX/issues/455#issuecomment-1707547704
+            "language": "en",
+        }
+
+        # The writers create the files directly, so they write them to a temporary
+        # directory first. They are only moved into place once all of them are
+        # written, so that an interruption rarely leaves only some of them.
+        tmp_dir = Path(tempfile.mkdtemp(dir=output_dir, prefix=".tmp-"))
+
+        try:
+            output_paths = []
+
+            for output_type in output_file_types:
+                output_path = output_dir / f"{file_path.stem}.{output_type}"
+
+                if should_overwrite or not os.path.exists(output_path):
+                    writer = whisperx.transcribe.get_writer(output_type, str(tmp_dir))
+                    writer(whisperx_result, file_path, vars(config_subtitles))
+                    output_paths.append(output_path)
+
+            for output_path in output_paths:
+                fu.replace_atomically(tmp_dir / output_path.name, output_path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        if cm.ConfigManager.get_config_whisperx().save_sidecar:
+            WhisperXHandler.save_sidecar(result, file_path)
+
+    @staticmethod
+    def export_from_sidecar(
+        file_path: Path, output_file_types: list[str], should_overwrite: bool
+    ) -> bool:
+        """
+        Export the output files of a previous transcription from its sidecar file,
+        without transcribing or aligning the audio again. This allows, for example,
+        changing the subtitle options or adding output file types in seconds.
+
+        :param file_path: The path to the transcribed file or to its sidecar file.
+        :type file_path: Path
+        :param output_file_types: The file types to export.
+        :type output_file_types: list[str]
+        :param should_overwrite: Indicates whether existing files should be overwritten.
+        :type should_overwrite: bool
+        :return: True if the files were exported, or False if there is no sidecar file.
+        :rtype: bool
+        """
+        if not (result := WhisperXHandler.load_sidecar(file_path)):
+            return False
+
+        WhisperXHandler.save_transcription(
+            result,
+            file_path=result.source_path,
+            output_file_types=output_file_types,
+            should_overwrite=should_overwrite,
+        )
+
+        return True
+
+    @staticmethod
+    def save_sidecar(result: TranscriptionResult, file_path: Path) -> None:
+        """
+        Save the result of the transcription next to the output files.
+
+        :param result: The result of the transcription to save.
+        :type result: TranscriptionResult
+        :param file_path: The path to the transcribed file.
+        :type file_path: Path
+        :return: None
+        """
+        sidecar = {
+            # The output files are named after it when they are exported again
+            "source_name": file_path.name,
+            "text": result.text,
+            "segments": result.segments,
+            "language": result.language,
+            "is_aligned": result.is_aligned,
+        }
+
+        with fu.open_atomically(WhisperXHandler.get_sidecar_path(file_path)) as file:
+            json.dump(sidecar, file, ensure_ascii=False)
+
+    @staticmethod
+    def load_sidecar(file_path: Path) -> Optional[TranscriptionResult]:
+        """
+        Load the result of a previous transcription from its sidecar file.
+
+        :param file_path: The path to the transcribed file or to its sidecar file.
+        :type file_path: Path
+        :return: The result of the transcription, or None if there is no sidecar file.
+        :rtype: Optional[TranscriptionResult]
+        """
+        try:
+            with open(
+                WhisperXHandler.get_sidecar_path(file_path), encoding="utf-8"
+            ) as file:
+                sidecar = json.load(file)
+        except FileNotFoundError:
+            return None
+
+        return TranscriptionResult(
+            source_path=WhisperXHandler._get_source_path(
+                file_path, sidecar.get("source_name")
+            ),
+            text=sidecar["text"],
+            segments=sidecar["segments"],
+            language=sidecar["language"],
+            is_aligned=sidecar["is_aligned"],
+        )
+
+    @staticmethod
+    def get_sidecar_path(file_path: Path) -> Path:
+        """
+        Get the path of the sidecar file of a transcribed file.
+
+        :param file_path: The path to the transcribed file or to its sidecar file.
+        :type file_path: Path
+        :return: The path of the sidecar file.
+        :rtype: Path
+        """
+        if file_path.name.endswith(c.SIDECAR_FILE_SUFFIX):
+            return file_path
+
+        return file_path.parent / f"{file_path.stem}{c.SIDECAR_FILE_SUFFIX}"
+
+    @staticmethod
+    def _get_source_path(file_path: Path, source_name: Optional[str] = None) -> Path:
+        """
+        Get the path of the transcribed file from the path of its sidecar file. Only
+        its stem matters, since it's used to name the output files.
+
+        :param file_path: The path to the transcribed file or to its sidecar file.
+        :type file_path: Path
+        :param source_name: The name of the transcribed file stored in the sidecar
+                            file, if any.
+        :type source_name: Optional[str]
+        :return: The path of the transcribed file.
+        :rtype: Path
+        """
+        if not file_path.name.endswith(c.SIDECAR_FILE_SUFFIX):
+            return file_path
 
-            if should_overwrite or not os.path.exists(path_to_check):
-                writer = whisperx.transcribe.get_writer(output_type, str(output_dir))
+        if source_name:
+            return file_path.parent / source_name
 
-                # https://github.com/m-bain/whisperX/issues/455#issuecomment-1707547704
-                if self._whisperx_result:
-                    self._whisperx_result["language"] = "en"
+        # Older sidecar files don't store the name of the transcribed file, but they
+        # are named after its stem, so any extension gives back the same stem
+        stem = file_path.name[: -len(c.SIDECAR_FILE_SUFFIX)]
 
-                writer(self._whisperx_result, file_path, vars(config_subtitles))
+        return file_path.parent / f"{stem}.audio"
@@ -0,0 +1,237 @@
+import asyncio
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import utils.config_manager as cm
+from models.transcription import Transcription
+from models.transcription_result import TranscriptionResult
+from utils.enums import JobState, TranscriptionMethod
+from utils.job_journal import JobJournal
+
+if TYPE_CHECKING:
+    from handlers.transcription_handler import TranscriptionHandler
+
+# Handler of the current worker process. It's created once per process so that the
+# models it loads stay warm between the files the worker transcribes.
+_worker_transcription_handler: Optional["TranscriptionHandler"] = None
+# Event loop of the current worker process. It lasts as long as the process, like the
+# API clients bound to it, so their connections are reused between files.
+_worker_event_loop: Optional[asyncio.AbstractEventLoop] = None
+# CPU threads the current worker process may use
+_worker_threads = 1
+
+
+def resolve_threads_per_worker(workers: int, threads_per_worker: int) -> int:
+    """
+    Determines how many CPU threads each worker may use. If `threads_per_worker` is
+    not a positive number, the available cores are evenly shared among the workers.
+
+    :param workers: Number of worker processes.
+    :type workers: int
+    :param threads_per_worker: Configured number of threads per worker.
+    :type threads_per_worker: int
+    :return: Number of CPU threads each worker may use.
+    :rtype: int
+    """
+    if threads_per_worker > 0:
+        return threads_per_worker
+
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(threads: int, config_overrides: dict[str, dict[str, str]]) -> None:
+    """
+    Initializes a worker process: limits its CPU threads, applies the configuration
+    values overridden in the parent process and creates its transcription handler.
+    torch isn't imported yet, since the worker may not transcribe with WhisperX.
+
+    :param threads: Number of CPU threads the worker may use.
+    :type threads: int
+    :param config_overrides: Configuration values overridden in the parent process.
+    :type config_overrides: dict[str, dict[str, str]]
+    :return: None
+    """
+    # Only effective for the libraries that haven't been imported yet, hence the
+    # explicit limits for torch and the ASR model
+    for env_var in ["OMP_NUM_THREADS", "MKL_NUM_THREADS"]:
+        os.environ[env_var] = str(threads)
+
+    from handlers.transcription_handler import TranscriptionHandler
+
+    cm.ConfigManager.set_overrides(config_overrides)
+
+    global _worker_transcription_handler, _worker_event_loop, _worker_threads
+    _worker_transcription_handler = TranscriptionHandler(threads=threads)
+    _worker_event_loop = asyncio.new_event_loop()
+    _worker_threads = threads
+
+
+def _limit_torch_threads() -> None:
+    """
+    Limits the CPU threads torch uses in the current worker process. torch takes
+    seconds to import, so it's only called before transcribing with WhisperX, and
+    the workers that only transcribe with the Google API never import it.
+
+    :return: None
+    """
+    import torch
+
+    if torch.get_num_threads() != _worker_threads:
+        torch.set_num_threads(_worker_threads)
+
+
+def _transcribe_and_save(
+    transcription: Transcription,
+    output_dir: Optional[Path],
+    journal: Optional[JobJournal],
+) -> TranscriptionResult:
+    """
+    Transcribes the audio file of the transcription in the current worker process and
+    saves the result.
+
+    :param transcription: The transcription of a single file.
+    :type transcription: Transcription
+    :param output_dir: Directory where the output files are saved. Defaults to the
+                       directory of the audio file.
+    :type output_dir: Optional[Path]
+    :param journal: The journal of the directory transcription, if any.
+    :type journal: Optional[JobJournal]
+    :return: The result of the transcription.
+    :rtype: TranscriptionResult
+    """
+    assert _worker_transcription_handler and _worker_event_loop
+
+    if transcription.method == TranscriptionMethod.WHISPERX:
+        _limit_torch_threads()
+
+    return _worker_event_loop.run_until_complete(
+        _worker_transcription_handler.transcribe_and_save(
+            transcription, output_dir, journal
+        )
+    )
+
+
+class WorkerPoolHandler:
+    """
+    Pool of worker processes that transcribe files in parallel. Each worker keeps its
+    own models loaded, so they are only loaded once per worker and not once per file.
+    """
+
+    def __init__(self, workers: int, threads_per_worker: int) -> None:
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        # Set when a worker process dies abruptly, which makes the pool unusable
+        self.is_broken = False
+
+        # "spawn" is the only start method that is safe with CUDA and available on
+        # every platform
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                resolve_threads_per_worker(workers, threads_per_worker),
+                cm.ConfigManager.get_overrides(),
+            ),
+        )
+
+    def transcribe_files(
+        self,
+        transcriptions: list[Transcription],
+        output_dir: Optional[Path] = None,
+        journal: Optional[JobJournal] = None,
+    ) -> Iterator[TranscriptionResult]:
+        """
+        Transcribes and saves the files of the transcriptions in the worker processes.
+
+        The results are yielded as soon as each file finishes, not in the order they
+        were submitted.
+
+        :param transcriptions: One transcription per file to transcribe.
+        :type transcriptions: list[Transcription]
+        :param output_dir: Directory where the output files are saved. Defaults to the
+                           directory of each audio file.
+        :type output_dir: Optional[Path]
+        :param journal: The journal of the directory transcription, if any, to which
+                        the workers record the state of each file.
+        :type journal: Optional[JobJournal]
+        :return: An iterator of the result of each file.
+        :rtype: Iterator[TranscriptionResult]
+        """
+        futures = {
+            self.submit(transcription, output_dir, journal): transcription
+            for transcription in transcriptions
+        }
+
+        for future in as_completed(futures):
+            yield self.get_result(future, futures[future], journal)
+
+    def submit(
+        self,
+        transcription: Transcription,
+        output_dir: Optional[Path] = None,
+        journal: Optional[JobJournal] = None,
+    ) -> Future[TranscriptionResult]:
+        """
+        Submits a single file to be transcribed and saved by the next free worker.
+
+        :param transcription: The transcription of a single file.
+        :type transcription: Transcription
+        :param output_dir: Directory where the output files are saved. Defaults to the
+                           directory of the audio file.
+        :type output_dir: Optional[Path]
+        :param journal: The journal of the directory transcription, if any.
+        :type journal: Optional[JobJournal]
+        :return: The future of the result, to be passed to `get_result`.
+        :rtype: Future[TranscriptionResult]
+        """
+        return self._executor.submit(
+            _transcribe_and_save, transcription, output_dir, journal
+        )
+
+    def get_result(
+        self,
+        future: Future[TranscriptionResult],
+        transcription: Transcription,
+        journal: Optional[JobJournal] = None,
+    ) -> TranscriptionResult:
+        """
+        Gets the result of a submitted file, waiting for it if it hasn't finished.
+
+        :param future: The future returned by `submit`.
+        :type future: Future[TranscriptionResult]
+        :param transcription: The transcription that was submitted.
+        :type transcription: Transcription
+        :param journal: The journal of the directory transcription, if any.
+        :type journal: Optional[JobJournal]
+        :return: The result of the file. If its worker died, a failed result.
+        :rtype: TranscriptionResult
+        """
+        try:
+            return future.result()
+        except Exception as e:
+            self.is_broken = self.is_broken or isinstance(e, BrokenProcessPool)
+
+            result = TranscriptionResult(
+                source_path=transcription.audio_source_path,
+                error="".join(traceback.format_exception(e)),
+            )
+
+            # The worker couldn't record it, since it died or never ran the file
+            if journal:
+                journal.record(result.source_path, JobState.FAILED, result.error)
+
+            return result
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker processes, cancelling the files that haven't started yet.
+
+        :return: None
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -2,8 +2,6 @@ import traceback
 from pathlib import Path
 from typing import Optional
 
-from pytubefix import YouTube
-
 
 class YouTubeHandler:
     @staticmethod
@@ -23,6 +21,9 @@ class YouTubeHandler:
         :return: The path to the downloaded audio file as a Path object,
                  or None if the download fails.
         """
+        # Imported here since it's only needed for YouTube transcriptions
+        from pytubefix import YouTube
+
         try:
             yt = YouTube(url)
             stream = yt.streams.filter(only_audio=True).first()
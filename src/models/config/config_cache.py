@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from enum import Enum
+
+
+@dataclass
+class ConfigCache:
+    use_result_cache: bool
+    result_cache_size_mb: int
+    use_audio_cache: bool
+    audio_cache_size_mb: int
+    use_directory_manifest: bool
+    directory_manifest_size_mb: int
+    use_payload_cache: bool
+    payload_cache_size_mb: int
+    payload_cache_ttl_seconds: float
+
+    class Key(Enum):
+        """
+        Enum class for keys associated with the cache configuration.
+        """
+
+        SECTION = "cache"
+        USE_RESULT_CACHE = "use_result_cache"
+        RESULT_CACHE_SIZE_MB = "result_cache_size_mb"
+        USE_AUDIO_CACHE = "use_audio_cache"
+        AUDIO_CACHE_SIZE_MB = "audio_cache_size_mb"
+        USE_DIRECTORY_MANIFEST = "use_directory_manifest"
+        DIRECTORY_MANIFEST_SIZE_MB = "directory_manifest_size_mb"
+        USE_PAYLOAD_CACHE = "use_payload_cache"
+        PAYLOAD_CACHE_SIZE_MB = "payload_cache_size_mb"
+        PAYLOAD_CACHE_TTL_SECONDS = "payload_cache_ttl_seconds"
+
+        def value_type(self) -> str:
+            """
+            Get the value type associated with the ConfigKey.
+
+            :return: The type of the value as a string, or None if the key is not found.
+            :rtype: str
+            """
+            type_mapping = {
+                ConfigCache.Key.USE_RESULT_CACHE: "bool",
+                ConfigCache.Key.RESULT_CACHE_SIZE_MB: "int",
+                ConfigCache.Key.USE_AUDIO_CACHE: "bool",
+                ConfigCache.Key.AUDIO_CACHE_SIZE_MB: "int",
+                ConfigCache.Key.USE_DIRECTORY_MANIFEST: "bool",
+                ConfigCache.Key.DIRECTORY_MANIFEST_SIZE_MB: "int",
+                ConfigCache.Key.USE_PAYLOAD_CACHE: "bool",
+                ConfigCache.Key.PAYLOAD_CACHE_SIZE_MB: "int",
+                ConfigCache.Key.PAYLOAD_CACHE_TTL_SECONDS: "float",
+            }
+
+            return str(type_mapping.get(self))
@@ -0,0 +1,31 @@
+from dataclasses import dataclass
+from enum import Enum
+
+
+@dataclass
+class ConfigGoogleApi:
+    max_concurrent_chunks: int
+    max_retries: int
+
+    class Key(Enum):
+        """
+        Enum class for keys associated with the Google API configuration.
+        """
+
+        SECTION = "google_api"
+        MAX_CONCURRENT_CHUNKS = "max_concurrent_chunks"
+        MAX_RETRIES = "max_retries"
+
+        def value_type(self) -> str:
+            """
+            Get the value type associated with the ConfigKey.
+
+            :return: The type of the value as a string, or None if the key is not found.
+            :rtype: str
+            """
+            type_mapping = {
+                ConfigGoogleApi.Key.MAX_CONCURRENT_CHUNKS: "int",
+                ConfigGoogleApi.Key.MAX_RETRIES: "int",
+            }
+
+            return str(type_mapping.get(self))
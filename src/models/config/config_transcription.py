@@ -9,6 +9,9 @@ class ConfigTranscription:
     method: str
     autosave: bool
     overwrite_files: bool
+    workers: int
+    threads_per_worker: int
+    watch_directory: bool
 
     class Key(Enum):
         """
@@ -21,6 +24,9 @@ class ConfigTranscription:
         METHOD = "method"
         AUTOSAVE = "autosave"
         OVERWRITE_FILES = "overwrite_files"
+        WORKERS = "workers"
+        THREADS_PER_WORKER = "threads_per_worker"
+        WATCH_DIRECTORY = "watch_directory"
 
         def value_type(self) -> str:
             """
@@ -35,6 +41,9 @@ class ConfigTranscription:
                 ConfigTranscription.Key.METHOD: "str",
                 ConfigTranscription.Key.AUTOSAVE: "bool",
                 ConfigTranscription.Key.OVERWRITE_FILES: "bool",
+                ConfigTranscription.Key.WORKERS: "int",
+                ConfigTranscription.Key.THREADS_PER_WORKER: "int",
+                ConfigTranscription.Key.WATCH_DIRECTORY: "bool",
             }
 
             return str(type_mapping.get(self))
@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+from enum import Enum
+
+
+@dataclass
+class ConfigWatch:
+    poll_interval_seconds: float
+    stable_seconds: float
+    max_queued_files: int
+
+    class Key(Enum):
+        """
+        Enum class for keys associated with the watch mode configuration.
+        """
+
+        SECTION = "watch"
+        POLL_INTERVAL_SECONDS = "poll_interval_seconds"
+        STABLE_SECONDS = "stable_seconds"
+        MAX_QUEUED_FILES = "max_queued_files"
+
+        def value_type(self) -> str:
+            """
+            Get the value type associated with the ConfigKey.
+
+            :return: The type of the value as a string, or None if the key is not found.
+            :rtype: str
+            """
+            type_mapping = {
+                ConfigWatch.Key.POLL_INTERVAL_SECONDS: "float",
+                ConfigWatch.Key.STABLE_SECONDS: "float",
+                ConfigWatch.Key.MAX_QUEUED_FILES: "int",
+            }
+
+            return str(type_mapping.get(self))
@@ -10,6 +10,14 @@ class ConfigWhisperApi:
     response_format: Literal["json", "text", "srt", "verbose_json", "vtt"]
     temperature: float
     timestamp_granularities: list[TimestampGranularitiesType]
+    timeout_seconds: float
+    connect_timeout_seconds: float
+    max_connections: int
+    max_concurrent_uploads: int
+    requests_per_minute: float
+    max_retries: int
+    max_upload_size_mb: float
+    upload_codec: Literal["mp3", "ogg", "flac"]
 
     class Key(Enum):
         """
@@ -20,6 +28,14 @@ class ConfigWhisperApi:
         RESPONSE_FORMAT = "response_format"
         TEMPERATURE = "temperature"
         TIMESTAMP_GRANULARITIES = "timestamp_granularities"
+        TIMEOUT_SECONDS = "timeout_seconds"
+        CONNECT_TIMEOUT_SECONDS = "connect_timeout_seconds"
+        MAX_CONNECTIONS = "max_connections"
+        MAX_CONCURRENT_UPLOADS = "max_concurrent_uploads"
+        REQUESTS_PER_MINUTE = "requests_per_minute"
+        MAX_RETRIES = "max_retries"
+        MAX_UPLOAD_SIZE_MB = "max_upload_size_mb"
+        UPLOAD_CODEC = "upload_codec"
 
         def value_type(self) -> str:
             """
@@ -32,6 +48,14 @@ class ConfigWhisperApi:
                 ConfigWhisperApi.Key.RESPONSE_FORMAT: "str",
                 ConfigWhisperApi.Key.TEMPERATURE: "float",
                 ConfigWhisperApi.Key.TIMESTAMP_GRANULARITIES: "list",
+                ConfigWhisperApi.Key.TIMEOUT_SECONDS: "float",
+                ConfigWhisperApi.Key.CONNECT_TIMEOUT_SECONDS: "float",
+                ConfigWhisperApi.Key.MAX_CONNECTIONS: "int",
+                ConfigWhisperApi.Key.MAX_CONCURRENT_UPLOADS: "int",
+                ConfigWhisperApi.Key.REQUESTS_PER_MINUTE: "float",
+                ConfigWhisperApi.Key.MAX_RETRIES: "int",
+                ConfigWhisperApi.Key.MAX_UPLOAD_SIZE_MB: "float",
+                ConfigWhisperApi.Key.UPLOAD_CODEC: "str",
             }
 
             return str(type_mapping.get(self))
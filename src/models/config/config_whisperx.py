@@ -13,6 +13,10 @@ class ConfigWhisperX:
     use_cpu: bool
     can_use_gpu: bool
     output_file_types: list[OutputFileTypes]
+    model_memory_budget_mb: int
+    align_model_idle_timeout: int
+    save_sidecar: bool
+    window_size: int
 
     class Key(Enum):
         """
@@ -26,6 +30,10 @@ class ConfigWhisperX:
         USE_CPU = "use_cpu"
         CAN_USE_GPU = "can_use_gpu"
         OUTPUT_FILE_TYPES = "output_file_types"
+        MODEL_MEMORY_BUDGET_MB = "model_memory_budget_mb"
+        ALIGN_MODEL_IDLE_TIMEOUT = "align_model_idle_timeout"
+        SAVE_SIDECAR = "save_sidecar"
+        WINDOW_SIZE = "window_size"
 
         def value_type(self) -> str:
             """
@@ -41,6 +49,10 @@ class ConfigWhisperX:
                 ConfigWhisperX.Key.USE_CPU: "bool",
                 ConfigWhisperX.Key.CAN_USE_GPU: "bool",
                 ConfigWhisperX.Key.OUTPUT_FILE_TYPES: "list",
+                ConfigWhisperX.Key.MODEL_MEMORY_BUDGET_MB: "int",
+                ConfigWhisperX.Key.ALIGN_MODEL_IDLE_TIMEOUT: "int",
+                ConfigWhisperX.Key.SAVE_SIDECAR: "bool",
+                ConfigWhisperX.Key.WINDOW_SIZE: "int",
             }
 
             return str(type_mapping.get(self))
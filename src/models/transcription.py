@@ -7,7 +7,6 @@ from utils.enums import AudioSource, TranscriptionMethod
 
 @dataclass
 class Transcription:
-    text: Optional[str] = None
     language_code: Optional[str] = None
     audio_source: Optional[AudioSource] = None
     audio_source_path: Path = Path("/")
@@ -16,4 +15,6 @@ class Transcription:
     should_translate: bool = False
     should_autosave: bool = False
     should_overwrite: bool = False
+    # Whether to keep transcribing the files added to the directory until stopped
+    should_watch: bool = False
     youtube_url: Optional[str] = None
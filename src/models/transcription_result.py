@@ -0,0 +1,26 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+
+@dataclass
+class TranscriptionResult:
+    """
+    Result of transcribing a single file. Every file gets its own instance, so files
+    transcribed at the same time never share state.
+    """
+
+    source_path: Path
+    text: str = ""
+    # WhisperX segments, including the word timings if they were aligned
+    segments: list[dict[str, Any]] = field(default_factory=list)
+    language: Optional[str] = None
+    is_aligned: bool = False
+    # Seconds spent in each stage of the transcription (e.g. "transcribe", "total")
+    timings: dict[str, float] = field(default_factory=dict)
+    # Traceback of the error that made the transcription fail, if any
+    error: Optional[str] = None
+
+    @property
+    def is_successful(self) -> bool:
+        return self.error is None
@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+
+from utils.enums import UiEventType
+
+
+@dataclass(frozen=True)
+class UiEvent:
+    """
+    Update of the main window requested by the controller. Events are queued by the
+    threads that transcribe and applied by the main window on the Tk thread.
+    """
+
+    type: UiEventType
+    text: str = ""
+    # Number of processed files and total files, for `UiEventType.PROGRESS`
+    current: int = 0
+    total: int = 0
+    # Whether a CUDA GPU can be used, for `UiEventType.GPU_AVAILABILITY`
+    can_use_gpu: bool = False
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import utils.audio_utils as au
+import utils.config_manager as cm
+import utils.constants as c
+import utils.hash_utils as hu
+import utils.path_helper as ph
+from utils.disk_cache import DiskCache
+
+
+class AudioCache:
+    """
+    On-disk cache of decoded audio, keyed by the content of the audio file. The
+    samples are stored as `.npy` files and memory-mapped when read, so re-running the
+    same file or switching to another transcription method skips decoding it, and
+    only the parts of the audio actually read are loaded into memory.
+    """
+
+    def __init__(self, max_size_mb: float) -> None:
+        self._cache = DiskCache(
+            directory=ph.CACHE_PATH / "audio",
+            max_size_mb=max_size_mb,
+            suffix=".npy",
+        )
+
+    def load(self, file_path: Path) -> npt.NDArray[np.int16]:
+        """
+        Gets the decoded audio of the file from the cache, decoding and caching it if
+        it isn't cached yet.
+
+        :param file_path: Path to the audio or video file.
+        :type file_path: Path
+        :return: The mono 16-bit PCM samples of the audio, memory-mapped.
+        :rtype: npt.NDArray[np.int16]
+        """
+        key = f"{hu.hash_file(file_path)}-{c.AUDIO_SAMPLE_RATE}"
+
+        if cached_path := self._cache.get_path(key):
+            try:
+                samples: npt.NDArray[np.int16] = np.load(cached_path, mmap_mode="r")
+                return samples
+            except (OSError, ValueError) as e:  # Evicted in the meantime or corrupt
+                print(f"Could not read the cached audio of {file_path}: {e!r}")
+
+        try:
+            # Decoded straight into the cache, so the samples are never held in memory
+            with self._cache.open_for_write(key) as (file, path):
+                au.load_audio_to_npy(file_path, file)
+
+            samples = np.load(path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            # The audio can still be decoded even if it can't be cached, or if it's
+            # larger than the whole cache and was evicted right away
+            print(f"Could not cache the audio of {file_path}: {e!r}")
+            samples = au.load_audio(file_path)
+
+        return samples
+
+
+def load_audio(file_path: Path) -> npt.NDArray[np.int16]:
+    """
+    Decodes the audio of the file into 16 kHz mono 16-bit PCM samples, going through
+    the decoded audio cache if it's enabled.
+
+    :param file_path: Path to the audio or video file.
+    :type file_path: Path
+    :return: The decoded samples.
+    :rtype: npt.NDArray[np.int16]
+    """
+    config_cache = cm.ConfigManager.get_config_cache()
+
+    if not config_cache.use_audio_cache:
+        return au.load_audio(file_path)
+
+    return AudioCache(max_size_mb=config_cache.audio_cache_size_mb).load(file_path)
@@ -1,5 +1,43 @@
+import math
+import subprocess
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import numpy as np
+import numpy.typing as npt
 import speech_recognition as sr
 from pydub import AudioSegment
+from utils import constants as c
+from utils.enums import UploadCodec
+
+# Bytes of decoded audio read from FFmpeg at once, which bounds the memory used to
+# decode regardless of the length of the audio
+_DECODE_CHUNK_SIZE = 1024 * 1024
+# Milliseconds of audio whose energy is computed at once while detecting silence,
+# which bounds the memory used regardless of the length of the audio
+_SILENCE_DETECTION_BLOCK_MS = 60_000
+# Same for the samples whose energy is computed at once to get the loudness
+_DBFS_BLOCK_SIZE = 1_000_000
+# Seconds at the end of each window in which to look for a quiet moment to cut it
+_WINDOW_SEARCH_SECONDS = 30
+# FFmpeg encoder and container of each codec of the uploaded audio
+# fmt: off
+_UPLOAD_ENCODER_ARGS = {
+    # The fast mode of LAME, which is transparent enough for speech recognition
+    UploadCodec.MP3: ["-c:a", "libmp3lame", "-compression_level", "7", "-f", "mp3"],
+    # The speech mode of Opus is the most intelligible at low bitrates, and a low
+    # complexity encodes about 3 times faster than the default for a similar size
+    UploadCodec.OGG: [
+        "-c:a", "libopus",
+        "-application", "voip",
+        "-compression_level", "3",
+        "-f", "ogg",
+    ],
+    UploadCodec.FLAC: ["-c:a", "flac", "-f", "flac"],
+}
+# fmt: on
 
 
 def save_audio_data(audio_data: list[sr.AudioData], filename: str) -> None:
@@ -34,3 +72,501 @@ def save_audio_data(audio_data: list[sr.AudioData], filename: str) -> None:
             print("Could not save audio data. Unknown value error.")
         except sr.RequestError as e:
             print(f"Could not request results; {e}")
+
+
+def load_audio(
+    file_path: Path, sample_rate: int = c.AUDIO_SAMPLE_RATE
+) -> npt.NDArray[np.int16]:
+    """
+    Decode the audio of an audio or video file into mono 16-bit PCM samples.
+
+    The samples are streamed into a temporary file and memory-mapped, so only the
+    parts of the audio actually read are loaded into memory. The file is removed
+    once the samples are no longer used.
+
+    :param file_path: Path to the audio or video file.
+    :type file_path: Path
+    :param sample_rate: Sample rate of the decoded audio, in Hz.
+    :type sample_rate: int
+    :raises RuntimeError: If FFmpeg fails to decode the file.
+    :return: The decoded samples, memory-mapped.
+    :rtype: npt.NDArray[np.int16]
+    """
+    with tempfile.TemporaryFile() as file:
+        size = decode_audio(file_path, file, sample_rate)
+        file.flush()
+
+        # An empty file can't be memory-mapped
+        if size == 0:
+            return np.zeros(0, dtype=np.int16)
+
+        # The mapping keeps the file alive after it's closed
+        return np.memmap(file, dtype=np.int16, mode="r", shape=(size,))
+
+
+def load_audio_to_npy(
+    file_path: Path, file: BinaryIO, sample_rate: int = c.AUDIO_SAMPLE_RATE
+) -> int:
+    """
+    Decode the audio of an audio or video file into a `.npy` file of mono 16-bit PCM
+    samples, which can be memory-mapped with `np.load`.
+
+    :param file_path: Path to the audio or video file.
+    :type file_path: Path
+    :param file: The empty `.npy` file, opened for writing in binary mode.
+    :type file: BinaryIO
+    :param sample_rate: Sample rate of the decoded audio, in Hz.
+    :type sample_rate: int
+    :raises RuntimeError: If FFmpeg fails to decode the file.
+    :return: The number of decoded samples.
+    :rtype: int
+    """
+    # The number of samples is only known once the audio is decoded, so the header
+    # is written again afterwards. NumPy pads the length of the array in the header,
+    # so it takes the same space regardless of the length.
+    header = _get_npy_header(0)
+    file.write(header)
+    size = decode_audio(file_path, file, sample_rate)
+    final_header = _get_npy_header(size)
+
+    if len(final_header) != len(header):
+        raise RuntimeError(f"The header of {size} samples doesn't fit in the file")
+
+    file.seek(0)
+    file.write(final_header)
+
+    return size
+
+
+def decode_audio(
+    file_path: Path, file: BinaryIO, sample_rate: int = c.AUDIO_SAMPLE_RATE
+) -> int:
+    """
+    Decode the audio of an audio or video file into mono 16-bit PCM samples written
+    to the given file.
+
+    FFmpeg writes the samples through a pipe, skipping the video, subtitle and data
+    streams, and they are copied to the file a chunk at a time, so neither the
+    decoded audio nor the video frames are ever held in memory at once.
+
+    :param file_path: Path to the audio or video file.
+    :type file_path: Path
+    :param file: The file the samples are appended to, opened for writing in binary
+                 mode.
+    :type file: BinaryIO
+    :param sample_rate: Sample rate of the decoded audio, in Hz.
+    :type sample_rate: int
+    :raises RuntimeError: If FFmpeg fails to decode the file.
+    :return: The number of decoded samples.
+    :rtype: int
+    """
+    # fmt: off
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-threads", "0",
+        "-i", str(file_path),
+        "-vn", "-sn", "-dn",
+        "-f", "s16le",
+        "-ac", "1",
+        "-acodec", "pcm_s16le",
+        "-ar", str(sample_rate),
+        "-",
+    ]
+    # fmt: on
+
+    # The errors go to a file, since a full stderr pipe would block FFmpeg while
+    # its stdout is being read
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            # Avoid opening a console window from the GUI on Windows
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+        assert process.stdout
+        size = 0
+
+        try:
+            while chunk := process.stdout.read(_DECODE_CHUNK_SIZE):
+                file.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            return_code = process.wait()
+
+        if return_code != 0:
+            stderr.seek(0)
+            raise RuntimeError(
+                f"Failed to decode {file_path}: "
+                f"{stderr.read().decode(errors='replace')}"
+            )
+
+    return size // np.dtype(np.int16).itemsize
+
+
+def _get_npy_header(size: int) -> bytes:
+    """
+    Get the `.npy` header of an array of `size` 16-bit PCM samples.
+
+    :param size: The number of samples.
+    :type size: int
+    :return: The header.
+    :rtype: bytes
+    """
+    header = BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header,
+        {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(np.int16)),
+            "fortran_order": False,
+            "shape": (size,),
+        },
+    )
+
+    return header.getvalue()
+
+
+def encode_audio(
+    samples: npt.NDArray[np.int16],
+    codec: UploadCodec,
+    bitrate_kbps: int,
+    sample_rate: int = c.AUDIO_SAMPLE_RATE,
+) -> bytes:
+    """
+    Encode mono 16-bit PCM samples with the given codec.
+
+    FFmpeg reads the samples and writes the encoded audio through pipes, so no
+    temporary files are written, unlike `AudioSegment.export`.
+
+    :param samples: Mono 16-bit PCM samples.
+    :type samples: npt.NDArray[np.int16]
+    :param codec: The codec to encode the samples with.
+    :type codec: UploadCodec
+    :param bitrate_kbps: The bitrate of the encoded audio, in kbps. It's ignored by
+                         lossless codecs.
+    :type bitrate_kbps: int
+    :param sample_rate: Sample rate of the samples, in Hz.
+    :type sample_rate: int
+    :raises RuntimeError: If FFmpeg fails to encode the samples.
+    :return: The encoded audio, including its container.
+    :rtype: bytes
+    """
+    # fmt: off
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-f", "s16le",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-i", "pipe:0",
+        *_UPLOAD_ENCODER_ARGS[codec],
+    ]
+    # fmt: on
+
+    if codec != UploadCodec.FLAC:
+        cmd += ["-b:a", f"{bitrate_kbps}k"]
+
+    try:
+        process = subprocess.run(
+            cmd + ["pipe:1"],
+            input=samples.tobytes(),
+            capture_output=True,
+            check=True,
+            # Avoid opening a console window from the GUI on Windows
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(
+            f"Failed to encode the audio as {codec.value}: "
+            f"{e.stderr.decode(errors='replace')}"
+        ) from e
+
+    return process.stdout
+
+
+def get_upload_bitrate(codec: UploadCodec, duration: float, max_size: int) -> int:
+    """
+    Get the highest bitrate of the codec at which audio of the given duration fits in
+    `max_size` bytes, so that short audio is uploaded with the best quality.
+
+    :param codec: The codec the audio is encoded with.
+    :type codec: UploadCodec
+    :param duration: Duration of the audio, in seconds.
+    :type duration: float
+    :param max_size: Maximum size of the encoded audio, in bytes.
+    :type max_size: int
+    :return: The bitrate, in kbps. If the audio doesn't fit at any bitrate, the
+             lowest one.
+    :rtype: int
+    """
+    min_bitrate_kbps, max_bitrate_kbps = c.UPLOAD_CODEC_BITRATES_KBPS[codec.value]
+    # Containers and frame headers take a few percent on top of the bitrate
+    fitting_bitrate_kbps = int(0.95 * max_size * 8 / 1000 / max(duration, 1))
+
+    return max(min_bitrate_kbps, min(max_bitrate_kbps, fitting_bitrate_kbps))
+
+
+def pcm_to_float32(samples: npt.NDArray[np.int16]) -> npt.NDArray[np.float32]:
+    """
+    Convert 16-bit PCM samples to floats between -1 and 1, which is the input
+    expected by WhisperX.
+
+    :param samples: 16-bit PCM samples.
+    :type samples: npt.NDArray[np.int16]
+    :return: The samples as floats.
+    :rtype: npt.NDArray[np.float32]
+    """
+    audio = samples.astype(np.float32)
+    audio /= 32768.0
+
+    return audio
+
+
+def get_dbfs(samples: npt.NDArray[np.int16]) -> float:
+    """
+    Compute the loudness of 16-bit PCM samples relative to the maximum possible
+    amplitude, like `AudioSegment.dBFS`.
+
+    :param samples: Mono 16-bit PCM samples.
+    :type samples: npt.NDArray[np.int16]
+    :return: The loudness in dBFS, or -inf if the samples are silent.
+    :rtype: float
+    """
+    if samples.size == 0:
+        return -math.inf
+
+    energy = 0
+
+    for start in range(0, samples.size, _DBFS_BLOCK_SIZE):
+        block = samples[start : start + _DBFS_BLOCK_SIZE].astype(np.int64)
+        energy += int(np.dot(block, block))
+
+    # Truncated like `audioop.rms`
+    rms = int(math.sqrt(energy / samples.size))
+
+    if rms == 0:
+        return -math.inf
+
+    return 20 * math.log10(rms / 32768)
+
+
+def split_on_silence(
+    samples: npt.NDArray[np.int16],
+    frame_rate: int,
+    min_silence_len: int = 1000,
+    silence_thresh: float = -16,
+    keep_silence: int = 100,
+) -> list[tuple[int, int]]:
+    """
+    Split 16-bit PCM samples on their silent sections, with the same parameters and
+    results as `pydub.silence.split_on_silence`.
+
+    Instead of copying every chunk into a new `AudioSegment`, the chunks are returned
+    as ranges of sample indices, so all of them share the buffer of `samples`. The
+    energy of the audio is computed once per millisecond with NumPy, and every
+    `min_silence_len` window is checked with a cumulative sum instead of measuring
+    each window on its own.
+
+    :param samples: Mono 16-bit PCM samples.
+    :type samples: npt.NDArray[np.int16]
+    :param frame_rate: Sample rate of the samples, in Hz.
+    :type frame_rate: int
+    :param min_silence_len: Minimum length of a silence to be used for a split, in
+                            milliseconds.
+    :type min_silence_len: int
+    :param silence_thresh: Anything quieter than this is considered silence, in
+                           dBFS.
+    :type silence_thresh: float
+    :param keep_silence: Silence kept at the beginning and end of each chunk, in
+                         milliseconds. If the silence between two chunks is shorter
+                         than twice this, it's split evenly between them.
+    :type keep_silence: int
+    :return: The `(start, end)` sample indices of each chunk.
+    :rtype: list[tuple[int, int]]
+    """
+    seg_len = round(1000 * samples.size / frame_rate)
+    # First sample of each millisecond, plus the end of the last one
+    ms_boundaries = np.minimum(
+        np.arange(seg_len + 1, dtype=np.int64) * frame_rate // 1000, samples.size
+    )
+
+    ranges = [
+        [start - keep_silence, end + keep_silence]
+        for start, end in _detect_nonsilent(
+            samples, ms_boundaries, min_silence_len, silence_thresh
+        )
+    ]
+
+    for range_i, range_ii in zip(ranges, ranges[1:]):
+        if range_ii[0] < range_i[1]:
+            range_i[1] = range_ii[0] = (range_i[1] + range_ii[0]) // 2
+
+    return [
+        (int(ms_boundaries[max(start, 0)]), int(ms_boundaries[min(end, seg_len)]))
+        for start, end in ranges
+    ]
+
+
+def split_into_windows(
+    samples: npt.NDArray[np.int16],
+    window_size: int,
+    first_window_size: Optional[int] = None,
+    frame_rate: int = c.AUDIO_SAMPLE_RATE,
+) -> list[tuple[int, int]]:
+    """
+    Split the samples into consecutive windows of at most `window_size` seconds.
+
+    Each window ends at the quietest moment of its last seconds, so that words are
+    rarely cut in half. Only the samples around each cut are read, which keeps
+    memory-mapped samples on disk.
+
+    :param samples: Mono 16-bit PCM samples.
+    :type samples: npt.NDArray[np.int16]
+    :param window_size: Maximum length of each window, in seconds. If it's not
+                        positive, the samples aren't split (except for the first
+                        window, if `first_window_size` is given).
+    :type window_size: int
+    :param first_window_size: Maximum length of the first window, in seconds, if it
+                              differs from the rest. A short first window gets the
+                              first results sooner.
+    :type first_window_size: Optional[int]
+    :param frame_rate: Sample rate of the samples, in Hz.
+    :type frame_rate: int
+    :return: The `(start, end)` sample indices of each window.
+    :rtype: list[tuple[int, int]]
+    """
+    frame_len = max(1, frame_rate // 10)  # 100 ms
+    window_len = (first_window_size or window_size) * frame_rate
+    windows = []
+    start = 0
+
+    while 0 < window_len < samples.size - start:
+        # Where to look for the quietest moment at the end of the window
+        search_len = min(_WINDOW_SEARCH_SECONDS * frame_rate, window_len // 2)
+        search_start = start + window_len - search_len
+        frame_count = search_len // frame_len
+        frames = (
+            samples[search_start : search_start + frame_count * frame_len]
+            .astype(np.int64)
+            .reshape(frame_count, frame_len)
+        )
+        quietest_frame = int(np.argmin(np.einsum("ij,ij->i", frames, frames)))
+        end = search_start + quietest_frame * frame_len + frame_len // 2
+
+        windows.append((start, end))
+        start = end
+        window_len = window_size * frame_rate
+
+    windows.append((start, samples.size))
+
+    return windows
+
+
+def _detect_nonsilent(
+    samples: npt.NDArray[np.int16],
+    ms_boundaries: npt.NDArray[np.int64],
+    min_silence_len: int,
+    silence_thresh: float,
+) -> list[list[int]]:
+    """
+    Find the non-silent sections of the samples, like
+    `pydub.silence.detect_nonsilent`.
+
+    :param samples: Mono 16-bit PCM samples.
+    :type samples: npt.NDArray[np.int16]
+    :param ms_boundaries: First sample of each millisecond, plus the end of the last
+                          one.
+    :type ms_boundaries: npt.NDArray[np.int64]
+    :param min_silence_len: Minimum length of a silence, in milliseconds.
+    :type min_silence_len: int
+    :param silence_thresh: Anything quieter than this is considered silence, in
+                           dBFS.
+    :type silence_thresh: float
+    :return: The `[start, end]` milliseconds of each non-silent section.
+    :rtype: list[list[int]]
+    """
+    seg_len = ms_boundaries.size - 1
+
+    if seg_len < min_silence_len:
+        return [[0, seg_len]]
+
+    # Energy of the audio up to each millisecond, so the energy of any window is the
+    # difference of two values. Integers keep it exact, like `audioop.rms`.
+    cumulative_energy = np.concatenate(
+        ([0], np.cumsum(_get_ms_energy(samples, ms_boundaries)))
+    )
+
+    starts = np.arange(seg_len - min_silence_len + 1)
+    ends = starts + min_silence_len
+    window_energy = cumulative_energy[ends] - cumulative_energy[starts]
+    window_size = np.maximum(ms_boundaries[ends] - ms_boundaries[starts], 1)
+    window_rms = np.floor(np.sqrt(window_energy / window_size))
+
+    max_rms = 10 ** (silence_thresh / 20) * 32768
+    silence_starts = np.flatnonzero(window_rms <= max_rms)
+
+    if silence_starts.size == 0:
+        return [[0, seg_len]]
+
+    # Overlapping silent windows belong to the same silence
+    gaps = np.flatnonzero(np.diff(silence_starts) > min_silence_len)
+    silence_range_starts = silence_starts[np.concatenate(([0], gaps + 1))]
+    silence_range_ends = (
+        silence_starts[np.concatenate((gaps, [silence_starts.size - 1]))]
+        + min_silence_len
+    )
+
+    if silence_range_starts[0] == 0 and silence_range_ends[0] == seg_len:
+        return []
+
+    nonsilent_ranges = []
+    prev_end = 0
+
+    for start, end in zip(silence_range_starts.tolist(), silence_range_ends.tolist()):
+        nonsilent_ranges.append([prev_end, start])
+        prev_end = end
+
+    if prev_end != seg_len:
+        nonsilent_ranges.append([prev_end, seg_len])
+
+    if nonsilent_ranges[0] == [0, 0]:
+        nonsilent_ranges.pop(0)
+
+    return nonsilent_ranges
+
+
+def _get_ms_energy(
+    samples: npt.NDArray[np.int16], boundaries: npt.NDArray[np.int64]
+) -> npt.NDArray[np.int64]:
+    """
+    Compute the sum of the squared samples between each pair of consecutive
+    boundaries, a block at a time so that the squared samples never need to fit in
+    memory at once.
+
+    :param samples: Mono 16-bit PCM samples.
+    :type samples: npt.NDArray[np.int16]
+    :param boundaries: Increasing sample indices that delimit the sections.
+    :type boundaries: npt.NDArray[np.int64]
+    :return: The energy of each section.
+    :rtype: npt.NDArray[np.int64]
+    """
+    energy = np.empty(boundaries.size - 1, dtype=np.int64)
+
+    for block_start in range(0, energy.size, _SILENCE_DETECTION_BLOCK_MS):
+        block_end = min(block_start + _SILENCE_DETECTION_BLOCK_MS, energy.size)
+        first_sample = boundaries[block_start]
+        block = samples[first_sample : boundaries[block_end]].astype(np.int64)
+        cumulative_block = np.concatenate(([0], np.cumsum(block * block)))
+        block_boundaries = boundaries[block_start : block_end + 1] - first_sample
+        energy[block_start:block_end] = np.diff(cumulative_block[block_boundaries])
+
+    return energy
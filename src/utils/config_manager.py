@@ -1,37 +1,108 @@
+import atexit
+import os
+import threading
 from configparser import ConfigParser
 from pathlib import Path
-from typing import Any, Union
+from typing import Any, Optional, Union
 
+from models.config.config_cache import ConfigCache
+from models.config.config_google_api import ConfigGoogleApi
 from models.config.config_subtitles import ConfigSubtitles
 from models.config.config_system import ConfigSystem
 from models.config.config_transcription import ConfigTranscription
+from models.config.config_watch import ConfigWatch
 from models.config.config_whisper_api import ConfigWhisperApi
 from models.config.config_whisperx import ConfigWhisperX
+from utils import file_utils as fu
 from utils.path_helper import ROOT_PATH
 
 
 class ConfigManager:
+    """
+    Reads and modifies the configuration file.
+
+    Each file is parsed once and kept in memory until its modification time changes,
+    so reading a whole config section doesn't parse the file once per key.
+    Modifications are applied in memory right away, but written to disk at most once
+    per `_WRITE_DELAY_SECONDS`, atomically, and always before the program exits.
+    """
+
     _CONFIG_FILE_PATH = ROOT_PATH / "config.ini"
+    _WRITE_DELAY_SECONDS = 0.5
+
+    # Parsed files and their modification times when they were parsed
+    _configs: dict[Path, tuple[ConfigParser, Optional[int]]] = {}
+    # Files modified in memory that haven't been written yet
+    _pending_writes: set[Path] = set()
+    _write_timer: Optional[threading.Timer] = None
+    _lock = threading.RLock()
+    # Values that replace the ones of the files in this process only, without being
+    # written to them (e.g. the options given to the command-line interface)
+    _overrides: dict[str, dict[str, str]] = {}
     KeyType = Union[
+        ConfigCache.Key,
+        ConfigGoogleApi.Key,
         ConfigSubtitles.Key,
         ConfigSystem.Key,
         ConfigTranscription.Key,
+        ConfigWatch.Key,
         ConfigWhisperApi.Key,
         ConfigWhisperX.Key,
     ]
 
     @staticmethod
     def read_config(file_path: Path = _CONFIG_FILE_PATH) -> ConfigParser:
-        config = ConfigParser(
-            converters={
-                "list": lambda x: [i.strip() for i in x.split(",")]
-                if len(x) > 0
-                else []
-            }
-        )
+        config = ConfigManager._create_parser()
         config.read(file_path)
         return config
 
+    @staticmethod
+    def get_config_cache() -> ConfigCache:
+        section = ConfigCache.Key.SECTION
+
+        return ConfigCache(
+            use_result_cache=ConfigManager.get_value(  # type: ignore
+                section, ConfigCache.Key.USE_RESULT_CACHE
+            ),
+            result_cache_size_mb=ConfigManager.get_value(  # type: ignore
+                section, ConfigCache.Key.RESULT_CACHE_SIZE_MB
+            ),
+            use_audio_cache=ConfigManager.get_value(  # type: ignore
+                section, ConfigCache.Key.USE_AUDIO_CACHE
+            ),
+            audio_cache_size_mb=ConfigManager.get_value(  # type: ignore
+                section, ConfigCache.Key.AUDIO_CACHE_SIZE_MB
+            ),
+            use_directory_manifest=ConfigManager.get_value(  # type: ignore
+                section, ConfigCache.Key.USE_DIRECTORY_MANIFEST
+            ),
+            directory_manifest_size_mb=ConfigManager.get_value(  # type: ignore
+                section, ConfigCache.Key.DIRECTORY_MANIFEST_SIZE_MB
+            ),
+            use_payload_cache=ConfigManager.get_value(  # type: ignore
+                section, ConfigCache.Key.USE_PAYLOAD_CACHE
+            ),
+            payload_cache_size_mb=ConfigManager.get_value(  # type: ignore
+                section, ConfigCache.Key.PAYLOAD_CACHE_SIZE_MB
+            ),
+            payload_cache_ttl_seconds=ConfigManager.get_value(  # type: ignore
+                section, ConfigCache.Key.PAYLOAD_CACHE_TTL_SECONDS
+            ),
+        )
+
+    @staticmethod
+    def get_config_google_api() -> ConfigGoogleApi:
+        section = ConfigGoogleApi.Key.SECTION
+
+        return ConfigGoogleApi(
+            max_concurrent_chunks=ConfigManager.get_value(  # type: ignore
+                section, ConfigGoogleApi.Key.MAX_CONCURRENT_CHUNKS
+            ),
+            max_retries=ConfigManager.get_value(  # type: ignore
+                section, ConfigGoogleApi.Key.MAX_RETRIES
+            ),
+        )
+
     @staticmethod
     def get_config_subtitles() -> ConfigSubtitles:
         section = ConfigSubtitles.Key.SECTION
@@ -78,6 +149,31 @@ class ConfigManager:
             overwrite_files=ConfigManager.get_value(  # type: ignore
                 section, ConfigTranscription.Key.OVERWRITE_FILES
             ),
+            workers=ConfigManager.get_value(  # type: ignore
+                section, ConfigTranscription.Key.WORKERS
+            ),
+            threads_per_worker=ConfigManager.get_value(  # type: ignore
+                section, ConfigTranscription.Key.THREADS_PER_WORKER
+            ),
+            watch_directory=ConfigManager.get_value(  # type: ignore
+                section, ConfigTranscription.Key.WATCH_DIRECTORY
+            ),
+        )
+
+    @staticmethod
+    def get_config_watch() -> ConfigWatch:
+        section = ConfigWatch.Key.SECTION
+
+        return ConfigWatch(
+            poll_interval_seconds=ConfigManager.get_value(  # type: ignore
+                section, ConfigWatch.Key.POLL_INTERVAL_SECONDS
+            ),
+            stable_seconds=ConfigManager.get_value(  # type: ignore
+                section, ConfigWatch.Key.STABLE_SECONDS
+            ),
+            max_queued_files=ConfigManager.get_value(  # type: ignore
+                section, ConfigWatch.Key.MAX_QUEUED_FILES
+            ),
         )
 
     @staticmethod
@@ -94,6 +190,30 @@ class ConfigManager:
             timestamp_granularities=ConfigManager.get_value(  # type: ignore
                 section, ConfigWhisperApi.Key.TIMESTAMP_GRANULARITIES
             ),
+            timeout_seconds=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperApi.Key.TIMEOUT_SECONDS
+            ),
+            connect_timeout_seconds=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperApi.Key.CONNECT_TIMEOUT_SECONDS
+            ),
+            max_connections=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperApi.Key.MAX_CONNECTIONS
+            ),
+            max_concurrent_uploads=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperApi.Key.MAX_CONCURRENT_UPLOADS
+            ),
+            requests_per_minute=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperApi.Key.REQUESTS_PER_MINUTE
+            ),
+            max_retries=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperApi.Key.MAX_RETRIES
+            ),
+            max_upload_size_mb=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperApi.Key.MAX_UPLOAD_SIZE_MB
+            ),
+            upload_codec=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperApi.Key.UPLOAD_CODEC
+            ),
         )
 
     @staticmethod
@@ -119,6 +239,18 @@ class ConfigManager:
             output_file_types=ConfigManager.get_value(  # type: ignore
                 section, ConfigWhisperX.Key.OUTPUT_FILE_TYPES
             ),
+            model_memory_budget_mb=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperX.Key.MODEL_MEMORY_BUDGET_MB
+            ),
+            align_model_idle_timeout=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperX.Key.ALIGN_MODEL_IDLE_TIMEOUT
+            ),
+            save_sidecar=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperX.Key.SAVE_SIDECAR
+            ),
+            window_size=ConfigManager.get_value(  # type: ignore
+                section, ConfigWhisperX.Key.WINDOW_SIZE
+            ),
         )
 
     @staticmethod
@@ -147,24 +279,29 @@ class ConfigManager:
             float, or list).
         :rtype: Union[str, bool, int, float, list[Any]]
         """
-        config = ConfigManager.read_config(file_path)
-
         section_name = str(section.value)
         key_name = str(key.value)
         key_value_type = key.value_type()
 
-        # Check if the section and key exist before getting the value
-        if section_name in config and key_name in config[section_name]:
-            if key_value_type == "str":
-                return config.get(section_name, key_name)
-            elif key_value_type == "bool":
-                return config.getboolean(section_name, key_name)
-            elif key_value_type == "int":
-                return config.getint(section_name, key_name)
-            elif key_value_type == "float":
-                return config.getfloat(section_name, key_name)
-            elif key_value_type == "list":
-                return config.getlist(section_name, key_name)  # type: ignore
+        with ConfigManager._lock:
+            if key_name in ConfigManager._overrides.get(section_name, {}):
+                config = ConfigManager._create_parser()
+                config.read_dict(ConfigManager._overrides)
+            else:
+                config = ConfigManager._get_config(file_path)
+
+            # Check if the section and key exist before getting the value
+            if section_name in config and key_name in config[section_name]:
+                if key_value_type == "str":
+                    return config.get(section_name, key_name)
+                elif key_value_type == "bool":
+                    return config.getboolean(section_name, key_name)
+                elif key_value_type == "int":
+                    return config.getint(section_name, key_name)
+                elif key_value_type == "float":
+                    return config.getfloat(section_name, key_name)
+                elif key_value_type == "list":
+                    return config.getlist(section_name, key_name)  # type: ignore
 
         raise ValueError(
             f"Section [{section}] or Key [{key_name}] not found in the config"
@@ -182,7 +319,9 @@ class ConfigManager:
 
         This method reads a configuration file, checks if the given section and key
         exist, and if they do, updates the value of the key to the new value provided.
-        If the section or key does not exist, it prints an error message.
+        If the section or key does not exist, it prints an error message. The new
+        value is available right away, but the file is written shortly after, along
+        with any other modification made in the meantime.
 
         :param section: The section in the configuration file where the key is located.
         :type section: KeyType
@@ -197,20 +336,162 @@ class ConfigManager:
         :raises ValueError: If the section or key is not found in the config. file.
         :return: None
         """
-        config = ConfigManager.read_config(file_path)
-
         section_name = str(section.value)
         key_name = str(key.value)
 
-        # Check if the section and option exist before modifying
-        if section_name in config and key_name in config[section_name]:
-            config.set(section_name, key_name, new_value)
+        with ConfigManager._lock:
+            config = ConfigManager._get_config(file_path)
+
+            # Check if the section and option exist before modifying
+            if section_name in config and key_name in config[section_name]:
+                config.set(section_name, key_name, new_value)
+                ConfigManager._schedule_write(file_path)
 
-            with open(file_path, "w") as config_file:
-                config.write(config_file)
+                print(f"Value for [{section_name}][{key_name}] modified to {new_value}")
+            else:
+                print(
+                    f"Section [{section_name}] or Key [{key_name}] not found in the "
+                    "config"
+                )
+
+    @staticmethod
+    def override_value(section: KeyType, key: KeyType, new_value: str) -> None:
+        """
+        Override the value of a specified key within a section for the rest of the
+        execution of this process, without modifying the configuration file.
 
-            print(f"Value for [{section_name}][{key_name}] modified to {new_value}")
-        else:
-            print(
-                f"Section [{section_name}] or Key [{key_name}] not found in the config"
+        :param section: The section where the key is located.
+        :type section: KeyType
+        :param key: The key within the section whose value is to be overridden.
+        :type key: KeyType
+        :param new_value: The value that replaces the one of the configuration file.
+        :type new_value: str
+        :return: None
+        """
+        with ConfigManager._lock:
+            ConfigManager._overrides.setdefault(str(section.value), {})[
+                str(key.value)
+            ] = new_value
+
+    @staticmethod
+    def get_overrides() -> dict[str, dict[str, str]]:
+        """
+        Get the values overridden in this process, to apply them to another one.
+
+        :return: The overridden values by section and key.
+        :rtype: dict[str, dict[str, str]]
+        """
+        with ConfigManager._lock:
+            return {
+                section: dict(values)
+                for section, values in ConfigManager._overrides.items()
+            }
+
+    @staticmethod
+    def set_overrides(overrides: dict[str, dict[str, str]]) -> None:
+        """
+        Replace the values overridden in this process, e.g. with the ones of the
+        process that started it.
+
+        :param overrides: The overridden values by section and key.
+        :type overrides: dict[str, dict[str, str]]
+        :return: None
+        """
+        with ConfigManager._lock:
+            ConfigManager._overrides = {
+                section: dict(values) for section, values in overrides.items()
+            }
+
+    @staticmethod
+    def flush() -> None:
+        """
+        Write the pending modifications of the configuration files to disk right
+        away. It's called automatically when the program exits.
+
+        :return: None
+        """
+        with ConfigManager._lock:
+            if ConfigManager._write_timer:
+                ConfigManager._write_timer.cancel()
+                ConfigManager._write_timer = None
+
+            for file_path in list(ConfigManager._pending_writes):
+                config, _ = ConfigManager._configs[file_path]
+
+                try:
+                    with fu.open_atomically(file_path, encoding=None) as file:
+                        config.write(file)
+                except OSError as e:
+                    print(f"Could not write the config to {file_path}: {e!r}")
+                    continue
+
+                ConfigManager._configs[file_path] = (
+                    config,
+                    ConfigManager._get_mtime(file_path),
+                )
+                ConfigManager._pending_writes.discard(file_path)
+
+    @staticmethod
+    def _get_config(file_path: Path) -> ConfigParser:
+        """
+        Get the parsed configuration file, parsing it again only if it has changed on
+        disk since it was parsed. Must be called with the lock held.
+
+        :param file_path: The path to the configuration file.
+        :type file_path: Path
+        :return: The parsed configuration file.
+        :rtype: ConfigParser
+        """
+        mtime = ConfigManager._get_mtime(file_path)
+        cached = ConfigManager._configs.get(file_path)
+
+        # Pending modifications are newer than the file on disk
+        if cached and (
+            file_path in ConfigManager._pending_writes or cached[1] == mtime
+        ):
+            return cached[0]
+
+        config = ConfigManager.read_config(file_path)
+        ConfigManager._configs[file_path] = (config, mtime)
+
+        return config
+
+    @staticmethod
+    def _schedule_write(file_path: Path) -> None:
+        """
+        Schedule writing the file after `_WRITE_DELAY_SECONDS`, so that the
+        modifications made in the meantime are written at once. Must be called with
+        the lock held.
+
+        :param file_path: The path to the modified configuration file.
+        :type file_path: Path
+        :return: None
+        """
+        ConfigManager._pending_writes.add(file_path)
+
+        if ConfigManager._write_timer is None:
+            ConfigManager._write_timer = threading.Timer(
+                ConfigManager._WRITE_DELAY_SECONDS, ConfigManager.flush
             )
+            ConfigManager._write_timer.daemon = True
+            ConfigManager._write_timer.start()
+
+    @staticmethod
+    def _create_parser() -> ConfigParser:
+        return ConfigParser(
+            converters={
+                "list": lambda x: [i.strip() for i in x.split(",")]
+                if len(x) > 0
+                else []
+            }
+        )
+
+    @staticmethod
+    def _get_mtime(file_path: Path) -> Optional[int]:
+        try:
+            return os.stat(file_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+atexit.register(ConfigManager.flush)
@@ -1,6 +1,11 @@
 APP_NAME = "Audiotext"
 APP_LANGUAGES = {"en": "English", "es": "Español"}
 
+# Interval between checks of the queue of updates of the main window, and maximum
+# number of updates applied per check so that bursts never freeze the window
+UI_EVENT_POLL_INTERVAL_MS = 50
+UI_EVENTS_PER_TICK = 200
+
 # Code languages convention: ISO 639-1
 AUDIO_LANGUAGES = {
     "af": "Afrikaans",
@@ -117,6 +122,17 @@ AUDIO_FILE_EXTENSIONS = [
     ".opus",
 ]
 
+# Sample rate of the decoded audio, which is the one expected by Whisper
+AUDIO_SAMPLE_RATE = 16000
+
+# Lowest and highest bitrate, in kbps, of the audio compressed with each codec to be
+# uploaded. FLAC is lossless, so its bitrate can't be set and it's only an estimate.
+UPLOAD_CODEC_BITRATES_KBPS = {
+    "mp3": (32, 64),
+    "ogg": (16, 32),
+    "flac": (160, 160),
+}
+
 FORMATS_TO_FILE_TYPES = {
     "aud": "aud",
     "json": "json",
@@ -128,6 +144,16 @@ FORMATS_TO_FILE_TYPES = {
     "vtt": "vtt",
 }
 
+# Bytes used to store each model parameter for every compute type
+COMPUTE_TYPE_BYTES = {
+    "int8": 1,
+    "float16": 2,
+    "float32": 4,
+}
+
+# Suffix of the files that store WhisperX results to export them again later
+SIDECAR_FILE_SUFFIX = ".audiotext.json"
+
 # fmt: off
 VIDEO_FILE_EXTENSIONS = [
     ".mp4", ".m4a", ".m4v", ".f4v", ".f4a", ".m4b", ".m4r", ".f4b", ".mov",  # MP4
@@ -142,3 +168,28 @@ VIDEO_FILE_EXTENSIONS = [
 # fmt: on
 
 SUPPORTED_FILE_EXTENSIONS = AUDIO_FILE_EXTENSIONS + VIDEO_FILE_EXTENSIONS
+# Set of the supported extensions, to check the lowercased suffix of many files fast
+SUPPORTED_FILE_SUFFIXES = frozenset(SUPPORTED_FILE_EXTENSIONS)
+
+# Suffixes of the files that can be output files of a transcription
+OUTPUT_FILE_SUFFIXES = frozenset(
+    f".{file_type}" for file_type in FORMATS_TO_FILE_TYPES.values()
+)
+
+# Estimated memory (in MB) of a wav2vec2 alignment model loaded by WhisperX
+WHISPERX_ALIGN_MODEL_MEMORY_MB = 1200
+
+# Seconds of the first window transcribed when the segments are streamed, so that
+# the first text is shown soon after starting
+WHISPERX_FIRST_WINDOW_SIZE = 60
+
+# Parameters (in millions) of each ASR model size, used to estimate its memory usage
+WHISPERX_MODEL_PARAMETERS = {
+    "tiny": 39,
+    "base": 74,
+    "small": 244,
+    "medium": 769,
+    "large-v1": 1550,
+    "large-v2": 1550,
+    "large-v3": 1550,
+}
@@ -0,0 +1,200 @@
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import utils.constants as c
+import utils.hash_utils as hu
+import utils.path_helper as ph
+from utils.disk_cache import DiskCache
+
+# Version of the format of the stored manifests. Manifests of other versions are
+# ignored.
+_MANIFEST_VERSION = 1
+
+# Directories modified this recently may still change without their modification time
+# changing (e.g. FAT only stores it in steps of 2 seconds), so their listings are
+# always read again on the next scan
+_RACY_MTIME_SECONDS = 2
+
+
+@dataclass
+class DirectoryListing:
+    """
+    Entries of a directory that are needed to find the files to transcribe in it.
+    """
+
+    # Modification time of the directory when it was listed, or 0 if the listing
+    # must be read again on the next scan
+    mtime_ns: int
+    subdir_names: list[str] = field(default_factory=list)
+    # Size and modification time of each supported audio or video file
+    media_files: dict[str, tuple[int, int]] = field(default_factory=dict)
+    # Names of the files that can be output files of a transcription
+    output_file_names: set[str] = field(default_factory=set)
+
+
+class DirectoryManifest:
+    """
+    Listings of the directories scanned under a root directory, persisted between
+    scans.
+
+    Adding, removing or renaming a file changes the modification time of its
+    directory, so the listing of a directory is only read again if its modification
+    time changed. Rescanning an unchanged tree costs a single `stat` per directory.
+    """
+
+    def __init__(self, root: Path, max_size_mb: Optional[float] = None) -> None:
+        """
+        :param root: The directory whose tree is scanned.
+        :type root: Path
+        :param max_size_mb: Maximum size of the stored manifests. If None, the
+                            listings aren't persisted.
+        :type max_size_mb: Optional[float]
+        """
+        self._cache = (
+            DiskCache(
+                directory=ph.CACHE_PATH / "directories",
+                max_size_mb=max_size_mb,
+                suffix=".json",
+            )
+            if max_size_mb is not None
+            else None
+        )
+        self._key = hu.hash_params(str(root.resolve()))
+        self._stored_listings = self._load()
+        # Listings of the current scan. Only these are stored, so the directories
+        # that no longer exist are dropped from the manifest.
+        self._listings: dict[str, DirectoryListing] = {}
+        self._is_modified = False
+
+    def get_listing(self, dir_path: Path) -> Optional[DirectoryListing]:
+        """
+        Gets the listing of the directory, reading it from disk only if the directory
+        changed since the last scan.
+
+        :param dir_path: The directory to list.
+        :type dir_path: Path
+        :return: The listing of the directory, or None if it can't be read.
+        :rtype: Optional[DirectoryListing]
+        """
+        key = str(dir_path)
+
+        if listing := self._listings.get(key):
+            return listing
+
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+            listing = self._stored_listings.get(key)
+
+            if not listing or listing.mtime_ns != mtime_ns:
+                listing = self._read_listing(dir_path, mtime_ns)
+                self._is_modified = True
+        except OSError as e:
+            print(f"Could not read the directory {dir_path}: {e!r}")
+            return None
+
+        self._listings[key] = listing
+
+        return listing
+
+    def save(self) -> None:
+        """
+        Stores the listings of the current scan, if any directory changed since the
+        last one.
+
+        :return: None
+        """
+        is_modified = self._is_modified or self._listings.keys() != (
+            self._stored_listings.keys()
+        )
+
+        if not self._cache or not is_modified:
+            return
+
+        manifest = {
+            "version": _MANIFEST_VERSION,
+            "directories": {
+                path: {
+                    "mtime_ns": listing.mtime_ns,
+                    "subdir_names": listing.subdir_names,
+                    "media_files": listing.media_files,
+                    "output_file_names": sorted(listing.output_file_names),
+                }
+                for path, listing in self._listings.items()
+            },
+        }
+
+        try:
+            self._cache.put(self._key, json.dumps(manifest).encode())
+        except OSError as e:
+            # The next scan reads every directory again, but it's still correct
+            print(f"Could not store the directory manifest: {e!r}")
+
+        self._stored_listings = dict(self._listings)
+        self._is_modified = False
+
+    def _load(self) -> dict[str, DirectoryListing]:
+        if not self._cache or not (data := self._cache.get(self._key)):
+            return {}
+
+        try:
+            manifest: dict[str, Any] = json.loads(data)
+
+            if manifest["version"] != _MANIFEST_VERSION:
+                return {}
+
+            return {
+                path: DirectoryListing(
+                    mtime_ns=entry["mtime_ns"],
+                    subdir_names=entry["subdir_names"],
+                    media_files={
+                        name: (size, mtime_ns)
+                        for name, (size, mtime_ns) in entry["media_files"].items()
+                    },
+                    output_file_names=set(entry["output_file_names"]),
+                )
+                for path, entry in manifest["directories"].items()
+            }
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring the corrupt directory manifest: {e!r}")
+            return {}
+
+    @staticmethod
+    def _read_listing(dir_path: Path, mtime_ns: int) -> DirectoryListing:
+        """
+        Lists the directory with a single `scandir` call. Only the supported audio and
+        video files are stat'ed.
+
+        :param dir_path: The directory to list.
+        :type dir_path: Path
+        :param mtime_ns: The modification time of the directory.
+        :type mtime_ns: int
+        :return: The listing of the directory.
+        :rtype: DirectoryListing
+        """
+        is_racy = time.time_ns() - mtime_ns < _RACY_MTIME_SECONDS * 1_000_000_000
+        listing = DirectoryListing(mtime_ns=0 if is_racy else mtime_ns)
+
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                # Symbolic links to directories aren't followed, like `os.walk` does
+                if entry.is_dir(follow_symlinks=False):
+                    listing.subdir_names.append(entry.name)
+                    continue
+
+                suffix = os.path.splitext(entry.name)[1].lower()
+
+                if suffix in c.SUPPORTED_FILE_SUFFIXES:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        listing.media_files[entry.name] = (
+                            stat.st_size,
+                            stat.st_mtime_ns,
+                        )
+                elif suffix in c.OUTPUT_FILE_SUFFIXES:
+                    listing.output_file_names.add(entry.name)
+
+        return listing
@@ -0,0 +1,159 @@
+import os
+import tempfile
+import threading
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO, Optional
+
+from utils import file_utils as fu
+
+
+class DiskCache:
+    """
+    Size-bounded cache of files stored in a directory.
+
+    Each entry is a file named after its key. Reading an entry refreshes its
+    modification time, so when the total size of the entries exceeds `max_size_mb`,
+    the least recently used entries (the oldest modification times) are removed first.
+    Entries are written atomically, so a crash never leaves a half-written entry.
+    """
+
+    def __init__(self, directory: Path, max_size_mb: float, suffix: str = "") -> None:
+        self.directory = directory
+        self.max_size_mb = max_size_mb
+        self._suffix = suffix
+        self._lock = threading.Lock()
+
+    def get_path(self, key: str) -> Optional[Path]:
+        """
+        Gets the path of the entry for the given key and marks it as recently used.
+
+        :param key: Key of the entry.
+        :type key: str
+        :return: The path of the entry, or None if there is no entry for the key.
+        :rtype: Optional[Path]
+        """
+        path = self._path_for(key)
+
+        try:
+            os.utime(path)  # Refresh the entry for the LRU eviction
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Gets the content of the entry for the given key.
+
+        :param key: Key of the entry.
+        :type key: str
+        :return: The content of the entry, or None if there is no entry for the key.
+        :rtype: Optional[bytes]
+        """
+        if path := self.get_path(key):
+            try:
+                return path.read_bytes()
+            except FileNotFoundError:  # Evicted in the meantime
+                return None
+
+        return None
+
+    def put(self, key: str, data: bytes) -> Path:
+        """
+        Stores the data as the entry for the given key and evicts the least recently
+        used entries if the cache exceeds its maximum size.
+
+        :param key: Key of the entry.
+        :type key: str
+        :param data: Content of the entry.
+        :type data: bytes
+        :return: The path of the stored entry.
+        :rtype: Path
+        """
+        with self.open_for_write(key) as (file, path):
+            file.write(data)
+
+        return path
+
+    def open_for_write(self, key: str) -> "_AtomicEntryWriter":
+        """
+        Opens the entry for the given key to write its content directly to disk,
+        which avoids holding large entries in memory. The entry only becomes visible
+        once the returned context manager exits without errors.
+
+        :param key: Key of the entry.
+        :type key: str
+        :return: A context manager that yields the open file and the entry path.
+        :rtype: _AtomicEntryWriter
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return _AtomicEntryWriter(self, self._path_for(key))
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits in its maximum
+        size.
+
+        :return: None
+        """
+        with self._lock:
+            entries = []
+
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if (
+                        entry.is_file()
+                        and entry.name.endswith(self._suffix)
+                        and not entry.name.startswith(".tmp-")  # Being written
+                    ):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total_size = sum(size for _, size, _ in entries)
+            max_size = self.max_size_mb * 1024 * 1024
+
+            for _, size, path in sorted(entries):
+                if total_size <= max_size:
+                    break
+
+                try:
+                    os.remove(path)
+                    total_size -= size
+                except OSError:  # In use (Windows) or already removed
+                    pass
+
+    def _path_for(self, key: str) -> Path:
+        return self.directory / f"{key}{self._suffix}"
+
+
+class _AtomicEntryWriter:
+    def __init__(self, cache: DiskCache, path: Path) -> None:
+        self._cache = cache
+        self._path = path
+
+    def __enter__(self) -> tuple[BinaryIO, Path]:
+        fd, self._tmp_path = tempfile.mkstemp(
+            dir=self._cache.directory, prefix=".tmp-", suffix=".part"
+        )
+        self._file = os.fdopen(fd, "wb")
+        return self._file, self._path
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        exc_traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+        self._file.close()
+
+        if exc_type is None:
+            os.replace(self._tmp_path, self._path)
+            fu.fsync_directory(self._cache.directory)
+            self._cache.evict()
+        else:
+            os.remove(self._tmp_path)
@@ -26,6 +26,14 @@ class ComputeType(Enum):
     FLOAT32 = "float32"
 
 
+class JobState(Enum):
+    QUEUED = "queued"
+    DECODING = "decoding"
+    TRANSCRIBING = "transcribing"
+    WRITTEN = "written"
+    FAILED = "failed"
+
+
 class ModelSize(Enum):
     TINY = "tiny"
     BASE = "base"
@@ -47,6 +55,21 @@ class TranscriptionMethod(Enum):
     WHISPERX = "WhisperX"
 
 
+class UiEventType(Enum):
+    DISPLAY_TEXT = "display_text"
+    APPEND_TEXT = "append_text"
+    PROGRESS = "progress"
+    PROCESSED_TRANSCRIPTION = "processed_transcription"
+    STOP_RECORDING_FROM_MIC = "stop_recording_from_mic"
+    GPU_AVAILABILITY = "gpu_availability"
+
+
+class UploadCodec(Enum):
+    MP3 = "mp3"
+    OGG = "ogg"
+    FLAC = "flac"
+
+
 class WhisperApiResponseFormats(Enum):
     JSON = "json"
     SRT = "srt"
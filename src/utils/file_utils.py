@@ -0,0 +1,99 @@
+import contextlib
+import os
+import secrets
+import stat
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+
+@contextlib.contextmanager
+def open_atomically(
+    file_path: Path, encoding: Optional[str] = "utf-8"
+) -> Iterator[TextIO]:
+    """
+    Opens a temporary file next to the given file to write its new content. The
+    temporary file replaces the file once the context exits without errors, so the
+    file is never left half-written, even if the program crashes while writing it.
+
+    The content is flushed to disk before replacing the file, and the replacement
+    right after, so neither an empty file nor the old one is left after a power loss.
+
+    :param file_path: The path of the file to write.
+    :type file_path: Path
+    :param encoding: The encoding of the file. If None, the locale encoding is used.
+    :type encoding: Optional[str]
+    :return: An iterator that yields the temporary file, open for writing text.
+    :rtype: Iterator[TextIO]
+    """
+    tmp_path = file_path.parent / f".{file_path.name}.{secrets.token_hex(4)}.tmp"
+    # Created like a regular file, so new files get the default permissions. Binary
+    # mode keeps Windows from translating the newlines twice.
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    fd = os.open(tmp_path, flags, 0o666)
+
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as tmp_file:
+            yield tmp_file
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+
+        # Keep the permissions of the file instead of the ones of the temp file
+        if file_path.exists():
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(file_path).st_mode))
+
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    fsync_directory(file_path.parent)
+
+
+def replace_atomically(src_path: Path, dst_path: Path) -> None:
+    """
+    Moves a file written in the same directory, or in a directory of the same file
+    system, to its final path in a single step, replacing the file there if any. Like
+    `open_atomically`, the file and its move are flushed to disk.
+
+    :param src_path: The path of the written file.
+    :type src_path: Path
+    :param dst_path: The final path of the file.
+    :type dst_path: Path
+    :return: None
+    """
+    # Opened for writing, since Windows can't flush files opened only for reading
+    with open(src_path, "ab") as src_file:
+        os.fsync(src_file.fileno())
+
+    if dst_path.exists():
+        os.chmod(src_path, stat.S_IMODE(os.stat(dst_path).st_mode))
+
+    os.replace(src_path, dst_path)
+    fsync_directory(dst_path.parent)
+
+
+def fsync_directory(directory: Path) -> None:
+    """
+    Flushes the entries of a directory to disk, so that the files just created,
+    renamed or removed in it stay that way after a power loss. It only has an effect
+    on POSIX systems, since Windows doesn't allow opening directories and flushes
+    renames on its own.
+
+    :param directory: The path of the directory.
+    :type directory: Path
+    :return: None
+    """
+    if os.name != "posix":
+        return
+
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:  # The files are already in place, only their durability is lost
+        return
+
+    try:
+        os.fsync(fd)
+    except OSError:  # Some file systems, such as network ones, can't flush directories
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,62 @@
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Union
+
+
+def hash_file(file_path: Path) -> str:
+    """
+    Computes a hash of the content of a file.
+
+    The hash is memoized for as long as the size and modification time of the file
+    don't change, so hashing the same file again doesn't read it again.
+
+    :param file_path: Path of the file to hash.
+    :type file_path: Path
+    :return: The hexadecimal digest of the content of the file.
+    :rtype: str
+    """
+    stat = os.stat(file_path)
+    return _hash_file(str(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+def hash_params(*params: Any) -> str:
+    """
+    Computes a hash of the string representation of the given parameters.
+
+    :param params: Parameters to hash.
+    :type params: Any
+    :return: The hexadecimal digest of the parameters.
+    :rtype: str
+    """
+    return hashlib.blake2b(repr(params).encode(), digest_size=16).hexdigest()
+
+
+def hash_data(data: Union[bytes, memoryview], *params: Any) -> str:
+    """
+    Computes a hash of the given data and parameters, without copying the data.
+
+    :param data: Data to hash, such as bytes or the memory of a contiguous NumPy
+                 array.
+    :type data: Union[bytes, memoryview]
+    :param params: Parameters to hash along with the data.
+    :type params: Any
+    :return: The hexadecimal digest of the data and the parameters.
+    :rtype: str
+    """
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(repr(params).encode())
+
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=1024)
+def _hash_file(file_path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(file_path, "rb") as file:
+        while block := file.read(1024 * 1024):
+            digest.update(block)
+
+    return digest.hexdigest()
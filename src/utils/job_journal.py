@@ -0,0 +1,263 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+import utils.hash_utils as hu
+import utils.path_helper as ph
+from models.transcription import Transcription
+from utils import file_utils as fu
+from utils.enums import JobState
+from utils.result_cache import ResultCache
+
+
+class JobJournal:
+    """
+    Append-only journal of the state of each file of a directory transcription,
+    stored in the cache directory with one JSON record per line.
+
+    Every state change is flushed to disk as soon as it happens. If the program
+    crashes or is closed in the middle of a directory, transcribing the same
+    directory with the same options resumes it: the files that were already written
+    are skipped as long as their output files still exist, and the ones that were
+    interrupted are transcribed again even if some of their output files exist. The
+    journal is removed once every file is written, and it's never resumed when the
+    output files are overwritten.
+
+    Worker processes append to the journal of their parent directly. Each record is
+    written with a single `write` call to a file opened in append mode, so records of
+    different processes don't interleave on POSIX systems. Malformed lines are
+    ignored when the journal is loaded, which at worst transcribes a file again.
+    """
+
+    def __init__(self, path: Path, should_overwrite: bool = False) -> None:
+        self.path = path
+        self.should_overwrite = should_overwrite
+
+    @staticmethod
+    def for_job(
+        transcription: Transcription, output_dir: Optional[Path] = None
+    ) -> "JobJournal":
+        """
+        Gets the journal of the transcription of a directory with the given options.
+
+        :param transcription: The transcription of the directory.
+        :type transcription: Transcription
+        :param output_dir: Directory of the output files, if not the one of each file.
+        :type output_dir: Optional[Path]
+        :return: The journal of the job, which may not exist on disk yet.
+        :rtype: JobJournal
+        """
+        key = hu.hash_params(
+            os.path.abspath(transcription.audio_source_path),
+            os.path.abspath(output_dir) if output_dir else None,
+            # Files written with another model or decoding options aren't skipped
+            *ResultCache.get_transcription_params(transcription),
+            sorted(transcription.output_file_types or []),
+            transcription.should_overwrite,
+        )
+
+        return JobJournal(
+            ph.CACHE_PATH / "jobs" / f"{key}.jsonl",
+            should_overwrite=transcription.should_overwrite,
+        )
+
+    def resume(self, files: list[Path]) -> list[Path]:
+        """
+        Determines the files left to transcribe from the journal of the previous
+        run, if it was interrupted, and records them as queued. If the output files
+        are overwritten, the previous run is discarded instead.
+
+        :param files: The files to transcribe found in the directory.
+        :type files: list[Path]
+        :return: The given files that weren't written by the previous run, followed
+                 by the files that were interrupted and aren't in the given files
+                 (e.g. because some of their output files already exist).
+        :rtype: list[Path]
+        """
+        if self.should_overwrite:
+            self.remove()
+            return files
+
+        records = self._load()
+        written_records = {
+            path: record
+            for path, record in records.items()
+            if record["state"] == JobState.WRITTEN.value
+            and self._is_unchanged(Path(path), record)
+            and self._are_outputs_present(record)
+        }
+        file_paths = {os.path.abspath(file) for file in files}
+        files_to_transcribe = [
+            file for file in files if os.path.abspath(file) not in written_records
+        ]
+        files_to_transcribe += [
+            Path(path)
+            for path in records
+            if path not in written_records
+            and path not in file_paths
+            and os.path.exists(path)
+        ]
+
+        if written_records:
+            print(
+                f"Resuming the previous transcription. {len(written_records)} "
+                "file(s) were already written."
+            )
+
+        if not files_to_transcribe:
+            self.remove()
+            return []
+
+        # Rewriting the journal with only the records that matter keeps it from
+        # growing with every run
+        lines = [json.dumps(record) for record in written_records.values()]
+        lines += [
+            json.dumps(self._create_record(file, JobState.QUEUED))
+            for file in files_to_transcribe
+        ]
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            with fu.open_atomically(self.path) as file:
+                file.write("\n".join(lines) + "\n")
+        except OSError as e:
+            print(f"Could not write the job journal {self.path}: {e!r}")
+
+        return files_to_transcribe
+
+    def record(
+        self,
+        file_path: Path,
+        state: JobState,
+        error: Optional[str] = None,
+        output_paths: Optional[list[Path]] = None,
+    ) -> None:
+        """
+        Appends the new state of a file to the journal and flushes it to disk.
+
+        :param file_path: The path of the file.
+        :type file_path: Path
+        :param state: The new state of the file.
+        :type state: JobState
+        :param error: The error that made the file fail, if any.
+        :type error: Optional[str]
+        :param output_paths: The output files of the file, if it was written.
+        :type output_paths: Optional[list[Path]]
+        :return: None
+        """
+        record = self._create_record(file_path, state, output_paths)
+
+        if error:
+            record["error"] = error.strip().splitlines()[-1]
+
+        line = f"{json.dumps(record, ensure_ascii=False)}\n".encode()
+
+        try:
+            fd = os.open(
+                self.path,
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0),
+                0o666,
+            )
+
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            # The transcription is still valid, it just won't be resumable
+            print(f"Could not write to the job journal {self.path}: {e!r}")
+
+    def remove_if_finished(self) -> bool:
+        """
+        Removes the journal if every file of the job was written, so that the next
+        transcription of the directory starts from scratch.
+
+        :return: True if the job is finished, or False if some files failed or
+                 weren't transcribed and the journal is kept to resume it.
+        :rtype: bool
+        """
+        records = self._load()
+
+        if all(
+            record["state"] == JobState.WRITTEN.value for record in records.values()
+        ):
+            self.remove()
+            return True
+
+        return False
+
+    def remove(self) -> None:
+        """
+        Removes the journal from disk.
+
+        :return: None
+        """
+        self.path.unlink(missing_ok=True)
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        """
+        Loads the last record of each file from the journal.
+
+        :return: The last record of each file, by the absolute path of the file.
+        :rtype: dict[str, dict[str, Any]]
+        """
+        records: dict[str, dict[str, Any]] = {}
+
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                        records[record["path"]] = record
+                    except (ValueError, KeyError, TypeError):
+                        # A crash while appending leaves the last line half-written
+                        continue
+        except FileNotFoundError:
+            pass
+
+        return records
+
+    @staticmethod
+    def _create_record(
+        file_path: Path, state: JobState, output_paths: Optional[list[Path]] = None
+    ) -> dict[str, Any]:
+        record: dict[str, Any] = {
+            "path": os.path.abspath(file_path),
+            "state": state.value,
+        }
+
+        if output_paths:
+            record["outputs"] = [os.path.abspath(path) for path in output_paths]
+
+        # Files modified after they were written are transcribed again
+        if state == JobState.WRITTEN:
+            try:
+                stat = os.stat(file_path)
+                record["size"] = stat.st_size
+                record["mtime_ns"] = stat.st_mtime_ns
+            except OSError:
+                pass
+
+        return record
+
+    @staticmethod
+    def _is_unchanged(file_path: Path, record: dict[str, Any]) -> bool:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+
+        return bool(
+            record.get("size") == stat.st_size
+            and record.get("mtime_ns") == stat.st_mtime_ns
+        )
+
+    @staticmethod
+    def _are_outputs_present(record: dict[str, Any]) -> bool:
+        # Files whose output files were deleted since are transcribed again
+        return bool(record.get("outputs")) and all(
+            os.path.exists(path) for path in record["outputs"]
+        )
@@ -0,0 +1,262 @@
+import gc
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class ModelPoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    load_time: float = 0.0  # Total seconds spent loading models on misses
+
+    def __str__(self) -> str:
+        return (
+            f"hits={self.hits}, misses={self.misses}, evictions={self.evictions}, "
+            f"load_time={self.load_time:.2f}s"
+        )
+
+
+@dataclass
+class _PoolEntry(Generic[V]):
+    model: V
+    size_mb: float
+    last_used: float
+
+
+class MemoryBudget:
+    """
+    Memory budget shared by one or more model pools.
+
+    When a pool needs room for a model, the least recently used models of all the
+    pools sharing the budget are evicted, so together they never hold more than
+    `budget_mb`. The pools share the lock of the budget as well, which keeps a pool
+    from evicting the models of another one while it's loading or handing them out.
+    """
+
+    def __init__(self, budget_mb: float) -> None:
+        self.budget_mb = budget_mb
+        self.lock = threading.RLock()
+
+        self._pools: list["ModelPool[Any, Any]"] = []
+
+    @property
+    def used_mb(self) -> float:
+        with self.lock:
+            return sum(pool.used_mb for pool in self._pools)
+
+    def register(self, pool: "ModelPool[Any, Any]") -> None:
+        """
+        Add a pool to the ones whose models count against the budget.
+
+        :param pool: The pool to add.
+        :type pool: ModelPool
+        :return: None
+        """
+        with self.lock:
+            self._pools.append(pool)
+
+    def make_room(self, size_mb: float) -> None:
+        """
+        Evict the least recently used models of all the pools until `size_mb` more
+        fits into the budget.
+
+        :param size_mb: Megabytes that must fit after the eviction.
+        :type size_mb: float
+        :return: None
+        """
+        with self.lock:
+            while self.used_mb + size_mb > self.budget_mb:
+                oldest: Optional[tuple[float, ModelPool[Any, Any], Any]] = None
+
+                for pool in self._pools:
+                    if not (least_recently_used := pool.get_least_recently_used()):
+                        continue
+
+                    key, entry = least_recently_used
+
+                    if not oldest or entry.last_used < oldest[0]:
+                        oldest = (entry.last_used, pool, key)
+
+                if not oldest:
+                    return
+
+                _, pool, key = oldest
+                pool.evict(key)
+
+
+class ModelPool(Generic[K, V]):
+    """
+    Thread-safe LRU pool of loaded models keyed by their configuration.
+
+    Models are kept in memory until the sum of their estimated sizes, together with
+    the sizes of the models of the other pools sharing `memory_budget`, exceeds the
+    budget, at which point the least recently used ones are evicted. The most
+    recently requested model is never evicted, even if it alone exceeds the budget.
+    If `idle_timeout` is set, models that haven't been requested for that many
+    seconds are evicted as well.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        memory_budget: MemoryBudget,
+        idle_timeout: Optional[float] = None,
+        on_evict: Optional[Callable[[K], None]] = None,
+    ) -> None:
+        self.name = name
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.stats = ModelPoolStats()
+
+        self._on_evict = on_evict
+        self._entries: OrderedDict[K, _PoolEntry[V]] = OrderedDict()
+        self._lock = memory_budget.lock
+        self._idle_timer: Optional[threading.Timer] = None
+
+        memory_budget.register(self)
+
+    def get(self, key: K, loader: Callable[[], V], size_mb: float) -> V:
+        """
+        Get the model for the given key, loading it with `loader` if it isn't pooled.
+
+        :param key: Key identifying the model configuration.
+        :type key: K
+        :param loader: Function that loads the model on a miss.
+        :type loader: Callable[[], V]
+        :param size_mb: Estimated memory footprint of the model in megabytes.
+        :type size_mb: float
+        :return: The pooled or freshly loaded model.
+        :rtype: V
+        """
+        with self._lock:
+            self.evict_idle()
+
+            if key in self._entries:
+                entry = self._entries[key]
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                print(f"[{self.name}] Hit for {key} ({self.stats})")
+                self._schedule_idle_check()
+                return entry.model
+
+            self.stats.misses += 1
+
+            # Make room before loading so two large models don't coexist in memory
+            self.memory_budget.make_room(size_mb)
+
+            start = time.perf_counter()
+            model = loader()
+            elapsed = time.perf_counter() - start
+            self.stats.load_time += elapsed
+
+            self._entries[key] = _PoolEntry(
+                model=model, size_mb=size_mb, last_used=time.monotonic()
+            )
+            print(f"[{self.name}] Loaded {key} in {elapsed:.2f}s ({self.stats})")
+            self._schedule_idle_check()
+
+            return model
+
+    def evict(self, key: K) -> None:
+        """
+        Remove the model for the given key from the pool, if present.
+
+        :param key: Key identifying the model configuration.
+        :type key: K
+        :return: None
+        """
+        with self._lock:
+            if key in self._entries:
+                self._release(key)
+
+    def evict_idle(self) -> None:
+        """
+        Remove the models that haven't been requested within `idle_timeout` seconds.
+
+        :return: None
+        """
+        if self.idle_timeout is None:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            idle_keys = [
+                key
+                for key, entry in self._entries.items()
+                if now - entry.last_used >= self.idle_timeout
+            ]
+
+            for key in idle_keys:
+                self._release(key)
+
+    def clear(self) -> None:
+        """
+        Remove every model from the pool.
+
+        :return: None
+        """
+        with self._lock:
+            while self._entries:
+                self._release(next(iter(self._entries)))
+
+    def keys(self) -> list[K]:
+        with self._lock:
+            return list(self._entries)
+
+    def get_least_recently_used(self) -> Optional[tuple[K, _PoolEntry[V]]]:
+        """
+        Get the least recently used model of the pool.
+
+        :return: The key and entry of the model, or None if the pool is empty.
+        :rtype: Optional[tuple[K, _PoolEntry[V]]]
+        """
+        with self._lock:
+            return next(iter(self._entries.items()), None)
+
+    @property
+    def used_mb(self) -> float:
+        with self._lock:
+            return sum(entry.size_mb for entry in self._entries.values())
+
+    def _schedule_idle_check(self) -> None:
+        """
+        (Re)schedules a background check that evicts idle models, so they are released
+        even if the pool isn't used again.
+
+        :return: None
+        """
+        if self.idle_timeout is None:
+            return
+
+        if self._idle_timer:
+            self._idle_timer.cancel()
+
+        self._idle_timer = threading.Timer(self.idle_timeout, self.evict_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _release(self, key: K) -> None:
+        """
+        Drop the pool's reference to the model of the given key and notify the
+        `on_evict` callback once it can actually be garbage collected.
+
+        :param key: Key identifying the model configuration.
+        :type key: K
+        :return: None
+        """
+        del self._entries[key]
+        gc.collect()
+
+        self.stats.evictions += 1
+        print(f"[{self.name}] Evicted {key} ({self.stats})")
+
+        if self._on_evict:
+            self._on_evict(key)
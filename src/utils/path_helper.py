@@ -25,6 +25,27 @@ def get_root_path() -> Path:
     return root_path
 
 
+def get_cache_path() -> Path:
+    """
+    Gets the directory where the program caches data between runs.
+
+    It's kept outside the program directory because it's read-only (or temporary)
+    when the program is bundled.
+
+    :return: The absolute path to the cache directory.
+    :rtype: Path
+    """
+    if sys.platform == "win32":
+        base_path = Path(os.getenv("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+    elif sys.platform == "darwin":
+        base_path = Path.home() / "Library" / "Caches"
+    else:
+        base_path = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache"))
+
+    return base_path / "audiotext"
+
+
 IMG_RELATIVE_PATH = "res/img"
 
 ROOT_PATH = get_root_path()
+CACHE_PATH = get_cache_path()
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Union
+
+import utils.config_manager as cm
+import utils.hash_utils as hu
+
+
+class PayloadCache:
+    """
+    In-memory cache of the encoded audio uploaded to the transcription APIs, keyed by
+    the content of the audio and the encoding parameters.
+
+    Retrying a failed request, or transcribing the same audio again with another
+    response format shortly after, reuses the encoded audio instead of encoding it
+    again. Entries expire after `ttl_seconds`, and the least recently used ones are
+    evicted when the cache exceeds its maximum size. It's thread-safe.
+    """
+
+    def __init__(self, max_size_mb: float, ttl_seconds: float) -> None:
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.ttl_seconds = ttl_seconds
+
+        # Encoded audio and when it expires, from least to most recently used
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_or_encode(self, key: str, encode: Callable[[], bytes]) -> bytes:
+        """
+        Gets the encoded audio from the cache, encoding and caching it if it isn't
+        cached yet.
+
+        :param key: The key of the encoded audio.
+        :type key: str
+        :param encode: Encodes the audio. It's called outside the lock, so other
+                       audio can be encoded at the same time.
+        :type encode: Callable[[], bytes]
+        :return: The encoded audio.
+        :rtype: bytes
+        """
+        if (payload := self.get(key)) is not None:
+            return payload
+
+        payload = encode()
+        self.put(key, payload)
+
+        return payload
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Gets the encoded audio from the cache.
+
+        :param key: The key of the encoded audio.
+        :type key: str
+        :return: The encoded audio, or None if it isn't cached or it expired.
+        :rtype: Optional[bytes]
+        """
+        with self._lock:
+            if not (entry := self._entries.get(key)):
+                return None
+
+            payload, expires_at = entry
+
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+
+            return payload
+
+    def put(self, key: str, payload: bytes) -> None:
+        """
+        Caches the encoded audio, evicting the expired and least recently used
+        entries that don't fit.
+
+        :param key: The key of the encoded audio.
+        :type key: str
+        :param payload: The encoded audio.
+        :type payload: bytes
+        :return: None
+        """
+        if len(payload) > self.max_size:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+
+            if key in self._entries:
+                self._remove(key)
+
+            for expired_key in [
+                entry_key
+                for entry_key, (_, expires_at) in self._entries.items()
+                if now >= expires_at
+            ]:
+                self._remove(expired_key)
+
+            while self._entries and self._size + len(payload) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+            self._entries[key] = (payload, now + self.ttl_seconds)
+            self._size += len(payload)
+
+    def _remove(self, key: str) -> None:
+        payload, _ = self._entries.pop(key)
+        self._size -= len(payload)
+
+
+# Cache of the current process, shared by every request
+_payload_cache: Optional[PayloadCache] = None
+_payload_cache_lock = threading.Lock()
+
+
+def get_or_encode(
+    data: Union[bytes, memoryview],
+    params: tuple[object, ...],
+    encode: Callable[[], bytes],
+) -> bytes:
+    """
+    Encodes the audio, going through the payload cache of the current process if
+    it's enabled.
+
+    :param data: The raw audio that is encoded.
+    :type data: Union[bytes, memoryview]
+    :param params: The parameters of the encoding, such as the codec and bitrate.
+    :type params: tuple[object, ...]
+    :param encode: Encodes the audio.
+    :type encode: Callable[[], bytes]
+    :return: The encoded audio.
+    :rtype: bytes
+    """
+    config_cache = cm.ConfigManager.get_config_cache()
+
+    if not config_cache.use_payload_cache:
+        return encode()
+
+    global _payload_cache
+
+    with _payload_cache_lock:
+        if not _payload_cache:
+            _payload_cache = PayloadCache(
+                max_size_mb=config_cache.payload_cache_size_mb,
+                ttl_seconds=config_cache.payload_cache_ttl_seconds,
+            )
+
+        # The settings may have changed since the cache was created
+        _payload_cache.max_size = int(config_cache.payload_cache_size_mb * 1024 * 1024)
+        _payload_cache.ttl_seconds = config_cache.payload_cache_ttl_seconds
+        payload_cache = _payload_cache
+
+    return payload_cache.get_or_encode(hu.hash_data(data, *params), encode)
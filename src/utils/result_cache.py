@@ -0,0 +1,142 @@
+import json
+from typing import Any, Optional
+
+import utils.config_manager as cm
+import utils.hash_utils as hu
+import utils.path_helper as ph
+from models.transcription import Transcription
+from models.transcription_result import TranscriptionResult
+from utils.disk_cache import DiskCache
+from utils.enums import TranscriptionMethod
+
+
+class ResultCache:
+    """
+    On-disk cache of transcription results, keyed by the content of the audio file and
+    the parameters that affect the transcription. Changing anything that only affects
+    how the result is saved (e.g. output file types or subtitle options) still hits.
+    """
+
+    def __init__(self, max_size_mb: float) -> None:
+        self._cache = DiskCache(
+            directory=ph.CACHE_PATH / "results",
+            max_size_mb=max_size_mb,
+            suffix=".json",
+        )
+
+    def get(self, transcription: Transcription) -> Optional[TranscriptionResult]:
+        """
+        Gets the cached result of the transcription.
+
+        :param transcription: The transcription of a single file.
+        :type transcription: Transcription
+        :return: The cached result, or None if there is no usable cached result.
+        :rtype: Optional[TranscriptionResult]
+        """
+        data = self._cache.get(self._get_key(transcription))
+
+        if data is None:
+            return None
+
+        entry = json.loads(data)
+
+        # Subtitles need the word timings of an aligned result
+        if self._should_align(transcription) and not entry["is_aligned"]:
+            return None
+
+        return TranscriptionResult(
+            source_path=transcription.audio_source_path,
+            text=entry["text"],
+            segments=entry["segments"],
+            language=entry["language"],
+            is_aligned=entry["is_aligned"],
+        )
+
+    def put(self, transcription: Transcription, result: TranscriptionResult) -> None:
+        """
+        Caches the result of the transcription, unless it failed.
+
+        :param transcription: The transcription of a single file.
+        :type transcription: Transcription
+        :param result: The result of the transcription.
+        :type result: TranscriptionResult
+        :return: None
+        """
+        if not result.is_successful:
+            return
+
+        entry = {
+            "text": result.text,
+            "segments": result.segments,
+            "language": result.language,
+            "is_aligned": result.is_aligned,
+        }
+
+        try:
+            self._cache.put(self._get_key(transcription), json.dumps(entry).encode())
+        except OSError as e:
+            # The result is still valid even if it can't be cached
+            print(f"Could not cache the result of {result.source_path}: {e!r}")
+
+    @staticmethod
+    def get_transcription_params(transcription: Transcription) -> list[Any]:
+        """
+        Gets the parameters that change the result of the transcription, besides its
+        audio file, such as the model and how the audio is decoded.
+
+        :param transcription: The transcription.
+        :type transcription: Transcription
+        :return: The parameters of the transcription.
+        :rtype: list[Any]
+        """
+        assert transcription.method
+
+        task = "translate" if transcription.should_translate else "transcribe"
+        params: list[Any] = [transcription.method.value, transcription.language_code]
+
+        if transcription.method == TranscriptionMethod.WHISPERX:
+            config_whisperx = cm.ConfigManager.get_config_whisperx()
+            params += [
+                config_whisperx.model_size,
+                config_whisperx.compute_type,
+                task,
+                # Long recordings are transcribed in windows cut at different points
+                config_whisperx.window_size,
+            ]
+        elif transcription.method == TranscriptionMethod.WHISPER_API:
+            config_whisper_api = cm.ConfigManager.get_config_whisper_api()
+            params += [
+                task,
+                config_whisper_api.temperature,
+                # These change the text returned by the API
+                config_whisper_api.response_format,
+                config_whisper_api.timestamp_granularities,
+                # These change the audio that is uploaded and where it's split
+                config_whisper_api.upload_codec,
+                config_whisper_api.max_upload_size_mb,
+            ]
+
+        return params
+
+    @staticmethod
+    def _get_key(transcription: Transcription) -> str:
+        """
+        Computes the cache key of the transcription from the hash of its audio file and
+        the parameters used to decode it.
+
+        :param transcription: The transcription of a single file.
+        :type transcription: Transcription
+        :return: The cache key.
+        :rtype: str
+        """
+        file_hash = hu.hash_file(transcription.audio_source_path)
+        params = ResultCache.get_transcription_params(transcription)
+
+        return f"{file_hash}-{hu.hash_params(*params)}"
+
+    @staticmethod
+    def _should_align(transcription: Transcription) -> bool:
+        return transcription.method == TranscriptionMethod.WHISPERX and any(
+            file_type in (transcription.output_file_types or [])
+            for file_type in ["srt", "vtt"]
+        )
@@ -0,0 +1,183 @@
+import json
+import re
+from typing import Any, Iterable
+
+from utils.enums import WhisperApiResponseFormats
+
+# Timestamp of a subtitle cue, in the SRT (`00:01:02,345`) or VTT (`00:01:02.345` or
+# `01:02.345`) format
+_TIMESTAMP_PATTERN = re.compile(r"(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})")
+
+
+def merge_transcripts(pieces: list[tuple[float, str]], response_format: str) -> str:
+    """
+    Merge the Whisper API transcriptions of consecutive pieces of the same audio into
+    the transcription of the whole audio, as if it had been transcribed at once.
+
+    :param pieces: The offset of each piece from the start of the audio, in seconds,
+                   and its transcription, in the order of the pieces.
+    :type pieces: list[tuple[float, str]]
+    :param response_format: The response format of the transcriptions.
+    :type response_format: str
+    :raises ValueError: If the response format is not supported.
+    :return: The merged transcription, in the same response format.
+    :rtype: str
+    """
+    if len(pieces) == 1:
+        return pieces[0][1]
+
+    if response_format == WhisperApiResponseFormats.TEXT.value:
+        return _join_texts(text for _, text in pieces)
+    if response_format == WhisperApiResponseFormats.JSON.value:
+        return _merge_json(pieces)
+    if response_format == WhisperApiResponseFormats.VERBOSE_JSON.value:
+        return _merge_verbose_json(pieces)
+    if response_format in [
+        WhisperApiResponseFormats.SRT.value,
+        WhisperApiResponseFormats.VTT.value,
+    ]:
+        return _merge_subtitles(
+            pieces, is_vtt=response_format == WhisperApiResponseFormats.VTT.value
+        )
+
+    raise ValueError(f"Unsupported response format: {response_format}")
+
+
+def _join_texts(texts: Iterable[str]) -> str:
+    return " ".join(stripped_text for text in texts if (stripped_text := text.strip()))
+
+
+def _merge_json(pieces: list[tuple[float, str]]) -> str:
+    transcripts = [json.loads(text) for _, text in pieces]
+    merged = transcripts[0]
+    merged["text"] = _join_texts(transcript["text"] for transcript in transcripts)
+
+    return json.dumps(merged, indent=2, ensure_ascii=False)
+
+
+def _merge_verbose_json(pieces: list[tuple[float, str]]) -> str:
+    """
+    Merge `verbose_json` transcriptions, shifting the timestamps of their segments and
+    words by the offset of their piece and numbering the segments again.
+
+    :param pieces: The offset and transcription of each piece.
+    :type pieces: list[tuple[float, str]]
+    :return: The merged transcription.
+    :rtype: str
+    """
+    transcripts = [(offset, json.loads(text)) for offset, text in pieces]
+    merged = dict(transcripts[0][1])
+    merged["text"] = _join_texts(transcript["text"] for _, transcript in transcripts)
+    segments: list[dict[str, Any]] = []
+    words: list[dict[str, Any]] = []
+
+    for offset, transcript in transcripts:
+        for segment in transcript.get("segments") or []:
+            segment = {**segment, "id": len(segments)}
+            segment["start"] = round(segment["start"] + offset, 3)
+            segment["end"] = round(segment["end"] + offset, 3)
+
+            # Position of the segment in the audio, in frames of 10 ms
+            if "seek" in segment:
+                segment["seek"] += round(offset * 100)
+
+            segments.append(segment)
+
+        for word in transcript.get("words") or []:
+            words.append(
+                {
+                    **word,
+                    "start": round(word["start"] + offset, 3),
+                    "end": round(word["end"] + offset, 3),
+                }
+            )
+
+    if "segments" in merged:
+        merged["segments"] = segments
+    if "words" in merged:
+        merged["words"] = words
+
+    last_offset, last_transcript = transcripts[-1]
+    merged["duration"] = round(
+        last_offset + float(last_transcript.get("duration") or 0), 3
+    )
+
+    return json.dumps(merged, indent=2, ensure_ascii=False)
+
+
+def _merge_subtitles(pieces: list[tuple[float, str]], is_vtt: bool) -> str:
+    """
+    Merge SRT or VTT subtitles, shifting their cues by the offset of their piece and
+    numbering the SRT cues again.
+
+    :param pieces: The offset and subtitles of each piece.
+    :type pieces: list[tuple[float, str]]
+    :param is_vtt: Whether the subtitles are VTT instead of SRT.
+    :type is_vtt: bool
+    :return: The merged subtitles.
+    :rtype: str
+    """
+    cues = []
+
+    for offset, subtitles in pieces:
+        offset_ms = round(offset * 1000)
+
+        for block in re.split(r"\n\s*\n", subtitles.replace("\r\n", "\n").strip()):
+            lines = block.split("\n")
+            timing_line_idx = next(
+                (idx for idx, line in enumerate(lines) if "-->" in line), None
+            )
+
+            # The VTT header, notes and styles have no timing line
+            if timing_line_idx is None:
+                continue
+
+            start, end = lines[timing_line_idx].split("-->", 1)
+            end_timestamp, *settings = end.split(maxsplit=1)
+            timing_line = (
+                f"{_shift_timestamp(start.strip(), offset_ms, is_vtt)} --> "
+                f"{_shift_timestamp(end_timestamp, offset_ms, is_vtt)}"
+            )
+
+            if settings:
+                timing_line += f" {settings[0]}"
+
+            cue_text = "\n".join(lines[timing_line_idx + 1 :])
+
+            if is_vtt:
+                cues.append(f"{timing_line}\n{cue_text}")
+            else:
+                cues.append(f"{len(cues) + 1}\n{timing_line}\n{cue_text}")
+
+    merged = "\n\n".join(cues) + "\n"
+
+    return f"WEBVTT\n\n{merged}" if is_vtt else merged
+
+
+def _shift_timestamp(timestamp: str, offset_ms: int, is_vtt: bool) -> str:
+    """
+    Shift a subtitle timestamp by the given milliseconds.
+
+    :param timestamp: The SRT or VTT timestamp.
+    :type timestamp: str
+    :param offset_ms: The milliseconds to add to the timestamp.
+    :type offset_ms: int
+    :param is_vtt: Whether to format the shifted timestamp for VTT instead of SRT.
+    :type is_vtt: bool
+    :raises ValueError: If the timestamp is malformed.
+    :return: The shifted timestamp.
+    :rtype: str
+    """
+    if not (match := _TIMESTAMP_PATTERN.fullmatch(timestamp)):
+        raise ValueError(f"Malformed subtitle timestamp: {timestamp}")
+
+    hours, minutes, seconds, milliseconds = (
+        int(group or 0) for group in match.groups()
+    )
+    total_ms = ((hours * 60 + minutes) * 60 + seconds) * 1000 + milliseconds + offset_ms
+    seconds, milliseconds = divmod(total_ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    decimal_marker = "." if is_vtt else ","
+
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
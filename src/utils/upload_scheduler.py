@@ -0,0 +1,193 @@
+import asyncio
+import random
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Maximum seconds to wait before retrying a request, unless the server asks for more
+_MAX_BACKOFF_SECONDS = 60.0
+
+
+@dataclass
+class UploadMetrics:
+    """
+    Counters of the requests made through an upload scheduler.
+    """
+
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    # Seconds each successful request took, without the time it waited for its turn
+    latencies: list[float] = field(default_factory=list)
+
+    def get_summary(self) -> str:
+        """
+        Gets a human-readable summary of the metrics.
+
+        :return: The summary of the metrics.
+        :rtype: str
+        """
+        summary = (
+            f"{self.requests} request(s), {self.retries} retried, "
+            f"{self.failures} failed"
+        )
+
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            summary += (
+                f", latency p50 {statistics.median(latencies):.2f}s, "
+                f"p95 {p95:.2f}s, max {latencies[-1]:.2f}s"
+            )
+
+        return summary
+
+
+class TokenBucket:
+    """
+    Token bucket that allows up to `requests_per_minute` requests per minute, in
+    bursts of up to `capacity` requests.
+
+    Tokens are reserved in advance, so concurrent callers are spaced out instead of
+    all waking up at the same time when a token becomes available.
+    """
+
+    def __init__(self, requests_per_minute: float, capacity: int = 1) -> None:
+        self._seconds_per_token = 60 / requests_per_minute
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token, even if it isn't available yet.
+
+        :return: Seconds to wait until the token is available.
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._capacity,
+                self._tokens + (now - self._updated_at) / self._seconds_per_token,
+            )
+            self._updated_at = now
+            self._tokens -= 1
+
+            return max(0.0, -self._tokens * self._seconds_per_token)
+
+
+class UploadScheduler:
+    """
+    Schedules the requests to a remote API: at most `max_concurrent_uploads` of them
+    run at the same time, they are rate-limited to `requests_per_minute`, and the
+    ones that fail with a transient error are retried with an exponential backoff.
+
+    When the server asks to slow down, every request waits, not just the one that got
+    the response, so the scheduler doesn't keep hitting the rate limit.
+
+    The scheduler must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_uploads: int,
+        requests_per_minute: float,
+        max_retries: int,
+        get_retry_after: Callable[[Exception], Optional[float]],
+    ) -> None:
+        """
+        :param max_concurrent_uploads: Maximum number of requests running at the same
+                                       time.
+        :type max_concurrent_uploads: int
+        :param requests_per_minute: Maximum number of requests started per minute. If
+                                    not positive, the requests aren't rate-limited.
+        :type requests_per_minute: float
+        :param max_retries: Number of times a request is made again if it fails with
+                            a transient error.
+        :type max_retries: int
+        :param get_retry_after: Gets the seconds the server asked to wait before
+                                retrying a failed request (0 if it didn't say), or
+                                None if the error isn't transient.
+        :type get_retry_after: Callable[[Exception], Optional[float]]
+        """
+        self.max_retries = max_retries
+        self.metrics = UploadMetrics()
+
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent_uploads))
+        self._token_bucket = (
+            TokenBucket(requests_per_minute, capacity=max(1, max_concurrent_uploads))
+            if requests_per_minute > 0
+            else None
+        )
+        self._get_retry_after = get_retry_after
+        self._paused_until = 0.0
+
+    async def run(self, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        Makes the request when there is room for it, retrying it if it fails with a
+        transient error.
+
+        :param request: Creates the awaitable that makes the request. It's called
+                        again for every retry.
+        :type request: Callable[[], Awaitable[T]]
+        :raises Exception: The error of the request if it isn't transient or it still
+                           fails after all its retries.
+        :return: The response of the request.
+        :rtype: T
+        """
+        attempt = 0
+
+        async with self._semaphore:
+            while True:
+                await self._wait_for_turn()
+
+                self.metrics.requests += 1
+                start = time.perf_counter()
+
+                try:
+                    response = await request()
+                except Exception as e:
+                    retry_after = self._get_retry_after(e)
+
+                    if retry_after is None or attempt >= self.max_retries:
+                        self.metrics.failures += 1
+                        raise
+
+                    # Full jitter keeps the retries of concurrent requests apart
+                    backoff = random.uniform(0, min(_MAX_BACKOFF_SECONDS, 2**attempt))
+                    delay = max(retry_after, backoff)
+                    self._paused_until = max(
+                        self._paused_until, time.monotonic() + delay
+                    )
+                    self.metrics.retries += 1
+                    attempt += 1
+                    print(f"Request failed ({e!r}), retrying in {delay:.1f}s")
+                    continue
+
+                self.metrics.latencies.append(time.perf_counter() - start)
+
+                return response
+
+    async def _wait_for_turn(self) -> None:
+        """
+        Waits until the requests aren't paused and a token of the rate limit is
+        available.
+
+        :return: None
+        """
+        if (pause := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(pause)
+
+        if self._token_bucket and (delay := self._token_bucket.reserve()) > 0:
+            await asyncio.sleep(delay)
+
+        # Another request may have been asked to slow down while this one waited for
+        # its token. Starting later than the token allows never breaks the rate limit.
+        while (pause := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(pause)
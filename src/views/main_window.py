@@ -1,3 +1,4 @@
+import queue
 from pathlib import Path
 from typing import Any, Callable, Union
 
@@ -24,6 +25,7 @@ from utils.enums import (
     ModelSize,
     TimestampGranularities,
     TranscriptionMethod,
+    UiEventType,
     WhisperApiResponseFormats,
     WhisperXFileTypes,
 )
@@ -69,6 +71,7 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
         # State
         self._audio_source = AudioSource(self._config_transcription.audio_source)
         self._is_transcribing_from_mic = False
+        self._is_watching_directory = False
 
         # To handle debouncing
         self._after_id = None  # To store the `after()` method ID
@@ -85,6 +88,8 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
         """
         self._controller = controller
 
+        self._process_ui_events()
+
     # WIDGETS INITIALIZATION
 
     def _init_sidebar(self) -> None:
@@ -404,7 +409,17 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
             command=self._on_show_advanced_options,
         )
         self.btn_whisperx_show_advanced_options.grid(
-            row=4, column=0, padx=20, pady=16, sticky=ctk.EW
+            row=4, column=0, padx=20, pady=(16, 0), sticky=ctk.EW
+        )
+
+        ## 'Export from saved results' button
+        self.btn_whisperx_export = ctk.CTkButton(
+            master=self.frm_whisper_options,
+            text="Export from saved results",
+            command=self._on_export,
+        )
+        self.btn_whisperx_export.grid(
+            row=5, column=0, padx=20, pady=(10, 16), sticky=ctk.EW
         )
 
         # ------------------
@@ -773,6 +788,17 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
         if self._config_transcription.overwrite_files:
             self.chk_overwrite_files.select()
 
+        ## 'Watch for new files' checkbox, only shown for directories
+        self.chk_watch_directory = ctk.CTkCheckBox(
+            master=self.frm_save_options,
+            text="Watch for new files",
+            command=self._on_watch_directory_change,
+        )
+        self.chk_watch_directory.grid(row=0, column=3, padx=(10, 0), pady=0)
+
+        if self._config_transcription.watch_directory:
+            self.chk_watch_directory.select()
+
     # PUBLIC METHODS (called by the controller)
 
     def on_select_path_success(self, path: str) -> None:
@@ -798,6 +824,15 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
         self.omn_transcription_method.configure(state=ctk.NORMAL)
         self.btn_main_action.configure(state=ctk.NORMAL)
 
+        if self._is_watching_directory:
+            self._is_watching_directory = False
+
+            self.btn_main_action.configure(
+                fg_color="green",
+                hover_color="darkgreen",
+                text="Generate transcription",
+            )
+
         self._toggle_progress_bar_visibility(should_show=False)
 
     def on_stop_recording_from_mic(self) -> None:
@@ -819,6 +854,29 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
             state=ctk.DISABLED,
         )
 
+    def on_gpu_availability_checked(self, can_use_gpu: bool) -> None:
+        """
+        Stores and applies to the WhisperX options the result of the check of whether
+        a CUDA GPU can be used. If it can't, the CPU is forced.
+
+        :param can_use_gpu: Whether a CUDA GPU can be used.
+        :type can_use_gpu: bool
+        :return: None
+        """
+        assert self._controller
+
+        self._controller.save_gpu_availability(can_use_gpu)
+        self._config_whisperx.can_use_gpu = can_use_gpu
+
+        if can_use_gpu:
+            self.chk_use_cpu.configure(state=ctk.NORMAL)
+        else:
+            self._config_whisperx.use_cpu = True
+            self._config_whisperx.compute_type = ComputeType.INT8.value
+            self.chk_use_cpu.select()
+            self.chk_use_cpu.configure(state=ctk.DISABLED)
+            self.omn_compute_type.set(ComputeType.INT8.value)
+
     def display_text(self, text: str) -> None:
         """
         Clears any existing text in the transcription text box to display the provided
@@ -831,8 +889,94 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
         self.tbx_transcription.delete("1.0", ctk.END)
         self.tbx_transcription.insert("0.0", text)
 
+    def append_text(self, text: str) -> None:
+        """
+        Appends the provided text to the end of the transcription text box, keeping
+        the existing text.
+
+        :param text: The text to be appended to the transcription text box.
+        :type text: str
+        :return: None
+        """
+        self.tbx_transcription.insert(ctk.END, text)
+        self.tbx_transcription.see(ctk.END)
+
     # PRIVATE METHODS
 
+    def _process_ui_events(self) -> None:
+        """
+        Applies the updates queued by the controller, up to `c.UI_EVENTS_PER_TICK` at
+        a time, and schedules itself to apply the next ones. Consecutive text updates
+        are merged so that the text box is only modified once per batch.
+
+        :return: None
+        """
+        assert self._controller
+
+        pending_text = ""
+        should_replace_text = False
+
+        def flush_text() -> None:
+            nonlocal pending_text, should_replace_text
+
+            if should_replace_text:
+                self.display_text(pending_text)
+            elif pending_text:
+                self.append_text(pending_text)
+
+            pending_text = ""
+            should_replace_text = False
+
+        for _ in range(c.UI_EVENTS_PER_TICK):
+            try:
+                event = self._controller.ui_events.get_nowait()
+            except queue.Empty:
+                break
+
+            if event.type == UiEventType.DISPLAY_TEXT:
+                pending_text = event.text
+                should_replace_text = True
+            elif event.type in [UiEventType.APPEND_TEXT, UiEventType.PROGRESS]:
+                pending_text += event.text
+
+                if event.type == UiEventType.PROGRESS:
+                    self._update_progress(event.current, event.total)
+            else:
+                flush_text()
+
+                if event.type == UiEventType.PROCESSED_TRANSCRIPTION:
+                    self.on_processed_transcription()
+                elif event.type == UiEventType.STOP_RECORDING_FROM_MIC:
+                    self.on_stop_recording_from_mic()
+                elif event.type == UiEventType.GPU_AVAILABILITY:
+                    self.on_gpu_availability_checked(event.can_use_gpu)
+
+        flush_text()
+
+        # Keep draining without delay while there are updates left
+        if self._controller.ui_events.empty():
+            delay = c.UI_EVENT_POLL_INTERVAL_MS
+        else:
+            delay = 1
+
+        self.after(delay, self._process_ui_events)
+
+    def _update_progress(self, current: int, total: int) -> None:
+        """
+        Shows how many of the files have been processed in the progress bar.
+
+        :param current: Number of files processed so far.
+        :type current: int
+        :param total: Number of files to process.
+        :type total: int
+        :return: None
+        """
+        if self.progress_bar.cget("mode") != "determinate":
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate")
+
+        self.progress_bar.set(current / total)
+
     def _get_transcription_properties(self) -> dict[str, Any]:
         """
         Checks the current state of user interface elements to determine the
@@ -852,6 +996,10 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
             "method": TranscriptionMethod(self.omn_transcription_method.get()),
             "should_autosave": self.chk_autosave.get() == 1,
             "should_overwrite": self.chk_overwrite_files.get() == 1,
+            "should_watch": (
+                self._audio_source == AudioSource.DIRECTORY
+                and self.chk_watch_directory.get() == 1
+            ),
         }
 
         if self.omn_transcription_method.get() == TranscriptionMethod.GOOGLE_API.value:
@@ -980,6 +1128,13 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
         if self._audio_source != AudioSource.DIRECTORY:
             self.chk_autosave.configure(state=ctk.NORMAL)
             self.btn_save.configure(state=ctk.NORMAL)
+            self.chk_watch_directory.grid_remove()
+
+        # Only files and directories can have saved results to export
+        if self._audio_source in [AudioSource.FILE, AudioSource.DIRECTORY]:
+            self.btn_whisperx_export.configure(state=ctk.NORMAL)
+        else:
+            self.btn_whisperx_export.configure(state=ctk.DISABLED)
 
         if self._audio_source in [AudioSource.FILE, AudioSource.DIRECTORY]:
             self.btn_main_action.configure(text="Generate transcription")
@@ -993,6 +1148,7 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
                 self.chk_autosave.configure(state=ctk.DISABLED)
                 self.chk_overwrite_files.configure(state=ctk.NORMAL)
                 self.btn_save.configure(state=ctk.DISABLED)
+                self.chk_watch_directory.grid()
 
         elif self._audio_source == AudioSource.MIC:
             self.btn_main_action.configure(text="Start recording")
@@ -1066,6 +1222,25 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
             state=ctk.NORMAL,
         )
 
+    def _on_start_watching_directory(self) -> None:
+        """
+        Updates the UI when the user has clicked the `btn_main_action` to watch a
+        directory, so that the same button stops watching it.
+
+        :return: None
+        """
+        self._is_watching_directory = True
+
+        self.btn_main_action.configure(
+            fg_color=(Color.LIGHT_RED.value, Color.DARK_RED.value),
+            hover_color=(
+                Color.HOVER_LIGHT_RED.value,
+                Color.HOVER_DARK_RED.value,
+            ),
+            text="Stop watching",
+            state=ctk.NORMAL,
+        )
+
     def _prepare_ui_for_transcription(self) -> None:
         """
         Disables fields, shows the progress bar and removes the text of the previous
@@ -1098,12 +1273,21 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
         """
         assert self._controller
 
+        if self._is_watching_directory:
+            # Disabled until the files being transcribed are finished
+            self.btn_main_action.configure(state=ctk.DISABLED)
+            self._controller.stop_watching_directory()
+            return
+
         self._prepare_ui_for_transcription()
 
         transcription = Transcription(**self._get_transcription_properties())
 
         if self._audio_source in [AudioSource.FILE, AudioSource.DIRECTORY]:
             transcription.audio_source_path = Path(self.ent_path.get())
+
+            if transcription.should_watch:
+                self._on_start_watching_directory()
         elif self._audio_source == AudioSource.MIC:
             if self._is_transcribing_from_mic:
                 self._controller.stop_recording_from_mic()
@@ -1115,6 +1299,25 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
 
         self._controller.prepare_for_transcription(transcription)
 
+    def _on_export(self) -> None:
+        """
+        Triggers when `btn_whisperx_export` is clicked.
+
+        Exports the output files of the selected file or directory again from the
+        results saved by previous WhisperX transcriptions, using the current output
+        file types and subtitle options.
+
+        :return: None
+        """
+        assert self._controller
+
+        self._prepare_ui_for_transcription()
+
+        transcription = Transcription(**self._get_transcription_properties())
+        transcription.audio_source_path = Path(self.ent_path.get())
+
+        self._controller.export_transcription(transcription)
+
     def _on_save_transcription(self) -> None:
         """
         Triggers when `btn_save` is clicked. Prompts the user with the file explorer to
@@ -1261,6 +1464,15 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
             new_value=new_value,
         )
 
+    def _on_watch_directory_change(self) -> None:
+        new_value = "True" if self.chk_watch_directory.get() else "False"
+
+        self._on_config_change(
+            section=ConfigTranscription.Key.SECTION,
+            key=ConfigTranscription.Key.WATCH_DIRECTORY,
+            new_value=new_value,
+        )
+
     def _on_output_file_types_change(self) -> None:
         """
         Handles changes to the output file types by updating the configuration and
@@ -1392,6 +1604,7 @@ class MainWindow(ctk.CTkFrame):  # type: ignore[misc]
         :return: None
         """
         if should_show:
+            self.progress_bar.configure(mode="indeterminate")
             self.progress_bar.grid(row=2, column=1, padx=40, pady=0, sticky=ctk.EW)
             self.progress_bar.start()
         else:
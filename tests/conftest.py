@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+import pytest
+from utils.config_manager import ConfigManager
+
+# Status, headers and body of a response of the local API server
+Response = tuple[int, dict[str, str], bytes]
+
+TRANSCRIPTION = "transcription"
+
+
+class TranscriptionServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Whisper API. It counts the connections it accepts, records
+    when each request arrives and responds with the queued responses, in order, or
+    with a transcription once there are none left.
+    """
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _TranscriptionRequestHandler)
+        self.connections = 0
+        # Seconds the transcriptions take to respond, like a real server would
+        self.delay_seconds = 0.0
+        # When each request arrived, and when each queued response was sent
+        self.request_times: list[float] = []
+        self.error_times: list[float] = []
+        self._responses: list[Response] = []
+        self._lock = threading.Lock()
+
+    def queue_response(
+        self,
+        status: int,
+        headers: Optional[dict[str, str]] = None,
+        error_code: Optional[str] = None,
+    ) -> None:
+        """
+        Queues an error response, with the body of the errors of the OpenAI API.
+        """
+        body = {"error": {"message": "Error", "type": "error", "code": error_code}}
+        headers = {"Content-Type": "application/json", **(headers or {})}
+
+        with self._lock:
+            self._responses.append((status, headers, json.dumps(body).encode()))
+
+    def count_connection(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def get_response(self) -> Response:
+        with self._lock:
+            self.request_times.append(time.monotonic())
+
+            if self._responses:
+                self.error_times.append(self.request_times[-1])
+                return self._responses.pop(0)
+
+        time.sleep(self.delay_seconds)
+
+        return 200, {"Content-Type": "text/plain"}, TRANSCRIPTION.encode()
+
+
+class _TranscriptionRequestHandler(BaseHTTPRequestHandler):
+    # Keeps the connections alive between requests
+    protocol_version = "HTTP/1.1"
+    server: TranscriptionServer
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.count_connection()
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, headers, body = self.server.get_response()
+
+        self.send_response(status)
+
+        for name, value in headers.items():
+            self.send_header(name, value)
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[TranscriptionServer]:
+    pytest.importorskip("openai")
+
+    server = TranscriptionServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    # The OpenAI clients send their requests to the local server instead
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv(
+        "OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1"
+    )
+
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def config_overrides() -> Iterator[None]:
+    """
+    Restores the configuration values overridden by the test.
+    """
+    overrides = ConfigManager.get_overrides()
+
+    try:
+        yield
+    finally:
+        ConfigManager.set_overrides(overrides)
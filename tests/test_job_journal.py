@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pytest
+from models.config.config_whisperx import ConfigWhisperX
+from models.transcription import Transcription
+from utils.config_manager import ConfigManager
+from utils.enums import JobState, TranscriptionMethod
+from utils.job_journal import JobJournal
+
+
+@pytest.fixture
+def files(tmp_path: Path) -> list[Path]:
+    files = [tmp_path / "first.mp3", tmp_path / "second.mp3"]
+
+    for file in files:
+        file.write_bytes(b"audio")
+
+    return files
+
+
+def _write(journal: JobJournal, file: Path) -> Path:
+    output_path = file.with_suffix(".txt")
+    output_path.write_text("transcription")
+    journal.record(file, JobState.WRITTEN, output_paths=[output_path])
+
+    return output_path
+
+
+def test_written_files_are_skipped(tmp_path: Path, files: list[Path]) -> None:
+    journal = JobJournal(tmp_path / "journal.jsonl")
+    _write(journal, files[0])
+
+    assert journal.resume(files) == [files[1]]
+
+
+def test_files_whose_outputs_were_deleted_are_transcribed_again(
+    tmp_path: Path, files: list[Path]
+) -> None:
+    journal = JobJournal(tmp_path / "journal.jsonl")
+    _write(journal, files[0]).unlink()
+
+    assert journal.resume(files) == files
+
+
+def test_overwriting_discards_the_previous_run(
+    tmp_path: Path, files: list[Path]
+) -> None:
+    _write(JobJournal(tmp_path / "journal.jsonl"), files[0])
+    journal = JobJournal(tmp_path / "journal.jsonl", should_overwrite=True)
+
+    assert journal.resume(files) == files
+    assert not journal.path.exists()
+
+
+def test_job_depends_on_the_model_and_overwrite_settings(
+    tmp_path: Path, config_overrides: None
+) -> None:
+    transcription = Transcription(
+        language_code="en",
+        audio_source_path=tmp_path,
+        method=TranscriptionMethod.WHISPERX,
+        output_file_types=["txt"],
+    )
+    path = JobJournal.for_job(transcription).path
+
+    assert JobJournal.for_job(transcription).path == path
+
+    transcription.should_overwrite = True
+    assert JobJournal.for_job(transcription).path != path
+
+    transcription.should_overwrite = False
+    ConfigManager.override_value(
+        ConfigWhisperX.Key.SECTION, ConfigWhisperX.Key.COMPUTE_TYPE, "float32"
+    )
+    compute_type_path = JobJournal.for_job(transcription).path
+    ConfigManager.override_value(
+        ConfigWhisperX.Key.SECTION, ConfigWhisperX.Key.COMPUTE_TYPE, "int8"
+    )
+
+    assert compute_type_path != JobJournal.for_job(transcription).path
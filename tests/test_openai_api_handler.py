@@ -0,0 +1,89 @@
+import asyncio
+import os
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+import utils.constants as c
+from conftest import TRANSCRIPTION, TranscriptionServer
+from handlers.openai_api_handler import OpenAiApiHandler
+from models.config.config_whisper_api import ConfigWhisperApi
+from models.transcription import Transcription
+from utils.config_manager import ConfigManager
+from utils.enums import TranscriptionMethod
+
+MAX_CONCURRENT_UPLOADS = 2
+
+
+class _Compressions:
+    """
+    Counts the compressions running at the same time.
+    """
+
+    def __init__(self) -> None:
+        self.running = 0
+        self.max_running = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def compress_pieces(
+        self, samples: npt.NDArray[np.int16], start: int, *args: object
+    ) -> list[tuple[int, BytesIO]]:
+        with self._lock:
+            self.running += 1
+            self.count += 1
+            self.max_running = max(self.max_running, self.running)
+
+        # Long enough for the compressions of every window to overlap if they could
+        time.sleep(0.05)
+        compressed_audio = BytesIO(b"audio")
+        compressed_audio.name = "audio.mp3"
+
+        with self._lock:
+            self.running -= 1
+
+        return [(start, compressed_audio)]
+
+
+def test_long_audio_compresses_as_many_windows_at_a_time_as_it_uploads(
+    server: TranscriptionServer,
+    config_overrides: None,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    for key, value in [
+        (ConfigWhisperApi.Key.RESPONSE_FORMAT, "text"),
+        (ConfigWhisperApi.Key.MAX_CONCURRENT_UPLOADS, str(MAX_CONCURRENT_UPLOADS)),
+        (ConfigWhisperApi.Key.REQUESTS_PER_MINUTE, "0"),
+        (ConfigWhisperApi.Key.UPLOAD_CODEC, "mp3"),
+        # Windows of about 2 seconds at the lowest bitrate
+        (ConfigWhisperApi.Key.MAX_UPLOAD_SIZE_MB, "0.01"),
+    ]:
+        ConfigManager.override_value(ConfigWhisperApi.Key.SECTION, key, value)
+
+    compressions = _Compressions()
+    monkeypatch.setattr(
+        OpenAiApiHandler, "_compress_pieces", compressions.compress_pieces
+    )
+    transcription = Transcription(
+        language_code="en",
+        audio_source_path=Path("audio.wav"),
+        method=TranscriptionMethod.WHISPER_API,
+    )
+    samples = np.zeros(20 * c.AUDIO_SAMPLE_RATE, dtype=np.int16)
+
+    async def transcribe() -> str:
+        try:
+            return await OpenAiApiHandler.transcribe_async(samples, transcription)
+        finally:
+            await OpenAiApiHandler.close_async_clients()
+
+    text = asyncio.run(transcribe())
+
+    assert compressions.count >= 5
+    assert text == " ".join([TRANSCRIPTION] * compressions.count)
+    assert compressions.max_running == min(MAX_CONCURRENT_UPLOADS, os.cpu_count() or 1)
+    assert len(server.request_times) == compressions.count
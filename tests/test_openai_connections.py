@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from conftest import TRANSCRIPTION, TranscriptionServer
+from handlers.openai_api_handler import OpenAiApiHandler
+from models.config.config_whisper_api import ConfigWhisperApi
+from utils.config_manager import ConfigManager
+
+REQUESTS = 100
+
+
+@pytest.fixture
+def max_connections(config_overrides: None) -> int:
+    ConfigManager.override_value(
+        ConfigWhisperApi.Key.SECTION, ConfigWhisperApi.Key.MAX_CONNECTIONS, "4"
+    )
+
+    return 4
+
+
+async def _transcribe(requests: int, concurrently: bool) -> bool:
+    """
+    Makes the requests through the async client of the running loop, then closes it.
+
+    :return: Whether the client was closed.
+    """
+    config = ConfigManager.get_config_whisper_api()
+    client = OpenAiApiHandler.get_async_client(config)
+
+    async def transcribe() -> None:
+        # The client parses text responses as strings, despite its annotations
+        text: object = await client.audio.transcriptions.create(
+            model="whisper-1", file=("audio.mp3", b"audio"), response_format="text"
+        )
+        assert text == TRANSCRIPTION
+
+    if concurrently:
+        await asyncio.gather(*(transcribe() for _ in range(requests)))
+    else:
+        for _ in range(requests):
+            await transcribe()
+
+    assert OpenAiApiHandler.get_async_client(config) is client
+    await OpenAiApiHandler.close_async_clients()
+
+    return client.is_closed()
+
+
+def test_sequential_requests_reuse_one_connection(
+    server: TranscriptionServer, max_connections: int
+) -> None:
+    assert asyncio.run(_transcribe(REQUESTS, concurrently=False))
+    assert server.connections == 1
+
+
+def test_concurrent_requests_stay_within_the_connection_limit(
+    server: TranscriptionServer, max_connections: int
+) -> None:
+    assert asyncio.run(_transcribe(REQUESTS, concurrently=True))
+    assert 1 <= server.connections <= max_connections
+
+
+def test_each_event_loop_closes_its_own_client(
+    server: TranscriptionServer, max_connections: int
+) -> None:
+    for _ in range(3):
+        assert asyncio.run(_transcribe(REQUESTS // 10, concurrently=False))
+
+    # One connection per loop, since a closed client can't be reused
+    assert server.connections == 3
@@ -0,0 +1,60 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_PATH = Path(__file__).resolve().parent.parent / "src"
+
+# Transcription backends that take seconds to import, so they must only be imported
+# the first time a file is transcribed
+BACKEND_MODULES = ["whisperx", "torch", "openai"]
+# Seconds the main window may take to import. It takes about a quarter of a second,
+# so the budget leaves room for slow machines, but not for importing the backends.
+IMPORT_TIME_BUDGET_SECONDS = 2.0
+
+
+def test_main_window_imports_quickly_and_without_transcription_backends() -> None:
+    pytest.importorskip("customtkinter")
+
+    # A new interpreter, since other tests may have imported the modules already
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import controllers.main_controller\n"
+        "import views.main_window\n"
+        "seconds = time.perf_counter() - start\n"
+        f"backends = [m for m in {BACKEND_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'seconds': seconds, 'backends': backends}))\n"
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SRC_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    startup = json.loads(process.stdout.splitlines()[-1])
+
+    assert startup["backends"] == []
+    assert startup["seconds"] < IMPORT_TIME_BUDGET_SECONDS
+
+
+def test_workers_import_no_transcription_backends_until_needed() -> None:
+    code = (
+        "import json, sys\n"
+        "from handlers import worker_pool_handler\n"
+        "worker_pool_handler._init_worker(1, {})\n"
+        f"print(json.dumps([m for m in {BACKEND_MODULES!r} if m in sys.modules]))\n"
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SRC_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert json.loads(process.stdout.splitlines()[-1]) == []
@@ -0,0 +1,311 @@
+import asyncio
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+import utils.constants as c
+from conftest import TRANSCRIPTION, TranscriptionServer
+from handlers.openai_api_handler import OpenAiApiHandler
+from models.config.config_whisper_api import ConfigWhisperApi
+from models.transcription import Transcription
+from utils.config_manager import ConfigManager
+from utils.enums import TranscriptionMethod
+from utils.upload_scheduler import UploadScheduler
+
+MAX_CONCURRENT_UPLOADS = 4
+SECONDS_PER_REQUEST = 0.1
+RETRY_AFTER_SECONDS = 0.3
+# Tolerance of the event loop timers
+TOLERANCE_SECONDS = 0.005
+
+
+class _RateLimitError(Exception):
+    """
+    Fake response of a server that asks to retry after some seconds, like a 429 with
+    a Retry-After header.
+    """
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _get_retry_after(error: Exception) -> Optional[float]:
+    return error.retry_after if isinstance(error, _RateLimitError) else None
+
+
+def _create_scheduler(max_retries: int) -> UploadScheduler:
+    return UploadScheduler(
+        max_concurrent_uploads=MAX_CONCURRENT_UPLOADS,
+        requests_per_minute=60 / SECONDS_PER_REQUEST,
+        max_retries=max_retries,
+        get_retry_after=_get_retry_after,
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Retries wait exactly what the server asks for
+    monkeypatch.setattr("utils.upload_scheduler.random.uniform", lambda a, b: 0.0)
+
+
+def test_rate_limited_request_pauses_every_request() -> None:
+    scheduler = _create_scheduler(max_retries=2)
+    starts: list[float] = []
+    rate_limited_at: list[float] = []
+
+    async def request() -> int:
+        starts.append(time.monotonic())
+        await asyncio.sleep(0.02)
+
+        # The first request that waited for its turn is rate-limited while the next
+        # ones are still waiting for theirs
+        if len(starts) == MAX_CONCURRENT_UPLOADS + 1:
+            rate_limited_at.append(time.monotonic())
+            raise _RateLimitError(RETRY_AFTER_SECONDS)
+
+        await asyncio.sleep(0.03)
+
+        return len(starts)
+
+    async def run_requests() -> list[int]:
+        return await asyncio.gather(*(scheduler.run(request) for _ in range(12)))
+
+    assert len(asyncio.run(run_requests())) == 12
+
+    # No request started while the requests were paused
+    paused_until = rate_limited_at[0] + RETRY_AFTER_SECONDS
+    assert [
+        start
+        for start in starts
+        if rate_limited_at[0] < start < paused_until - TOLERANCE_SECONDS
+    ] == []
+
+    # The requests are spaced out by the rate limit, after the initial burst
+    for i, start in enumerate(starts):
+        for j in range(i + 1, len(starts)):
+            min_interval = (j - i + 1 - MAX_CONCURRENT_UPLOADS) * SECONDS_PER_REQUEST
+            assert starts[j] - start >= min_interval - TOLERANCE_SECONDS
+
+    assert scheduler.metrics.requests == 13
+    assert scheduler.metrics.retries == 1
+    assert scheduler.metrics.failures == 0
+    assert len(scheduler.metrics.latencies) == 12
+
+
+def test_request_fails_after_its_retries() -> None:
+    scheduler = _create_scheduler(max_retries=2)
+
+    async def request() -> None:
+        raise _RateLimitError(0.0)
+
+    with pytest.raises(_RateLimitError):
+        asyncio.run(scheduler.run(request))
+
+    assert scheduler.metrics.requests == 3
+    assert scheduler.metrics.retries == 2
+    assert scheduler.metrics.failures == 1
+    assert scheduler.metrics.latencies == []
+
+
+def test_request_is_not_retried_after_a_permanent_error() -> None:
+    scheduler = _create_scheduler(max_retries=2)
+
+    async def request() -> None:
+        raise ValueError("Invalid file format")
+
+    with pytest.raises(ValueError):
+        asyncio.run(scheduler.run(request))
+
+    assert scheduler.metrics.requests == 1
+    assert scheduler.metrics.retries == 0
+    assert scheduler.metrics.failures == 1
+
+
+def _configure_api(max_concurrent_uploads: int, max_retries: int) -> None:
+    for key, value in [
+        (ConfigWhisperApi.Key.RESPONSE_FORMAT, "text"),
+        (ConfigWhisperApi.Key.MAX_CONCURRENT_UPLOADS, str(max_concurrent_uploads)),
+        (ConfigWhisperApi.Key.REQUESTS_PER_MINUTE, "6000"),
+        (ConfigWhisperApi.Key.MAX_RETRIES, str(max_retries)),
+    ]:
+        ConfigManager.override_value(ConfigWhisperApi.Key.SECTION, key, value)
+
+
+async def _transcribe_files(
+    files: int, upload_scheduler: UploadScheduler
+) -> list[Union[str, BaseException]]:
+    """
+    Transcribes the files concurrently with the Whisper API, sharing the scheduler.
+
+    :return: The transcription or the error of each file.
+    """
+    transcription = Transcription(
+        language_code="en",
+        audio_source_path=Path("audio.wav"),
+        method=TranscriptionMethod.WHISPER_API,
+    )
+    samples = np.zeros(c.AUDIO_SAMPLE_RATE, dtype=np.int16)
+
+    try:
+        return await asyncio.gather(
+            *(
+                OpenAiApiHandler.transcribe_async(
+                    samples, transcription, upload_scheduler
+                )
+                for _ in range(files)
+            ),
+            return_exceptions=True,
+        )
+    finally:
+        await OpenAiApiHandler.close_async_clients()
+
+
+async def _request() -> None:
+    """
+    Makes a request with the client of the Whisper API, which doesn't retry it.
+    """
+    client = OpenAiApiHandler.get_async_client(ConfigManager.get_config_whisper_api())
+
+    try:
+        await client.audio.transcriptions.create(
+            model="whisper-1", file=("audio.mp3", b"audio")
+        )
+    finally:
+        await OpenAiApiHandler.close_async_clients()
+
+
+@pytest.fixture
+def no_compression(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The requests are what is tested, so the audio isn't compressed with ffmpeg
+    def compress_pieces(
+        samples: npt.NDArray[np.int16], start: int, *args: object
+    ) -> list[tuple[int, BytesIO]]:
+        compressed_audio = BytesIO(b"audio")
+        compressed_audio.name = "audio.mp3"
+
+        return [(start, compressed_audio)]
+
+    monkeypatch.setattr(OpenAiApiHandler, "_compress_pieces", compress_pieces)
+
+
+@pytest.mark.parametrize(
+    ("status", "headers", "error_code", "expected_retry_after"),
+    [
+        (429, {"Retry-After": "2"}, None, 2.0),
+        (429, {}, None, 0.0),
+        # An HTTP date, which isn't parsed
+        (429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, None, 0.0),
+        (429, {"Retry-After": "2"}, "insufficient_quota", None),
+        (500, {}, None, 0.0),
+        (503, {"Retry-After": "1.5"}, None, 1.5),
+        (400, {}, None, None),
+        (401, {}, None, None),
+    ],
+)
+def test_get_retry_after_of_api_errors(
+    server: TranscriptionServer,
+    status: int,
+    headers: dict[str, str],
+    error_code: Optional[str],
+    expected_retry_after: Optional[float],
+) -> None:
+    from openai import APIStatusError
+
+    server.queue_response(status, headers, error_code)
+
+    with pytest.raises(APIStatusError) as error:
+        asyncio.run(_request())
+
+    assert OpenAiApiHandler.get_retry_after(error.value) == expected_retry_after
+
+
+def test_get_retry_after_of_connection_errors(server: TranscriptionServer) -> None:
+    from openai import APIConnectionError
+
+    # Nothing listens on the port anymore
+    server.server_close()
+
+    with pytest.raises(APIConnectionError) as error:
+        asyncio.run(_request())
+
+    assert OpenAiApiHandler.get_retry_after(error.value) == 0.0
+
+
+def test_rate_limited_upload_pauses_every_file(
+    server: TranscriptionServer, config_overrides: None, no_compression: None
+) -> None:
+    _configure_api(max_concurrent_uploads=2, max_retries=2)
+    server.delay_seconds = 0.02
+    server.queue_response(429, {"Retry-After": str(RETRY_AFTER_SECONDS)})
+    upload_scheduler = OpenAiApiHandler.create_upload_scheduler()
+
+    assert asyncio.run(_transcribe_files(6, upload_scheduler)) == [TRANSCRIPTION] * 6
+
+    # Only the request that was already in flight when the server responded with
+    # the 429 arrived during the pause
+    rate_limited_at = server.error_times[0]
+    paused_until = rate_limited_at + RETRY_AFTER_SECONDS - TOLERANCE_SECONDS
+    assert [t for t in server.request_times if 0.01 < t - rate_limited_at] == [
+        t for t in server.request_times if t >= paused_until
+    ]
+    assert len([t for t in server.request_times if t >= paused_until]) >= 5
+
+    metrics = upload_scheduler.metrics
+    assert (metrics.requests, metrics.retries, metrics.failures) == (7, 1, 0)
+    assert len(metrics.latencies) == 6
+    assert min(metrics.latencies) >= server.delay_seconds
+
+
+def test_server_errors_are_retried(
+    server: TranscriptionServer, config_overrides: None, no_compression: None
+) -> None:
+    _configure_api(max_concurrent_uploads=1, max_retries=2)
+    server.queue_response(503)
+    server.queue_response(500)
+    upload_scheduler = OpenAiApiHandler.create_upload_scheduler()
+
+    assert asyncio.run(_transcribe_files(1, upload_scheduler)) == [TRANSCRIPTION]
+
+    metrics = upload_scheduler.metrics
+    assert (metrics.requests, metrics.retries, metrics.failures) == (3, 2, 0)
+    assert len(metrics.latencies) == 1
+
+
+def test_upload_fails_after_its_retries(
+    server: TranscriptionServer, config_overrides: None, no_compression: None
+) -> None:
+    from openai import InternalServerError
+
+    _configure_api(max_concurrent_uploads=1, max_retries=1)
+    server.queue_response(503)
+    server.queue_response(503)
+    upload_scheduler = OpenAiApiHandler.create_upload_scheduler()
+
+    [error] = asyncio.run(_transcribe_files(1, upload_scheduler))
+
+    assert isinstance(error, InternalServerError)
+    metrics = upload_scheduler.metrics
+    assert (metrics.requests, metrics.retries, metrics.failures) == (2, 1, 1)
+    assert metrics.latencies == []
+
+
+def test_upload_without_quota_is_not_retried(
+    server: TranscriptionServer, config_overrides: None, no_compression: None
+) -> None:
+    from openai import RateLimitError
+
+    _configure_api(max_concurrent_uploads=1, max_retries=2)
+    server.queue_response(429, {"Retry-After": "1"}, "insufficient_quota")
+    upload_scheduler = OpenAiApiHandler.create_upload_scheduler()
+
+    [error] = asyncio.run(_transcribe_files(1, upload_scheduler))
+
+    assert isinstance(error, RateLimitError)
+    assert len(server.request_times) == 1
+    metrics = upload_scheduler.metrics
+    assert (metrics.requests, metrics.retries, metrics.failures) == (1, 0, 1)